@@ -9,6 +9,7 @@ from flask_socketio import (
 
 
 from golmi.server.room_manager import RoomManager
+from golmi.server.wire import binary_available
 from app import DEFAULT_CONFIG_FILE
 
 # has to be passed by clients to connect
@@ -82,6 +83,16 @@ def get_default_config():
     return json.loads(default_config)
 
 
+def state_payload(model, client_id):
+    """
+    @return full state of the model in the format the client requested
+    """
+    state_dict = model.get_state_dict()
+    if client_id in model.binary_clients:
+        return model.encode_payload("update_state", state_dict)
+    return state_dict
+
+
 # --- socketio events --- #
 # --- connection --- #
 @socketio.on("connect")
@@ -109,11 +120,17 @@ def join(params):
         room_manager.add_room(room_id, get_default_config())
 
     room_manager.add_client_to_room(request.sid, room_id)
+    model = room_manager.get_model_of_room(room_id)
+
+    # optional: compact binary format for state updates
+    if params.get("encoding") == "msgpack" and binary_available():
+        model.binary_clients.add(request.sid)
+        emit("set_encoding", {"encoding": "msgpack"})
 
     # inform client about room name, current config and state using their
     # private channel
-    emit("update_config", room_manager.get_model_of_room(room_id).config.to_dict())
-    emit("update_state", room_manager.get_model_of_room(room_id).state.to_dict())
+    emit("update_config", model.config.to_dict())
+    emit("update_state", state_payload(model, request.sid))
 
 
 @socketio.on("disconnect")
@@ -136,6 +153,17 @@ def reset_state():
         model.reset()
 
 
+@socketio.on("sync")
+def sync(params=None):
+    """Send a full state snapshot to a client whose last applied revision,
+    if given, is not the current one, e.g. after a missed 'patch' event.
+    """
+    revision = params.get("revision") if isinstance(params, dict) else None
+    for model in room_manager.get_models_of_client(request.sid):
+        if revision is None or revision != model.state.revision:
+            emit("update_state", state_payload(model, request.sid))
+
+
 # --- configuration --- #
 @socketio.on("load_config")
 def load_config(json):
@@ -312,6 +340,38 @@ def grip(params):
                 model.grip(str(params["id"]))
 
 
+@socketio.on("actions")
+def actions(params):
+    """Apply an ordered list of actions at once, e.g.
+    {"actions": [{"type": "move", "id": "0", "dx": 1, "dy": 0},
+                 {"type": "grip", "id": "0"}],
+     "atomic": true}
+    With "atomic" (default), all actions are undone if one of them fails.
+    Looped actions are not supported here.
+    """
+    for model in room_manager.get_models_of_client(request.sid):
+        good_params = check_parameters(params, model, {"actions"}) and \
+                      isinstance(params["actions"], list)
+        if not good_params:
+            continue
+
+        batch = list()
+        for action in params["actions"]:
+            if not isinstance(action, dict) or "id" not in action:
+                good_params = False
+                break
+            # dx and dy can only be integers
+            if action.get("type") == "move" and not (
+                    param_is_integer(action.get("dx")) and
+                    param_is_integer(action.get("dy"))):
+                good_params = False
+                break
+            batch.append(dict(action, id=str(action["id"])))
+
+        if good_params:
+            model.apply_actions(batch, atomic=params.get("atomic", True))
+
+
 @socketio.on("stop_grip")
 def stop_grip(params):
     for model in room_manager.get_models_of_client(request.sid):
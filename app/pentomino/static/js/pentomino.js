@@ -10,6 +10,10 @@ $(document).ready(function () {
     const N_OBJECTS = 10;
     const N_GRIPPERS = 0; // no pre-generated gripper
 
+    // plain json state updates, "msgpack" opts in to the compact binary
+    // format and needs the MessagePack library (see pentomino.html)
+    const ENCODING = "json";
+
     const CUSTOM_CONFIG = {
         "move_step": 0.5,
         "width": 25,
@@ -102,7 +106,7 @@ $(document).ready(function () {
         controller.resetKeys()
         controller.attachModel(socket);
         // join a GOLMI room with the name "test_room_id"
-        socket.emit("join", {"room_id": "test_room_id"});
+        socket.emit("join", {"room_id": "test_room_id", "encoding": ENCODING});
     }
 
     function stop() {
@@ -101,7 +101,8 @@ $(document).ready(function () {
             this.socket.on("attach_gripper", (assignedId) => {
                 this.grId = assignedId;
             });
-            this.socket.on("update_state", (state) => {
+            this.socket.on("update_state", (data) => {
+                const state = this._decode("update_state", data);
                 // Assumes the logging starts at first 'update_state' event.
                 let timeStamp;
                 if (!this.startTime) {
@@ -131,7 +132,8 @@ $(document).ready(function () {
                     this.currentGrippers = state["grippers"];
                 }
             })
-            this.socket.on("update_grippers", (grippers) => {
+            this.socket.on("update_grippers", (data) => {
+                const grippers = this._decode("update_grippers", data);
                 if (this.startTime) {
                     if (this.logFullState) {
                         this.currentGrippers = grippers;
@@ -164,7 +166,8 @@ $(document).ready(function () {
                 }
 
             });
-            this.socket.on("update_objs", (objs) => {
+            this.socket.on("update_objs", (data) => {
+                const objs = this._decode("update_objs", data);
                 if (this.startTime) {
                     if (this.logFullState) {
                         this.currentObjs = objs;
@@ -179,7 +182,8 @@ $(document).ready(function () {
                     }
                 }
             });
-            this.socket.on("update_targets", (targets) => {
+            this.socket.on("update_targets", (data) => {
+                const targets = this._decode("update_targets", data);
                 if (this.startTime) {
                     if (this.logFullState) {
                         this.currentTargets = targets;
@@ -194,7 +198,33 @@ $(document).ready(function () {
                     }
                 }
             });
+            this.socket.on("patch", (data) => {
+                const patch = this._decode("patch", data);
+                if (this.startTime) {
+                    let changes = new Object();
+                    for (const key of ["objs", "grippers", "targets"]) {
+                        if (Object.keys(patch[key]).length > 0) {
+                            changes[key] = patch[key];
+                        }
+                    }
+                    if (this.logFullState) {
+                        this.currentObjs = this._applyPatch(
+                            this.currentObjs, patch["objs"]);
+                        this.currentGrippers = this._applyPatch(
+                            this.currentGrippers, patch["grippers"]);
+                        this.currentTargets = this._applyPatch(
+                            this.currentTargets, patch["targets"]);
+                        this._addTimestamp(this._getTimestamp(),
+                                           this._getFullState());
+                    } else {
+                        // a patch already only contains the changes
+                        this._addTimestamp(this._getTimestamp(), changes);
+                    }
+                }
+            });
             this.socket.on("update_config", (config) => {
+                // needed to decode binary updates
+                this.typeConfig = config.type_config;
                 if (this.startTime) {
                     if (this.logFullState) {
                         this.currentConfig = config;
@@ -320,6 +350,35 @@ $(document).ready(function () {
 
         // --- helper functions --- //
 
+        /**
+         * Restore the json format of a payload sent in the binary format.
+         * @param {name of the received event} eventName
+         * @param {received payload} data
+         */
+        _decode(eventName, data) {
+            return document.WireFormat ?
+                document.WireFormat.decode(eventName, data, this.typeConfig) :
+                data;
+        }
+
+        /**
+         * Merge changed entries into a copy of the current entities.
+         * @param {object mapping ids to entities} current
+         * @param {object mapping ids to new entities or null if removed} changes
+         * @return updated object mapping ids to entities
+         */
+        _applyPatch(current, changes) {
+            let updated = Object.assign(new Object(), current);
+            for (const [id, entity] of Object.entries(changes)) {
+                if (entity === null) {
+                    delete updated[id];
+                } else {
+                    updated[id] = entity;
+                }
+            }
+            return updated;
+        }
+
         /**
          * Create a timestamp in ms passed since the starting point. If logging
          * has not yet started, returns -1.
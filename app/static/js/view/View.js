@@ -20,6 +20,8 @@ $(document).ready(function () {
             this.objs = new Object();
             this.grippers = new Object();
             this.targets = new Object();
+            // revision of the last applied state or patch
+            this.revision;
         }
 
         /**
@@ -29,9 +31,11 @@ $(document).ready(function () {
         _initSocketEvents() {
             // new state -> redraw object and gripper layer,
             // if targets are given, redraw background
-            this.socket.on("update_state", (state) => {
+            this.socket.on("update_state", (data) => {
+                const state = this._decode("update_state", data);
                 if (state["grippers"] && state["objs"]) {
                     this.onUpdateState(state) // hook
+                    this.revision = state["revision"];
                     this.grippers = state["grippers"];
                     this.objs = state["objs"];
                     this.redrawGr();
@@ -47,22 +51,52 @@ $(document).ready(function () {
                 }
             });
             // new gripper state -> redraw grippers
-            this.socket.on("update_grippers", (grippers) => {
+            this.socket.on("update_grippers", (data) => {
+                const grippers = this._decode("update_grippers", data);
                 this.grippers = grippers;
                 this.redrawGr();
             });
             // new object state -> redraw objects
-            this.socket.on("update_objs", (objs) => {
+            this.socket.on("update_objs", (data) => {
+                const objs = this._decode("update_objs", data);
                 this.onUpdateObjects(objs); // hook
                 this.objs = objs;
                 this.redrawObjs();
             });
             // new target state -> redraw background
-            this.socket.on("update_targets", (targets) => {
+            this.socket.on("update_targets", (data) => {
+                const targets = this._decode("update_targets", data);
                 this.onUpdateTargets(targets); // hook
                 this.targets = targets;
                 this.redrawBg();
             });
+            // changed entities only -> merge and redraw affected layers
+            this.socket.on("patch", (data) => {
+                const patch = this._decode("patch", data);
+                if (this.revision === undefined ||
+                        patch["base_revision"] != this.revision) {
+                    // missed an update, request a full snapshot
+                    this.socket.emit("sync", {"revision": this.revision});
+                    return;
+                }
+                this.revision = patch["revision"];
+                if (Object.keys(patch["objs"]).length > 0) {
+                    let objs = this._applyPatch(this.objs, patch["objs"]);
+                    this.onUpdateObjects(objs); // hook
+                    this.objs = objs;
+                    this.redrawObjs();
+                }
+                if (Object.keys(patch["targets"]).length > 0) {
+                    let targets = this._applyPatch(this.targets, patch["targets"]);
+                    this.onUpdateTargets(targets); // hook
+                    this.targets = targets;
+                    this.redrawBg();
+                }
+                if (Object.keys(patch["grippers"]).length > 0) {
+                    this.grippers = this._applyPatch(this.grippers, patch["grippers"]);
+                    this.redrawGr();
+                }
+            });
             // new configuration -> save values and redraw everything
             this.socket.on("update_config", (config) => {
                 this._loadConfig(config);
@@ -70,6 +104,35 @@ $(document).ready(function () {
             });
         }
 
+        /**
+         * Restore the json format of a payload sent in the binary format.
+         * @param {name of the received event} eventName
+         * @param {received payload} data
+         */
+        _decode(eventName, data) {
+            return document.WireFormat ?
+                document.WireFormat.decode(eventName, data, this.typeConfig) :
+                data;
+        }
+
+        /**
+         * Merge changed entries into a copy of the current entities.
+         * @param {object mapping ids to entities} current
+         * @param {object mapping ids to new entities or null if removed} changes
+         * @return updated object mapping ids to entities
+         */
+        _applyPatch(current, changes) {
+            let updated = Object.assign(new Object(), current);
+            for (const [id, entity] of Object.entries(changes)) {
+                if (entity === null) {
+                    delete updated[id];
+                } else {
+                    updated[id] = entity;
+                }
+            }
+            return updated;
+        }
+
         // --- getter / setter --- //
         // canvas width in pixels.
         get canvasWidth() {
@@ -188,6 +251,8 @@ $(document).ready(function () {
             // Save all relevant values
             this.cols = config.width;
             this.rows = config.height;
+            // needed to decode binary updates
+            this.typeConfig = config.type_config;
         }
 
     }; // class View end
@@ -0,0 +1,129 @@
+$(document).ready(function () {
+    /**
+     * Decoder for the compact binary format a client can request when
+     * joining a room ({"encoding": "msgpack"}). State events then carry
+     * MessagePack data in which objects and grippers are arrays with a
+     * fixed field order and objects have no block matrix. The decoder
+     * restores the usual json payloads, rebuilding block matrices from
+     * the type_config. Requires the MessagePack library
+     * (https://github.com/msgpack/msgpack-javascript).
+     * Field orders must match golmi/server/wire.py.
+     */
+    this.WireFormat = class WireFormat {
+        /**
+         * @param {name of the received event} eventName
+         * @param {received payload} data
+         * @param {object mapping type names to block matrices} typeConfig
+         * @return payload in the json format, data itself if it is not binary
+         */
+        static decode(eventName, data, typeConfig) {
+            if (!(data instanceof ArrayBuffer || ArrayBuffer.isView(data))) {
+                return data;
+            }
+            const payload = MessagePack.decode(data);
+            switch (eventName) {
+                case "update_objs":
+                case "update_targets":
+                    return WireFormat._decodeMap(payload, typeConfig,
+                                                 WireFormat.decodeObj);
+                case "update_grippers":
+                    return WireFormat._decodeMap(payload, typeConfig,
+                                                 WireFormat.decodeGripper);
+                default:
+                    // update_state and patch
+                    for (const key of ["objs", "targets"]) {
+                        if (payload[key]) {
+                            payload[key] = WireFormat._decodeMap(
+                                payload[key], typeConfig, WireFormat.decodeObj);
+                        }
+                    }
+                    if (payload["grippers"]) {
+                        payload["grippers"] = WireFormat._decodeMap(
+                            payload["grippers"], typeConfig,
+                            WireFormat.decodeGripper);
+                    }
+                    return payload;
+            }
+        }
+
+        static _decodeMap(entries, typeConfig, decodeFn) {
+            let decoded = new Object();
+            for (const [id, entry] of Object.entries(entries)) {
+                // removed entries in patches are null
+                decoded[id] = entry === null ? null : decodeFn(entry, typeConfig);
+            }
+            return decoded;
+        }
+
+        /**
+         * @param {array [id_n, type, x, y, rotation, mirrored, color, gripped,
+         *         orientation]} entry
+         * @param {object mapping type names to block matrices} typeConfig
+         * @return object as sent in the json format
+         */
+        static decodeObj(entry, typeConfig) {
+            const [idN, type, x, y, rotation, mirrored, color, gripped,
+                   orientation] = entry;
+            let obj = {
+                "id_n": idN,
+                "type": type,
+                "x": x,
+                "y": y,
+                "rotation": rotation,
+                "color": color,
+                "block_matrix": Array.isArray(orientation) ?
+                    orientation :
+                    WireFormat.variant(typeConfig[type], orientation)
+            };
+            if (mirrored) { obj["mirrored"] = mirrored; }
+            if (gripped) { obj["gripped"] = gripped; }
+            return obj;
+        }
+
+        /**
+         * @param {array [id_n, x, y, color, gripped]} entry
+         * @param {object mapping type names to block matrices} typeConfig
+         * @return gripper as sent in the json format
+         */
+        static decodeGripper(entry, typeConfig) {
+            const [idN, x, y, color, gripped] = entry;
+            let grippedObj = null;
+            if (gripped) {
+                grippedObj = new Object();
+                grippedObj[gripped[0]] = WireFormat.decodeObj(gripped, typeConfig);
+            }
+            return {
+                "id_n": idN,
+                "x": x,
+                "y": y,
+                "color": color,
+                "gripped": grippedObj
+            };
+        }
+
+        /**
+         * Variant i of a block matrix: for i >= 4 the matrix is mirrored
+         * at the horizontal axis first, then rotated clockwise by i % 4
+         * quarter turns.
+         * @param {block matrix of a type} matrix
+         * @param {index 0 to 7} index
+         * @return new block matrix
+         */
+        static variant(matrix, index) {
+            let result = index >= 4 ? [...matrix].reverse() : matrix;
+            for (let turn = 0; turn < index % 4; turn++) {
+                const height = result.length;
+                const width = result[0].length;
+                let rotated = new Array();
+                for (let row = 0; row < width; row++) {
+                    rotated.push(new Array());
+                    for (let col = 0; col < height; col++) {
+                        rotated[row].push(result[height - 1 - col][row]);
+                    }
+                }
+                result = rotated;
+            }
+            return result;
+        }
+    }; // class WireFormat end
+}); // on document ready end
@@ -0,0 +1,74 @@
+"""
+Benchmark of the legality check used by the Mover for the different
+grid backends. Usage (from the repository root):
+
+    python -m benchmarks.legality [--objs N] [--repeat R]
+
+For each backend a pentomino board is filled with random pieces and
+Mover._is_legal_move is timed for moves in all four directions as well
+as left/right rotations and flips of every piece.
+"""
+import argparse
+import random
+import timeit
+
+from golmi.contrib.pentomino.config import PentoConfig
+from golmi.server.generator import Generator
+from golmi.server.mover import Mover
+
+
+def candidate_moves(obj):
+    """
+    @return list of (x, y, block_matrix) tuples reachable by one action
+    """
+    moves = [
+        (obj.x + dx, obj.y + dy, obj.block_matrix)
+        for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1))
+    ]
+    orientation = obj.get_orientation()
+    for d_angle in (90, -90):
+        moves.append((obj.x, obj.y, orientation.rotated(d_angle).matrix))
+    moves.append((obj.x, obj.y, orientation.flipped.matrix))
+    return moves
+
+
+def run(backend, n_objs, repeat, seed=42):
+    config = PentoConfig()
+    config.grid_backend = backend
+    random.seed(seed)
+    state = Generator(config).generate_random_state(n_objs, 0, target_area=None)
+    mover = Mover()
+
+    checks = [
+        (obj, x, y, matrix)
+        for obj in state.objs.values()
+        for x, y, matrix in candidate_moves(obj)
+    ]
+
+    def check_all():
+        return [
+            mover._is_legal_move(obj, x, y, matrix, state, config)
+            for obj, x, y, matrix in checks
+        ]
+
+    seconds = min(timeit.repeat(check_all, number=1, repeat=repeat))
+    return len(checks), seconds, sum(check_all())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--objs", type=int, default=60,
+                        help="Number of pieces on the board. (Default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=20,
+                        help="Timing repetitions, the best one is reported. "
+                             "(Default: %(default)s)")
+    args = parser.parse_args()
+
+    baseline = None
+    for backend in ["tiles", "numpy", "bitboard"]:
+        n_checks, seconds, n_legal = run(backend, args.objs, args.repeat)
+        per_check = seconds / n_checks * 1e6
+        if baseline is None:
+            baseline = per_check
+        print(f"{backend:>8}: {n_checks} checks ({n_legal} legal), "
+              f"{per_check:.2f} us/check, {baseline / per_check:.1f}x")
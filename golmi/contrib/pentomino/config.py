@@ -23,5 +23,6 @@ class PentoConfig(Config):
                                           prevent_overlap=True,
                                           move_step=1,
                                           actions=["move", "rotate", "flip", "grip"],
-                                          colors=load_colors_as_list()
+                                          colors=load_colors_as_list(),
+                                          grid_backend="bitboard"
                                           )
@@ -0,0 +1,339 @@
+"""
+Streaming generation of pentomino referring expression datasets. Usage (from
+the repository root):
+
+    python -m golmi.contrib.pentomino.dataset OUT_DIR --samples N
+        [--shard-size K] [--width W --height H] [--size S] [--seed SEED]
+        [--workers N] [--restart]
+
+A sample is a board with a target piece and distractor pieces for one
+utterance type (the properties that the expression has to mention), sampled by
+UtteranceTypeOrientedDistractorSetSampler, and the referring expression of
+PentoIncrementalAlgorithm for the target. The samples pass one at a time
+through the stages sample_pieces, realize_boards, generate_expressions and
+render_images (see iter_samples).
+
+The sample ids are split into shards of consecutive ids that worker processes
+generate independently. A sample only depends on the seed and its id, not on
+the shard or worker. Shard k is written to OUT_DIR/shard-{k:05d}.npy (images of
+shape (samples, height, width, 3) and dtype uint8) and OUT_DIR/shard-{k:05d}.jsonl
+(one annotation per image, see to_annotation), only one shard per worker is
+held in memory. OUT_DIR/checkpoint.json records the config and the written
+shards, so that an interrupted run continues with the missing shards.
+"""
+import argparse
+import json
+import os
+import random
+from multiprocessing import Pool
+from typing import List
+
+import numpy as np
+
+from golmi.contrib.pentomino.objects import Board, BoardRasterizer
+from golmi.contrib.pentomino.symbolic.algos import PentoIncrementalAlgorithm
+from golmi.contrib.pentomino.symbolic.sampling import UtteranceTypeOrientedDistractorSetSampler
+from golmi.contrib.pentomino.symbolic.types import Colors, PropertyNames, RelPositions, Shapes, SymbolicPiece
+from golmi.server.grid import GridConfig
+
+UTTERANCE_TYPES = [[PropertyNames.COLOR], [PropertyNames.SHAPE], [PropertyNames.REL_POSITION],
+                   [PropertyNames.COLOR, PropertyNames.SHAPE], [PropertyNames.COLOR, PropertyNames.REL_POSITION],
+                   [PropertyNames.SHAPE, PropertyNames.REL_POSITION],
+                   [PropertyNames.COLOR, PropertyNames.SHAPE, PropertyNames.REL_POSITION]]
+
+
+class DatasetConfig:
+
+    def __init__(self, n_samples: int, grid_config: GridConfig = None, image_size=(224, 224), n_distractors=(3, 6),
+                 utterance_types: List[List[PropertyNames]] = None, colors: List[Colors] = None,
+                 shapes: List[Shapes] = None, rel_positions: List[RelPositions] = None,
+                 preference_order: List[PropertyNames] = None, shard_size: int = 256, seed: int = 0):
+        """
+        @param n_samples        number of samples, the sample ids are 0, ..., n_samples - 1
+        @param grid_config      GridConfig of the boards, default: 20 x 20 without overlaps
+        @param image_size       (width, height) of the images
+        @param n_distractors    (min, max) number of distractors per board
+        @param utterance_types  lists of the properties to mention, one is drawn per sample, default: all
+        @param colors           colors of the pieces, default: all (the same for shapes and rel_positions)
+        @param preference_order of PentoIncrementalAlgorithm, default: color, shape, position as assumed by the
+                                distractor sampler
+        @param shard_size       number of samples per shard
+        @param seed             the samples are determined by the seed and their ids
+        """
+        self.n_samples = n_samples
+        self.grid_config = grid_config if grid_config else GridConfig(20, 20, move_step=1, prevent_overlap=True)
+        self.image_size = tuple(image_size)
+        self.n_distractors = tuple(n_distractors)
+        self.utterance_types = utterance_types if utterance_types else UTTERANCE_TYPES
+        self.colors = colors if colors else list(Colors)
+        self.shapes = shapes if shapes else list(Shapes)
+        self.rel_positions = rel_positions if rel_positions else list(RelPositions)
+        self.preference_order = preference_order if preference_order else \
+            [PropertyNames.COLOR, PropertyNames.SHAPE, PropertyNames.REL_POSITION]
+        self.shard_size = shard_size
+        self.seed = seed
+
+    @property
+    def n_shards(self):
+        return -(-self.n_samples // self.shard_size)
+
+    def get_pieces(self) -> List[SymbolicPiece]:
+        return [SymbolicPiece(color, shape, rel_position)
+                for color in self.colors for shape in self.shapes for rel_position in self.rel_positions]
+
+    def to_dict(self):
+        return {
+            "n_samples": self.n_samples,
+            "grid_config": self.grid_config.to_dict(),
+            "image_size": list(self.image_size),
+            "n_distractors": list(self.n_distractors),
+            "utterance_types": [[pn.to_json() for pn in utterance_type] for utterance_type in self.utterance_types],
+            "colors": [color.to_json() for color in self.colors],
+            "shapes": [shape.to_json() for shape in self.shapes],
+            "rel_positions": [rel_position.to_json() for rel_position in self.rel_positions],
+            "preference_order": [pn.to_json() for pn in self.preference_order],
+            "shard_size": self.shard_size,
+            "seed": self.seed,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d["n_samples"], GridConfig.from_dict(d["grid_config"]), d["image_size"], d["n_distractors"],
+                   [[PropertyNames.from_json(pn) for pn in utterance_type] for utterance_type in d["utterance_types"]],
+                   [Colors.from_json(color) for color in d["colors"]],
+                   [Shapes.from_json(shape) for shape in d["shapes"]],
+                   [RelPositions.from_json(rel_position) for rel_position in d["rel_positions"]],
+                   [PropertyNames.from_json(pn) for pn in d["preference_order"]],
+                   d["shard_size"], d["seed"])
+
+
+def sample_pieces(config: DatasetConfig, sample_ids, samplers: dict = None, skipped: List[int] = None):
+    """
+    Draw the target piece, the utterance type and the distractors per sample.
+    The random module is seeded per sample, the later stages continue with it
+    before the next sample is drawn.
+    @param samplers dict of distractor samplers by target piece to reuse
+    @param skipped  list to append the ids of the left out samples to
+    @return generator of sample dicts with sample_id, target, utterance_type
+            and distractors, samples without any distractor set of the drawn
+            utterance type and size are left out
+    """
+    pieces = config.get_pieces()
+    if samplers is None:
+        samplers = dict()
+    if skipped is None:
+        skipped = list()
+    for sample_id in sample_ids:
+        random.seed(f"{config.seed}:{sample_id}")
+        target = random.choice(pieces)
+        utterance_type = random.choice(config.utterance_types)
+        n_distractors = random.randint(*config.n_distractors)
+        if target not in samplers:
+            samplers[target] = UtteranceTypeOrientedDistractorSetSampler(pieces, target)
+        # the skip check and the draw use the same distinct distractor sets
+        space = samplers[target].get_distractor_space(set(utterance_type), n_distractors)
+        if space.size == 0:
+            skipped.append(sample_id)
+            continue
+        distractors = space.get(random.randrange(space.size))
+        yield {"sample_id": sample_id, "target": target, "utterance_type": utterance_type,
+               "distractors": list(distractors)}
+
+
+def realize_boards(config: DatasetConfig, samples, skipped: List[int] = None):
+    """
+    Place the target (piece id 0) and the distractors on a board per sample.
+    Distractors that do not fit on the board are left out, samples whose target
+    does not fit are left out and their ids appended to skipped.
+    """
+    if skipped is None:
+        skipped = list()
+    for sample in samples:
+        board = Board(config.grid_config, sample["sample_id"])
+        if not board.add_piece_from_symbol(sample["target"]):
+            skipped.append(sample["sample_id"])
+            continue
+        board.add_pieces_from_symbols(sample["distractors"])
+        sample["board"] = board
+        yield sample
+
+
+def generate_expressions(config: DatasetConfig, samples):
+    """ Add the expression, properties and is_discriminating of PentoIncrementalAlgorithm per sample """
+    algorithm = PentoIncrementalAlgorithm(config.preference_order)
+    for sample in samples:
+        pieces = [piece.piece_config for piece in sample["board"].pieces]
+        sample["expression"], sample["properties"], sample["is_discriminating"] = \
+            algorithm.generate(pieces, sample["target"], is_selection_in_pieces=True)
+        yield sample
+
+
+def render_images(config: DatasetConfig, samples, ctx=None):
+    """ Add the image of the board per sample, rendered with ctx (default: BoardRasterizer) """
+    if ctx is None:
+        ctx = BoardRasterizer(config.image_size)
+    for sample in samples:
+        sample["image"] = sample["board"].to_image_array(config.image_size, ctx=ctx)
+        yield sample
+
+
+def iter_samples(config: DatasetConfig, sample_ids, ctx=None, samplers: dict = None, skipped: List[int] = None):
+    """
+    Stream the samples through all stages, one sample at a time.
+    @param sample_ids   iterable of sample ids, e.g. range(config.n_samples)
+    @param ctx          rendering context, see render_images
+    @param samplers     dict of distractor samplers to reuse, see sample_pieces
+    @param skipped      list to append the ids of the left out samples to
+    @return generator of sample dicts, see to_annotation
+    """
+    samples = sample_pieces(config, sample_ids, samplers, skipped)
+    samples = realize_boards(config, samples, skipped)
+    samples = generate_expressions(config, samples)
+    return render_images(config, samples, ctx)
+
+
+def to_annotation(config: DatasetConfig, sample, image_index: int):
+    """
+    @return json serializable dict with the sample_id, the image_index in the
+            shard, the target_id and target, the utterance_type, the expression,
+            the properties of the expression, is_discriminating, the state of the
+            board (see Board.to_state_dict) and the bounding boxes of the pieces
+            as in golmi.contrib.pentomino.render
+    """
+    board = sample["board"]
+    width, height = config.image_size
+    return {
+        "sample_id": sample["sample_id"],
+        "image_index": image_index,
+        "target_id": board.pieces[0].piece_id,
+        "target": sample["target"].to_json(),
+        "utterance_type": [pn.to_json() for pn in sample["utterance_type"]],
+        "expression": sample["expression"],
+        "properties": dict([(pn.to_json(), value.to_json()) for pn, value in sample["properties"].items()]),
+        "is_discriminating": sample["is_discriminating"],
+        "state": board.to_state_dict(),
+        "bboxes": [{"piece_id": piece.piece_id, "bbox": list(board.get_bbox(width, height, piece))}
+                   for piece in board.pieces],
+    }
+
+
+# generation context of the current (worker) process, see _init_worker
+_worker = dict()
+
+
+def _init_worker(config, out_dir):
+    config = DatasetConfig.from_dict(config)
+    _worker["config"] = config
+    _worker["out_dir"] = out_dir
+    _worker["ctx"] = BoardRasterizer(config.image_size)
+    _worker["samplers"] = dict()
+    # the samples seed the random module, restored when running in the calling process
+    _worker["random_state"] = random.getstate()
+
+
+def _close_worker():
+    _worker["ctx"].close()
+    random.setstate(_worker["random_state"])
+    _worker.clear()
+
+
+def get_shard_prefix(out_dir, shard_id: int):
+    return os.path.join(out_dir, f"shard-{shard_id:05d}")
+
+
+def generate_shard(shard_id: int):
+    """
+    Generate the samples of a shard and write its images and annotations, run
+    by the worker processes. The files are written under temporary names and
+    renamed when complete.
+    @return tuple (shard_id, number of samples written, ids of the left out samples)
+    """
+    config = _worker["config"]
+    start = shard_id * config.shard_size
+    stop = min(start + config.shard_size, config.n_samples)
+    width, height = config.image_size
+    images = np.zeros((stop - start, height, width, 3), dtype=np.uint8)
+    prefix = get_shard_prefix(_worker["out_dir"], shard_id)
+    n_written = 0
+    skipped = list()
+    with open(prefix + ".jsonl.tmp", "w") as file:
+        for sample in iter_samples(config, range(start, stop), _worker["ctx"], _worker["samplers"], skipped):
+            images[n_written] = sample["image"]
+            file.write(json.dumps(to_annotation(config, sample, n_written)) + "\n")
+            n_written += 1
+    with open(prefix + ".npy.tmp", "wb") as file:
+        np.save(file, images[:n_written])
+    os.replace(prefix + ".npy.tmp", prefix + ".npy")
+    os.replace(prefix + ".jsonl.tmp", prefix + ".jsonl")
+    return shard_id, n_written, skipped
+
+
+def _write_checkpoint(checkpoint_path, checkpoint):
+    with open(checkpoint_path + ".tmp", "w") as file:
+        json.dump(checkpoint, file)
+    os.replace(checkpoint_path + ".tmp", checkpoint_path)
+
+
+def build_dataset(config: DatasetConfig, out_dir, n_workers=None, restart=False):
+    """
+    Generate the shards of the dataset in parallel and write them to out_dir.
+    @param config       DatasetConfig
+    @param out_dir      directory of the shards and the checkpoint, created if missing
+    @param n_workers    number of processes, default: number of cores.
+                        1 generates in the calling process.
+    @param restart      True to generate all shards again, otherwise the shards
+                        in the checkpoint of a previous run are kept
+    @return dict by shard id with the number of samples written ("n_samples")
+            and the ids of the left out samples ("skipped"), see sample_pieces
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    checkpoint_path = os.path.join(out_dir, "checkpoint.json")
+    checkpoint = {"config": config.to_dict(), "shards": {}}
+    if not restart and os.path.exists(checkpoint_path):
+        with open(checkpoint_path) as file:
+            previous = json.load(file)
+        if previous["config"] != checkpoint["config"]:
+            raise ValueError(f"The checkpoint in {out_dir} was written with another config, "
+                             f"restart or use another directory")
+        checkpoint = previous
+    _write_checkpoint(checkpoint_path, checkpoint)
+
+    pending = [shard_id for shard_id in range(config.n_shards) if str(shard_id) not in checkpoint["shards"]]
+    init_args = (config.to_dict(), out_dir)
+
+    def record(results):
+        for shard_id, n_written, skipped in results:
+            checkpoint["shards"][str(shard_id)] = {"n_samples": n_written, "skipped": skipped}
+            _write_checkpoint(checkpoint_path, checkpoint)
+
+    if n_workers == 1:
+        _init_worker(*init_args)
+        try:
+            record(map(generate_shard, pending))
+        finally:
+            _close_worker()
+    else:
+        with Pool(n_workers, initializer=_init_worker, initargs=init_args) as pool:
+            record(pool.imap_unordered(generate_shard, pending))
+    return dict([(int(shard_id), shard) for shard_id, shard in checkpoint["shards"].items()])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a sharded pentomino referring expression dataset.")
+    parser.add_argument("out_dir", help="Directory of the shards and the checkpoint.")
+    parser.add_argument("--samples", type=int, required=True, help="Number of samples.")
+    parser.add_argument("--shard-size", type=int, default=256, help="Samples per shard. (Default: %(default)s)")
+    parser.add_argument("--width", type=int, default=20, help="Board width. (Default: %(default)s)")
+    parser.add_argument("--height", type=int, default=20, help="Board height. (Default: %(default)s)")
+    parser.add_argument("--size", type=int, default=224, help="Width and height of the images. (Default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed. (Default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=None, help="Number of processes. (Default: all cores)")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint of a previous run.")
+    args = parser.parse_args()
+
+    dataset_config = DatasetConfig(args.samples, GridConfig(args.width, args.height, move_step=1, prevent_overlap=True),
+                                   image_size=(args.size, args.size), shard_size=args.shard_size, seed=args.seed)
+    shards = build_dataset(dataset_config, args.out_dir, n_workers=args.workers, restart=args.restart)
+    n_skipped = sum(len(shard["skipped"]) for shard in shards.values())
+    print(f"Wrote {sum(shard['n_samples'] for shard in shards.values())} samples in {len(shards)} shards "
+          f"to {args.out_dir}, skipped {n_skipped}")
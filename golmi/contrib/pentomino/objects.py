@@ -1,13 +1,13 @@
+import random
 from enum import Enum
 from typing import List, Dict, Tuple
 
 import numpy as np
-from matplotlib import pyplot as plt
-from matplotlib import colors as plt_colors
 
 from golmi.contrib.pentomino.symbolic.types import SymbolicPiece, Colors, Shapes, RelPositions, Rotations
-from golmi.server.grid import GridConfig, Grid
-from golmi.server.obj import Obj
+from golmi.server.generator import free_anchors
+from golmi.server.grid import GridConfig, create_grid
+from golmi.server.obj import Obj, Orientation
 from golmi.server.state import State
 
 
@@ -127,8 +127,11 @@ class Piece:
         return cls(piece_id, piece_symbol, piece_obj)
 
     @classmethod
-    def from_symbol(cls, piece_id, piece_symbol, board_width, board_height):
-        x, y = piece_symbol.rel_position.to_random_coords(board_width, board_height)
+    def from_symbol(cls, piece_id, piece_symbol, board_width, board_height, coords: Tuple[int, int] = None):
+        """ coords: upper-left corner of the piece, by default random coords in the piece's relative position """
+        if coords is None:
+            coords = piece_symbol.rel_position.to_random_coords(board_width, board_height)
+        x, y = coords
         shape_matrix = ShapesMatrix[piece_symbol.shape.value]
         piece_obj = Obj(piece_id,
                         obj_type=piece_symbol.shape.value,
@@ -140,12 +143,60 @@ class Piece:
         return cls(piece_id, piece_symbol, piece_obj)
 
 
+def board_borders(np_board: np.array):
+    """
+    detect the borders of the pieces in a 2D array (from get_matrix): a
+    border separates two different values, at least one of them a piece
+    @return tuple (vertical, horizontal) of boolean arrays, vertical has
+            shape (rows, cols + 1) and is True left of a cell with a border,
+            horizontal has shape (rows + 1, cols) and is True above a cell
+            with a border
+    """
+    padded = np.pad(np_board, 1)
+    left, right = padded[1:-1, :-1], padded[1:-1, 1:]
+    top, bottom = padded[:-1, 1:-1], padded[1:, 1:-1]
+    vertical = (left != right) & ((left != 0) | (right != 0))
+    horizontal = (top != bottom) & ((top != 0) | (bottom != 0))
+    return vertical, horizontal
+
+
+def _runs(lines: np.array):
+    """
+    @return arrays (line, start, end) of the runs of True along axis 1
+    """
+    edges = np.diff(np.pad(lines, ((0, 0), (1, 1))).astype(np.int8), axis=1)
+    line, start = np.nonzero(edges == 1)
+    _, end = np.nonzero(edges == -1)
+    return line, start, end
+
+
+def border_segments(np_board: np.array, to_add=0.5):
+    """
+    detect the borders of the pieces and merge adjacent border pieces to
+    long lines to avoid seam lines in the black borders
+    @return (n, 2, 2) array of lines [[x_start, y_start], [x_end, y_end]] in
+            board coordinates (cell centers are integers), horizontal lines
+            first, e.g. to be plotted as a LineCollection
+    """
+    vertical, horizontal = board_borders(np_board)
+    y, x_start, x_end = _runs(horizontal)
+    h_lines = np.stack([np.stack([x_start, y], axis=1),
+                        np.stack([x_end, y], axis=1)], axis=1)
+    x, y_start, y_end = _runs(vertical.T)
+    v_lines = np.stack([np.stack([x, y_start], axis=1),
+                        np.stack([x, y_end], axis=1)], axis=1)
+    return np.concatenate([h_lines, v_lines]) - to_add
+
+
 class BoardPlotContext:
 
     def __init__(self, image_size: Tuple[int]):
+        # matplotlib is only needed for plotting, not for the rasterizer
+        from matplotlib import pyplot as plt
         fig_size = (image_size[0] / 100, image_size[1] / 100)
         self.fig, self.ax = plt.subplots(figsize=fig_size, dpi=100)
         self.image_context = None
+        self.border_context = None
         self.ax.tick_params(axis="both", which="both", bottom=False, top=False, left=False, right=False,
                             labelbottom=False, labelleft=False)
         self.ax.axis('off')
@@ -154,14 +205,20 @@ class BoardPlotContext:
         ax = self.ax
         if verbose:
             print("Get borders and eliminate seams within them")
-        borders = self.__get_borders(np_board)
-        l_borders = self.__find_long(borders)
+        borders = border_segments(np_board)
         if verbose:
             print("Plot borders of all objects")
-        for x, y in l_borders:
-            ax.plot(x, y, scaley=False, linestyle="-", linewidth=.5, color="black")
+        if self.border_context:
+            self.border_context.set_segments(borders)
+        else:
+            # lazy init of the border_context for later re-use
+            from matplotlib.collections import LineCollection
+            self.border_context = LineCollection(borders, linestyle="-", linewidth=.5, color="black",
+                                                 capstyle="projecting", zorder=2)
+            ax.add_collection(self.border_context, autolim=False)
         if verbose:
             print("Plot image")
+        from matplotlib import colors as plt_colors
         cmap = plt_colors.ListedColormap([o[1] for o in obj_colors])
         norm = plt_colors.BoundaryNorm(bounds, cmap.N)
         if self.image_context:
@@ -180,126 +237,106 @@ class BoardPlotContext:
         ax.figure.canvas.draw()
         if verbose:
             print("Get the RGBA buffer from the figure")
-        w, h = self.fig.canvas.get_width_height()
-        buf = np.frombuffer(self.fig.canvas.tostring_rgb(), dtype=np.uint8).reshape(w, h, 3)
+        # tostring_rgb was removed from newer matplotlib versions
+        buf = np.array(self.fig.canvas.buffer_rgba())[..., :3]
         del cmap
         del norm
-        ax.lines.clear()  # remove borders for next plot
         return buf
 
     def close(self):
+        from matplotlib import pyplot as plt
         plt.cla()
         plt.clf()
         plt.close(self.fig)
 
-    def __get_borders(self, np_board: np.array, to_add=0.5):
-        """ iterate over the the 2D array (from get_matrix) and detect borders """
-        lines = list()
-        for y, row in enumerate(np_board):
-            for x, tile in enumerate(row):
-                if tile != 0:
-                    output_list = lines
-                    # upper bound
-                    if y == 0 or np_board[y - 1][x] != tile:
-                        this_line = (
-                            (x - to_add, x + to_add),
-                            (y - to_add, y - to_add),
-                        )
-                        output_list.append(this_line)
-                    # lower bound
-                    if y == len(np_board) - 1 or np_board[y + 1][x] != tile:
-                        this_line = (
-                            (x - to_add, x + to_add),
-                            (y + to_add, y + to_add),
-                        )
-                        output_list.append(this_line)
-                    # right bound
-                    if x == len(np_board[0]) - 1 or np_board[y][x + 1] != tile:
-                        this_line = (
-                            (x + to_add, x + to_add),
-                            (y - to_add, y + to_add),
-                        )
-                        output_list.append(this_line)
-                    # left bound
-                    if x == 0 or np_board[y][x - 1] != tile:
-                        this_line = (
-                            (x - to_add, x - to_add),
-                            (y - to_add, y + to_add),
-                        )
-                        output_list.append(this_line)
-        return lines
-
-    def __find_long(self, coord):
+
+class BoardRasterizer:
+    """
+    Draws boards like BoardPlotContext, but directly with numpy: cells are
+    filled with their color, piece borders are detected on the cell array
+    and drawn as one pixel wide lines. The image is centered and keeps the
+    aspect ratio of the board, like the matplotlib plot.
+    """
+    # borders are plotted with linewidth .5 points at 100 dpi, i.e. they
+    # cover 0.694 of the pixel they are snapped to
+    LINE_COVERAGE = .5 * 100 / 72
+
+    def __init__(self, image_size: Tuple[int]):
+        self.image_size = image_size
+
+    def draw_board(self, np_board, obj_colors, bounds, verbose=False):
+        """
+        @param np_board     2D array of fill values, see Board.to_image_array
+        @param obj_colors   one color tuple (name, hex, rgb) per fill value
+                            interval in bounds
+        @param bounds       boundaries of the fill value intervals
+        @return (height, width, 3) uint8 RGB array
+        """
+        width, height = int(self.image_size[0]), int(self.image_size[1])
+        n_rows, n_cols = np_board.shape
+        scale = min(width / n_cols, height / n_rows)
+        offset_x = (width - n_cols * scale) / 2
+        offset_y = (height - n_rows * scale) / 2
+
+        # fill: each pixel shows the cell below its center
+        palette = np.array([self.__hex_to_rgb(c[1]) for c in obj_colors] +
+                           [[255, 255, 255]], dtype=float)
+        white = len(obj_colors)
+        indices = np.digitize(np_board, bounds) - 1
+        indices[(indices < 0) | (indices >= white)] = white
+        rows = self.__pixel_cells(height, offset_y, scale)
+        cols = self.__pixel_cells(width, offset_x, scale)
+        valid_rows = (rows >= 0) & (rows < n_rows)
+        valid_cols = (cols >= 0) & (cols < n_cols)
+        rows = rows.clip(0, n_rows - 1)
+        cols = cols.clip(0, n_cols - 1)
+        cells = indices[rows][:, cols]
+        # pixels outside of the board stay white
+        cells[~valid_rows] = white
+        cells[:, ~valid_cols] = white
+
+        if verbose:
+            print("Detect borders")
+        v_borders, h_borders = board_borders(np_board)
+
+        # lines are snapped to the pixel containing the border position
+        line_cols = np.floor(offset_x + np.arange(n_cols + 1) * scale + .5)
+        line_rows = np.floor(offset_y + np.arange(n_rows + 1) * scale + .5)
+        line_cols = line_cols.astype(int)
+        line_rows = line_rows.astype(int)
+        n_lines = np.zeros((height, width), dtype=np.uint8)
+        keep = line_cols < width
+        n_lines[np.ix_(valid_rows, line_cols[keep])] += \
+            v_borders[rows[valid_rows]][:, keep]
+        keep = line_rows < height
+        n_lines[np.ix_(line_rows[keep], valid_cols)] += \
+            h_borders[keep][:, cols[valid_cols]]
+
+        if verbose:
+            print("Draw image")
+        # look up each pixel in the palette shaded by 0, 1 or 2 lines
+        shades = (1 - self.LINE_COVERAGE) ** np.arange(3)
+        palette = np.rint(palette[:, None] * shades[None, :, None])
+        palette = palette.astype(np.uint8).reshape(-1, 3)
+        keys = cells * 3 + np.minimum(n_lines, 2)
+        return palette.take(keys, axis=0)
+
+    @staticmethod
+    def __pixel_cells(n_pixels, offset, scale):
         """
-        reconstruct long borders to avoid seam lines
-        in objects black borders
+        @return index of the cell below the center of each pixel, pixel
+                centers on a cell border belong to the previous cell
         """
-        h_lines = dict()
-        v_lines = dict()
-        results = list()
-
-        # save lines in dictionaries
-        for x, y in coord:
-            # vertical line
-            if len(set(x)) == 1:
-                if x[0] not in v_lines:
-                    v_lines[x[0]] = set()
-                v_lines[x[0]].add(y)
-
-            # horizontal line
-            elif len(set(y)) == 1:
-                if y[0] not in h_lines:
-                    h_lines[y[0]] = set()
-                h_lines[y[0]].add(x)
-        # reconstruct longest lines from each entry
-        # in horizontal dictionary
-        for y, complete_line in h_lines.items():
-            complete_line = list(complete_line)
-            complete_line.sort()
-            begin, end = complete_line[0]
-            i = 1
-            if len(complete_line) == 1:
-                results.append((complete_line[0], (y, y)))
-            else:
-                # iterate over the list and reconstruct the longest lines
-                while i < len(complete_line):
-                    this_b, this_e = complete_line[i]
-                    if end == this_b:
-                        # lines continues, update end
-                        end = this_e
-                        # last element, save
-                        if i == len(complete_line) - 1:
-                            results.append(((begin, end), (y, y)))
-                    else:
-                        # end of line
-                        results.append(((begin, end), (y, y)))
-                        begin, end = complete_line[i]
-                    i += 1
-        # reconstruct longest lines from each entry
-        # in horizontal dictionary
-        for x, complete_line in v_lines.items():
-            complete_line = list(complete_line)
-            complete_line.sort()
-            begin, end = complete_line[0]
-            i = 1
-            if len(complete_line) == 1:
-                results.append(((x, x), complete_line[0]))
-            else:
-                # iterate over the list and reconstruct the longest lines
-                while i < len(complete_line):
-                    this_b, this_e = complete_line[i]
-                    if end == this_b:
-                        # lines continues
-                        end = this_e
-                        # last element, save
-                        if i == len(complete_line) - 1:
-                            results.append(((x, x), (begin, end)))
-                    else:
-                        # end of line
-                        results.append(((x, x), (begin, end)))
-                        begin, end = complete_line[i]
-                    i += 1
-        return results
+        centers = np.arange(n_pixels) + .5 - offset
+        return np.ceil(centers / scale).astype(int) - 1
+
+    def close(self):
+        pass
+
+    @staticmethod
+    def __hex_to_rgb(hex_color: str):
+        hex_color = hex_color.lstrip("#")
+        return [int(hex_color[i:i + 2], 16) for i in (0, 2, 4)]
 
 
 class Board:
@@ -308,9 +345,12 @@ class Board:
         self.board_id = board_id
         self.pieces: List[Piece] = []
         self.pieces_by_id = {}
-        self.grid = Grid.create_from_config(grid_config)
+        self.grid = create_grid(grid_config)
         self.board_width = grid_config.width
         self.board_height = grid_config.height
+        # occupied cells of the board and the free anchors, see get_free_anchors
+        self.occupied = np.zeros((self.board_height, self.board_width), dtype=bool)
+        self.__free_anchors = dict()
 
     def __get_objs_by_id(self):
         return dict([(p.piece_obj.id_n, p.piece_obj) for p in self.pieces])
@@ -353,6 +393,33 @@ class Board:
         self.grid.add_obj(piece.piece_obj)
         self.pieces.append(piece)
         self.pieces_by_id[piece.piece_id] = piece
+        cells = np.floor(piece.piece_obj.occupied_cells()).astype(int)
+        on_board = (cells >= 0).all(axis=1) & (cells[:, 0] < self.board_width) & (cells[:, 1] < self.board_height)
+        self.occupied[cells[on_board, 1], cells[on_board, 0]] = True
+
+    def get_free_anchors(self, rel_position: RelPositions, shape: Shapes, rotation: Rotations = None):
+        """
+        The anchors are computed once per relative position, shape and rotation and
+        only checked against the pieces that were added since.
+        @return (n, 2) array of coords [x, y] in the relative position at which
+                a piece of the shape and rotation fits on the board
+        """
+        key = (rel_position, shape, rotation)
+        entry = self.__free_anchors.get(key)
+        if entry is None:
+            orientation = Orientation.of(ShapesMatrix[shape.value].value)
+            if rotation:
+                orientation = orientation.rotated(rotation.value)
+            x_range, y_range = rel_position.to_coord_ranges(self.board_width, self.board_height)
+            anchors = free_anchors(self.occupied, orientation, x_range, y_range, self.grid.prevent_overlap)
+        else:
+            n_pieces, orientation, anchors = entry
+            if n_pieces < len(self.pieces) and self.grid.prevent_overlap:
+                # remove the anchors at which the piece overlaps with the pieces added since
+                cells = anchors[:, None, :] + orientation.offsets[None, :, :]
+                anchors = anchors[~self.occupied[cells[..., 1], cells[..., 0]].any(axis=1)]
+        self.__free_anchors[key] = (len(self.pieces), orientation, anchors)
+        return anchors
 
     def add_pieces_from_symbols(self, piece_configs: List[SymbolicPiece], max_attempts=100):
         all_success = True
@@ -362,13 +429,16 @@ class Board:
         return all_success
 
     def add_piece_from_symbol(self, piece_symbol: SymbolicPiece, max_attempts=100):
-        for attempt in range(max_attempts):  # re-create with potentially different coords
-            piece = Piece.from_symbol(len(self.pieces), piece_symbol, self.board_width, self.board_height)
-            if self.grid.is_legal_position(piece.piece_obj.occupied(), piece.piece_id):
-                self.add_piece(piece)
-                return True
-        print(f"Max attempts reached, cannot add piece from {piece_symbol}")
-        return False
+        """ place the piece on one of the free anchors, max_attempts is unused as there are no retries """
+        anchors = self.get_free_anchors(piece_symbol.rel_position, piece_symbol.shape, piece_symbol.rotation)
+        if len(anchors) == 0:
+            print(f"No free position, cannot add piece from {piece_symbol}")
+            return False
+        x, y = anchors[random.randrange(len(anchors))]
+        piece = Piece.from_symbol(len(self.pieces), piece_symbol, self.board_width, self.board_height,
+                                  coords=(int(x), int(y)))
+        self.add_piece(piece)
+        return True
 
     def to_image_array(self, image_size, ctx: BoardPlotContext = None, verbose=False):
         """ convert a state to an RGB numpy array """
@@ -379,7 +449,7 @@ class Board:
             print("Create Figure")
         if ctx:
             return ctx.draw_board(np_board, obj_colors, bounds)
-        ctx = BoardPlotContext(image_size)
+        ctx = BoardRasterizer(image_size)
         image = ctx.draw_board(np_board, obj_colors, bounds)
         ctx.close()
         return image
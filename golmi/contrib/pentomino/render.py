@@ -0,0 +1,170 @@
+"""
+Batch rendering of board images for datasets. Usage (from the repository
+root):
+
+    python -m golmi.contrib.pentomino.render STATES OUT [--size S]
+        [--width W --height H] [--workers N] [--chunk-size K] [--plot]
+
+STATES is a jsonl file with one state dict per line as written by
+Board.to_state_dict. The states are rendered by worker
+processes, each with its own rendering context, that write the images
+straight into the memory-mapped array OUT (a .npy file of shape
+(states, height, width, 3) and dtype uint8). Images are never collected in
+the main process. The bounding boxes of the pieces are written to
+OUT.bboxes.json, one list per state with entries
+{"piece_id": id, "bbox": [x_min, x_max, y_min, y_max]} (see Board.get_bbox).
+"""
+import argparse
+import json
+import os
+from collections import deque
+from itertools import islice
+from multiprocessing import Pool
+
+import numpy as np
+
+from golmi.contrib.pentomino.objects import Board, BoardPlotContext, BoardRasterizer
+from golmi.server.grid import GridConfig
+
+# rendering context of the current (worker) process, see _init_worker
+_worker = dict()
+
+
+def _init_worker(out_path, image_size, grid_config, plot):
+    _worker["images"] = np.load(out_path, mmap_mode="r+")
+    _worker["image_size"] = image_size
+    _worker["grid_config"] = GridConfig.from_dict(grid_config) if grid_config else None
+    _worker["ctx"] = BoardPlotContext(image_size) if plot else BoardRasterizer(image_size)
+
+
+def _close_worker():
+    _worker["ctx"].close()
+    _worker.clear()
+
+
+def render_chunk(task):
+    """
+    Render consecutive boards into the memory-mapped images, run by the
+    worker processes.
+    @param task tuple (start, boards), boards are Boards or state dicts and
+                written to the images from index start on
+    @return tuple (start, bboxes) with one bounding box list per board
+    """
+    start, boards = task
+    images = _worker["images"]
+    width, height = _worker["image_size"]
+    bboxes = list()
+    for i, board in enumerate(boards):
+        if not isinstance(board, Board):
+            board = Board.from_state_dict(board, _worker["grid_config"])
+        images[start + i] = board.to_image_array(_worker["image_size"], ctx=_worker["ctx"])
+        bboxes.append([{"piece_id": piece.piece_id, "bbox": list(board.get_bbox(width, height, piece))}
+                       for piece in board.pieces])
+    images.flush()
+    return start, bboxes
+
+
+def _chunks(boards, chunk_size):
+    start = 0
+    while True:
+        chunk = list(islice(boards, chunk_size))  # boards is an iterator
+        if not chunk:
+            return
+        yield start, chunk
+        start += len(chunk)
+
+
+def _imap_bounded(pool, func, tasks, max_pending):
+    """
+    Like Pool.imap, but submits the next task only when less than
+    max_pending tasks are unfinished. Pool.imap and imap_unordered drain
+    the tasks up front, a lazy iterable of boards would be held in memory
+    at once.
+    """
+    pending = deque()
+    for task in tasks:
+        if len(pending) == max_pending:
+            yield pending.popleft().get()
+        pending.append(pool.apply_async(func, (task,)))
+    while pending:
+        yield pending.popleft().get()
+
+
+def render_boards(boards, out_path, image_size=(224, 224), n_boards=None, grid_config: GridConfig = None,
+                  n_workers=None, chunk_size=64, plot=False):
+    """
+    Render boards in parallel to a memory-mapped .npy file.
+    @param boards       iterable of Boards or state dicts, consumed once
+                        and lazily: with n workers, at most 2 * n chunks
+                        are taken ahead of the rendered ones
+    @param out_path     path of the .npy file, overwritten
+    @param image_size   (width, height) of the images
+    @param n_boards     number of boards, required if boards has no len(),
+                        further boards are ignored
+    @param grid_config  GridConfig for state dicts without "grid_config"
+    @param n_workers    number of processes, default: number of cores.
+                        1 renders in the calling process.
+    @param chunk_size   number of boards per task
+    @param plot         True to render with matplotlib (BoardPlotContext)
+                        instead of BoardRasterizer
+    @return tuple (images, bboxes): the read-only memory-mapped images of
+            shape (n_boards, height, width, 3) and one list of piece
+            bounding boxes per board
+    """
+    if n_boards is None:
+        n_boards = len(boards)
+    width, height = image_size
+    images = np.lib.format.open_memmap(out_path, mode="w+", dtype=np.uint8, shape=(n_boards, height, width, 3))
+    del images  # the header is written, workers open the file themselves
+
+    init_args = (out_path, image_size, grid_config.to_dict() if grid_config else None, plot)
+    bboxes = [None] * n_boards
+    tasks = _chunks(islice(boards, n_boards), chunk_size)
+    if n_workers == 1:
+        _init_worker(*init_args)
+        try:
+            results = [render_chunk(task) for task in tasks]
+        finally:
+            _close_worker()
+    else:
+        n_workers = n_workers or os.cpu_count()
+        with Pool(n_workers, initializer=_init_worker, initargs=init_args) as pool:
+            results = list(_imap_bounded(pool, render_chunk, tasks, 2 * n_workers))
+    for start, chunk_bboxes in results:
+        bboxes[start:start + len(chunk_bboxes)] = chunk_bboxes
+
+    return np.load(out_path, mmap_mode="r"), bboxes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render states to a memory-mapped array of images.")
+    parser.add_argument("states", help="jsonl file with one state dict per line.")
+    parser.add_argument("out", help="Path of the .npy file to write.")
+    parser.add_argument("--size", type=int, default=224, help="Width and height of the images. (Default: %(default)s)")
+    parser.add_argument("--width", type=int, default=None,
+                        help="Board width for states without grid_config.")
+    parser.add_argument("--height", type=int, default=None,
+                        help="Board height for states without grid_config.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of processes. (Default: all cores)")
+    parser.add_argument("--chunk-size", type=int, default=64, help="States per task. (Default: %(default)s)")
+    parser.add_argument("--plot", action="store_true", help="Render with matplotlib.")
+    args = parser.parse_args()
+
+    with open(args.states) as file:
+        n_states = sum(1 for line in file if line.strip())
+
+    def read_states():
+        with open(args.states) as states_file:
+            for state_line in states_file:
+                if state_line.strip():
+                    yield json.loads(state_line)
+
+    config = None
+    if args.width is not None and args.height is not None:
+        config = GridConfig(args.width, args.height, move_step=1, prevent_overlap=False)
+    _, boxes = render_boards(read_states(), args.out, image_size=(args.size, args.size), n_boards=n_states,
+                             grid_config=config, n_workers=args.workers, chunk_size=args.chunk_size,
+                             plot=args.plot)
+    with open(args.out + ".bboxes.json", "w") as file:
+        json.dump(boxes, file)
+    print(f"Rendered {n_states} states to {args.out}")
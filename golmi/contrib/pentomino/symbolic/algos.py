@@ -1,6 +1,8 @@
 import random
 from typing import List, Set, Union
 
+import numpy as np
+
 from golmi.contrib.pentomino.symbolic.types import PropertyNames, SymbolicPiece, SymbolicPieceGroup
 
 
@@ -25,23 +27,27 @@ class PentoIncrementalAlgorithm:
             selection: a selected pieces (within pieces)
         """
         if isinstance(pcl, SymbolicPieceGroup):
-            distractors = set(pcl.pieces)
-        else:
-            distractors = set(pcl)
+            pcl = pcl.pieces
+        # the distractors are compared on their codes: key code to piece code, equal pieces are contained once
+        distractors = dict()
+        for piece in pcl:
+            distractors.setdefault(piece.code & SymbolicPiece.KEY_MASK, piece.code)
         if is_selection_in_pieces:
-            distractors.remove(selection)
+            del distractors[selection.code & SymbolicPiece.KEY_MASK]
         # property-value pairs are collected here
         properties = {}
         for property_name in self.preference_order:
             property_value = selection[property_name]
+            mask = SymbolicPiece.PROPERTY_MASKS[property_name]
+            selection_code = selection.code & mask
             # check what objects would be eliminated using this prop-val pair
-            excluded_distractors = self._exclude(property_name, property_value, distractors)
+            excluded_distractors = [key for key, code in distractors.items() if code & mask != selection_code]
             if property_value and len(excluded_distractors) > 0:
                 # save the property
                 properties[property_name] = property_value
                 # update the contrast set
-                for o in excluded_distractors:
-                    distractors.remove(o)
+                for key in excluded_distractors:
+                    del distractors[key]
             # check if enough properties have been collected to rule out all distractors
             if not len(distractors):
                 if return_expression:
@@ -55,6 +61,79 @@ class PentoIncrementalAlgorithm:
             return self.verbalize_properties(properties, False), properties, False
         return properties, False
 
+    def generate_batch(self, boards: List[Union[SymbolicPieceGroup, List]], return_expression=True):
+        """
+            boards: a list of boards (lists or groups of pieces), e.g. a whole dataset
+            returns: for each board a list with one result per piece, the same as
+                     generate(board, piece, is_selection_in_pieces=True) for each piece in order.
+            The property values are taken from the piece codes (see SymbolicPiece) and the distractor sets of all
+            pieces on all boards are boolean masks, so that each property is applied with one comparison.
+            The masks take boards * pieces^2 * properties bytes, pass very large datasets in chunks.
+        """
+        n_props = len(self.preference_order)
+        # the property names are the attribute names of SymbolicPiece (faster than piece[property_name])
+        attributes = [property_name.value for property_name in self.preference_order]
+        n_boards = len(boards)
+        max_pieces = max([len(board) for board in boards], default=0)
+        # the piece codes, -1 marks padding
+        rows, board_index, piece_index, set_index = list(), list(), list(), list()
+        for b, board in enumerate(boards):
+            # the distractors of generate() are a set, equal pieces are contained once
+            seen = dict()
+            for i, piece in enumerate(board):
+                rows.append(piece.code)
+                seen.setdefault(piece.code & SymbolicPiece.KEY_MASK, i)
+            board_index += [b] * len(board)
+            piece_index += range(len(board))
+            set_index += [b * max_pieces + i for i in seen.values()]
+        codes = np.full((n_boards, max_pieces), -1, dtype=np.int32)
+        codes[board_index, piece_index] = rows
+        pieces = codes & SymbolicPiece.KEY_MASK
+        # the property bit fields of the codes (board, piece, property) and whether the values are truthy
+        shifts = [SymbolicPiece.PROPERTY_SHIFTS[property_name] for property_name in self.preference_order]
+        codes = np.stack([(codes & SymbolicPiece.PROPERTY_MASKS[property_name]) >> shift
+                          for property_name, shift in zip(self.preference_order, shifts)], axis=-1)
+        truthy = np.zeros((16, n_props), dtype=bool)  # indexed by the property values, padding included
+        for j, property_name in enumerate(self.preference_order):
+            values = SymbolicPiece.PROPERTY_VALUES[property_name]
+            truthy[:len(values), j] = [bool(value) for value in values]
+        truthy = truthy[codes, np.arange(n_props)]
+        in_set = np.zeros(n_boards * max_pieces, dtype=bool)
+        in_set[set_index] = True
+        in_set = in_set.reshape(n_boards, max_pieces)
+        # a piece's distractors: the set without the piece itself (or the piece equal to it)
+        distractors = in_set[:, None, :] & (pieces[:, :, None] != pieces[:, None, :])
+        # (board, target, distractor, property)
+        differs = codes[:, None, :, :] != codes[:, :, None, :]
+
+        applied = np.zeros((n_boards, max_pieces, n_props), dtype=bool)
+        # index of the property after which no distractors are left, n_props if there is none
+        done_at = np.full((n_boards, max_pieces), n_props)
+        for j in range(n_props):
+            excluded = distractors & differs[..., j]
+            applied[..., j] = truthy[..., j] & excluded.any(axis=-1)
+            distractors &= ~(excluded & applied[..., j, None])
+            done_at[(done_at == n_props) & ~distractors.any(axis=-1)] = j
+
+        results = list()
+        applied = applied.tolist()
+        is_done = (done_at < n_props).tolist()
+        for b, board in enumerate(boards):
+            board_results = list()
+            for i, selection in enumerate(board):
+                properties = dict([(property_name, getattr(selection, attributes[j]))
+                                   for j, property_name in enumerate(self.preference_order) if applied[b][i][j]])
+                is_discriminating = is_done[b][i]
+                if not is_discriminating and len(properties) == 0:
+                    properties = dict([(pn, selection[pn]) for pn in list(PropertyNames)])
+                if return_expression:
+                    board_results.append((self.verbalize_properties(properties, is_discriminating), properties,
+                                          is_discriminating))
+                else:
+                    board_results.append((properties, is_discriminating))
+            results.append(board_results)
+        return results
+
     def verbalize_properties(self, properties, is_discriminating=True):
         start_token = random.choice(self.start_tokens)
         shape = properties[PropertyNames.SHAPE] if PropertyNames.SHAPE in properties else random.choice(
@@ -1,9 +1,18 @@
+import itertools
 import random
 from collections import defaultdict
-from typing import List, Dict, Set
+from math import comb, prod
+from typing import List, Dict, Set, Tuple
+
+import numpy as np
 
 from golmi.contrib.pentomino.symbolic.types import SymbolicPiece, Colors, Shapes, RelPositions, PropertyNames, SymbolicPieceGroup, \
-    Rotations
+    Rotations, get_symbolic_space
+
+
+def _select(pieces: List[SymbolicPiece], rows: np.ndarray, mask: np.ndarray) -> List[SymbolicPiece]:
+    """ :return: the pieces (in order) whose rows of the symbolic space are in the mask """
+    return [pieces[i] for i in np.flatnonzero(mask[rows])]
 
 
 class RestrictivePieceConfigGroupSampler:
@@ -14,6 +23,9 @@ class RestrictivePieceConfigGroupSampler:
         :param pieces: without the target_piece
         """
         self.pieces_per_pos = pieces_per_pos
+        self.pieces = list(pieces)
+        self.space = get_symbolic_space()
+        self.__rows = self.space.get_rows(self.pieces)
         self.pieces_by_color: Dict[Colors, List[SymbolicPiece]] = SymbolicPiece.group_by_color(pieces)
         self.pieces_by_shape: Dict[Shapes, List[SymbolicPiece]] = SymbolicPiece.group_by_shape(pieces)
         self.pieces_by_pos: Dict[RelPositions, List[SymbolicPiece]] = SymbolicPiece.group_by_pos(pieces)
@@ -23,12 +35,17 @@ class RestrictivePieceConfigGroupSampler:
             PropertyNames.REL_POSITION: self.pieces_by_pos,
         }
 
+    def __select(self, target_piece: SymbolicPiece, same: List[PropertyNames] = None,
+                 different: List[PropertyNames] = None, rel_position: RelPositions = None):
+        """ :return: the pieces with the target piece's values of the properties same, but not of different """
+        return _select(self.pieces, self.__rows, self.space.select(target_piece, same, different, rel_position))
+
     def __check_allowed_positions(self, allowed_positions, n_pieces):
         num_pos = len(allowed_positions)
         num_possible = self.pieces_per_pos * num_pos
         if num_possible < n_pieces:
-            raise Exception(f"with pieces_per_pos={self.pieces_per_pos} and num_pos={num_pos} "
-                            f"there can be maximal n_pieces={num_possible} in the set")
+            raise ValueError(f"with pieces_per_pos={self.pieces_per_pos} and num_pos={num_pos} "
+                             f"there can be maximal n_pieces={num_possible} in the set")
 
     def __check_and_get_allowed_positions(self, n_pieces):
         allowed_positions = list(self.pieces_by_pos.keys())  # all positions, where there are pieces for
@@ -61,17 +78,15 @@ class RestrictivePieceConfigGroupSampler:
         piece_set = []
 
         # one dist must share color and shape, otherwise IA stops already
-        possible_pieces = self.pieces_by_color[target_piece.color]
-        possible_pieces = [p for p in possible_pieces if p.shape == target_piece.shape]
-        possible_pieces = [p for p in possible_pieces if p.rel_position != target_piece.rel_position]
+        possible_pieces = self.__select(target_piece, same=[PropertyNames.COLOR, PropertyNames.SHAPE],
+                                        different=[PropertyNames.REL_POSITION])
         piece = random.choice(possible_pieces)
         pos_counts[piece.rel_position] += 1
         piece_set.append(piece)
 
         # one dist must share color, but not shape, so that shape must be mentioned
-        possible_pieces = self.pieces_by_color[target_piece.color]
-        possible_pieces = [p for p in possible_pieces if p.shape != target_piece.shape]
-        possible_pieces = [p for p in possible_pieces if p.rel_position != target_piece.rel_position]
+        possible_pieces = self.__select(target_piece, same=[PropertyNames.COLOR],
+                                        different=[PropertyNames.SHAPE, PropertyNames.REL_POSITION])
         piece = random.choice(possible_pieces)
         pos_counts[piece.rel_position] += 1
         piece_set.append(piece)
@@ -86,8 +101,7 @@ class RestrictivePieceConfigGroupSampler:
         # Note: target piece is not in pieces already
         for _ in range(n_pieces - 2):
             pos = random.choice(allowed_positions)
-            possible_pieces = self.pieces_by_pos[pos]
-            possible_pieces = [p for p in possible_pieces if p.color != target_piece.color]
+            possible_pieces = self.__select(target_piece, different=[PropertyNames.COLOR], rel_position=pos)
             piece = random.choice(possible_pieces)
             piece_set.append(piece)
             pos_counts[piece.rel_position] += 1
@@ -102,14 +116,12 @@ class RestrictivePieceConfigGroupSampler:
         piece_set = []
 
         # exactly on with the same position, but different prop
-        possible_pieces = self.pieces_by_pos[target_piece.rel_position]
-        possible_pieces = [p for p in possible_pieces if p[prop1] != target_piece[prop1]]
+        possible_pieces = self.__select(target_piece, same=[PropertyNames.REL_POSITION], different=[prop1])
         piece1 = random.choice(possible_pieces)
         piece_set.append(piece1)
 
         # others with same prop, but different position
-        possible_pieces = self.meta[prop1][target_piece[prop1]]
-        possible_pieces = [p for p in possible_pieces if p.rel_position != target_piece.rel_position]
+        possible_pieces = self.__select(target_piece, same=[prop1], different=[PropertyNames.REL_POSITION])
         possible_pieces_by_pos = SymbolicPiece.group_by_pos(possible_pieces)
 
         # positions are defined by the other possible pieces that do not share the target piece position
@@ -126,16 +138,7 @@ class RestrictivePieceConfigGroupSampler:
 
     def __get_same_but_diff(self, target_piece: SymbolicPiece,
                             same_prop: PropertyNames, diff_prop: PropertyNames, pos):
-        possible_pieces = self.meta[same_prop][target_piece[same_prop]]
-        possible_pieces = [p for p in possible_pieces if p[diff_prop] != target_piece[diff_prop]]
-        possible_pieces = [p for p in possible_pieces if p.rel_position == pos]
-        if not possible_pieces:
-            print("target_piece:", target_piece)
-            print("same_prop:", same_prop)
-            print("diff_prop:", diff_prop)
-            print("pos:", pos)
-            print(self.meta[same_prop][target_piece[same_prop]])
-        return possible_pieces
+        return self.__select(target_piece, same=[same_prop], different=[diff_prop], rel_position=pos)
 
     def sample_some_with_prop1_and_prop2(self, target_piece: SymbolicPiece, prop1: PropertyNames, prop2: PropertyNames,
                                          n_pieces: int):
@@ -190,9 +193,119 @@ class RestrictivePieceConfigGroupSampler:
         return SymbolicPieceGroup(piece_set)
 
 
+def _multichoose(n: int, k: int):
+    """ number of multisets of size k from n items """
+    if n == 0:
+        return 1 if k == 0 else 0
+    return comb(n + k - 1, k)
+
+
+def _distinct_indices(n: int):
+    """ yields the indices 0, ..., n - 1 in random order (a lazy Fisher-Yates shuffle, n can be huge) """
+    swapped = dict()
+    for k in range(n, 0, -1):
+        i = random.randrange(k)
+        yield swapped.get(i, i)
+        swapped[i] = swapped.pop(k - 1, k - 1)
+
+
+class DistractorSetSpace:
+    """
+    All distinct distractor sets (SymbolicPieceGroups) of one utterance type and size.
+
+    The pieces of a set are drawn from disjoint candidate pools, a fixed number from each pool
+    (one of count_options), and there are at most pieces_per_pos pieces on a position. The sets are
+    counted by dynamic programming over the positions, so that a set can be derived from its index
+    without enumerating the others. Sampling distinct indices then samples distinct sets.
+    """
+
+    def __init__(self, pools: List[List[SymbolicPiece]], count_options: List[Tuple[int, ...]],
+                 pieces_per_pos: int = 2):
+        """
+        :param pools: disjoint lists of candidate pieces, equal pieces are contained once
+        :param count_options: the possible numbers of pieces per pool
+        """
+        self.count_options = count_options
+        # the positions in the order of RelPositions by their codes (see SymbolicPiece)
+        pos_mask = SymbolicPiece.PROPERTY_MASKS[PropertyNames.REL_POSITION]
+        positions = sorted({p.code & pos_mask for pool in pools for p in pool} - {0})
+        self.pieces_by_pos = [[[p for p in pool if p.code & pos_mask == pos] for pool in pools] for pos in positions]
+        max_counts = tuple(max(counts) for counts in zip(*count_options)) if count_options else ()
+        # per position: the numbers of pieces per pool and the number of ways to pick them
+        self.choices = list()
+        for pos_pools in self.pieces_by_pos:
+            pos_choices = list()
+            for counts in itertools.product(*[range(n + 1) for n in max_counts]):
+                ways = prod(_multichoose(len(pool), n) for pool, n in zip(pos_pools, counts))
+                if sum(counts) <= pieces_per_pos and ways > 0:
+                    pos_choices.append((counts, ways))
+            self.choices.append(pos_choices)
+        # n_sets[i][remaining]: number of ways to pick the remaining counts on the positions i, ...
+        self.n_sets = [dict() for _ in range(len(positions) + 1)]
+        self.n_sets[-1][tuple(0 for _ in max_counts)] = 1
+        for i in reversed(range(len(positions))):
+            for remaining in itertools.product(*[range(n + 1) for n in max_counts]):
+                total = 0
+                for counts, ways in self.choices[i]:
+                    rest = tuple(r - n for r, n in zip(remaining, counts))
+                    total += ways * self.n_sets[i + 1].get(rest, 0)
+                if total:
+                    self.n_sets[i][remaining] = total
+        self.size = sum(self.n_sets[0].get(counts, 0) for counts in count_options)
+
+    def get(self, index: int) -> SymbolicPieceGroup:
+        """ :return: the set with the given index, 0 <= index < size """
+        if not 0 <= index < self.size:
+            raise IndexError(f"Index {index} out of range for {self.size} sets")
+        for remaining in self.count_options:
+            n_sets = self.n_sets[0].get(remaining, 0)
+            if index < n_sets:
+                break
+            index -= n_sets
+        pieces = list()
+        for i, pos_pools in enumerate(self.pieces_by_pos):
+            for counts, ways in self.choices[i]:
+                rest = tuple(r - n for r, n in zip(remaining, counts))
+                n_rest = self.n_sets[i + 1].get(rest, 0)
+                if index < ways * n_rest:
+                    break
+                index -= ways * n_rest
+            index, rest_index = divmod(index, n_rest)
+            for pool, n in zip(pos_pools, counts):
+                index, pool_index = divmod(index, _multichoose(len(pool), n))
+                pieces.extend(self.__get_multiset(pool, n, pool_index))
+            index, remaining = rest_index, rest
+        return SymbolicPieceGroup(pieces)
+
+    @staticmethod
+    def __get_multiset(items: List, size: int, index: int):
+        """ :return: the multiset of items with the given index, ordered by their smallest item """
+        chosen = list()
+        start = 0
+        while size > 0:
+            for j in range(start, len(items)):
+                # multisets whose smallest item is j
+                n_multisets = _multichoose(len(items) - j, size - 1)
+                if index < n_multisets:
+                    chosen.append(items[j])
+                    start = j
+                    size -= 1
+                    break
+                index -= n_multisets
+        return chosen
+
+    def sample(self, n_sets: int) -> List[SymbolicPieceGroup]:
+        """ :return: min(n_sets, size) distinct sets """
+        return [self.get(index) for index in itertools.islice(_distinct_indices(self.size), n_sets)]
+
+
 class UtteranceTypeOrientedDistractorSetSampler:
 
     def __init__(self, pieces: List[SymbolicPiece], target_piece: SymbolicPiece, n_retries=100):
+        """
+        :param pieces: the candidate pieces, including the target piece
+        :param n_retries: unused, the sets are derived from their distinct indices (see DistractorSetSpace)
+        """
         self.n_retries = n_retries
         # remove the target from the piece set
         self.pieces = list(pieces)
@@ -204,26 +317,95 @@ class UtteranceTypeOrientedDistractorSetSampler:
                 pieces_by_value[piece[pn]].append(piece)
         self.pieces_by_value = pieces_by_value
         self.target_piece = target_piece
+        self.space = get_symbolic_space()
+        # per utterance type and number of distractors, computed on first use
+        self.__spaces: Dict[Tuple[frozenset, int], DistractorSetSpace] = dict()
+
+    def __get_pools(self, unique_props: Set[PropertyNames], num_distractors: int):
+        """
+        The candidate pools and their numbers of pieces of the sets that create_distractor_configs_csp samples.
+        :return: tuple (pools, count_options)
+        """
+        # equal pieces are contained once, so that all sets are distinct
+        pieces = list(dict.fromkeys(self.pieces))
+        rows = self.space.get_rows(pieces)
+        # whether the pieces share the property with the target
+        color, shape, pos = [self.space.same(self.target_piece, property_name)[rows] for property_name in
+                             (PropertyNames.COLOR, PropertyNames.SHAPE, PropertyNames.REL_POSITION)]
+
+        def pool(mask):
+            return [pieces[i] for i in np.flatnonzero(mask)]
+
+        if unique_props == {PropertyNames.COLOR}:
+            return [pool(~color)], [(num_distractors,)]
+        if unique_props == {PropertyNames.SHAPE}:
+            return [pool(color & ~shape)], [(num_distractors,)]
+        if unique_props == {PropertyNames.REL_POSITION}:
+            return [pool(color & shape & ~pos)], [(num_distractors,)]
+        if unique_props == {PropertyNames.COLOR, PropertyNames.SHAPE}:
+            # at least one, but never all share the color
+            return [pool(color & ~shape), pool(shape & ~color)], \
+                [(n, num_distractors - n) for n in range(1, num_distractors)]
+        if unique_props in ({PropertyNames.COLOR, PropertyNames.REL_POSITION},
+                            {PropertyNames.SHAPE, PropertyNames.REL_POSITION}):
+            # exactly one on the target position, others share the property, all share the other property
+            prop1, same = (color, shape) if PropertyNames.COLOR in unique_props else (shape, color)
+            return [pool(same & pos & ~prop1), pool(same & ~pos & prop1)], [(1, num_distractors - 1)]
+        if unique_props == {PropertyNames.COLOR, PropertyNames.SHAPE, PropertyNames.REL_POSITION}:
+            return [pool(color & ~pos & shape), pool(color & ~pos & ~shape), pool(~color)], \
+                [(1, 1, max(num_distractors - 2, 0))]
+        raise ValueError(f"Unknown utterance type {unique_props}")
+
+    def get_distractor_space(self, unique_props: Set[PropertyNames], num_distractors: int) -> DistractorSetSpace:
+        """
+        :return: the distinct distractor sets for the utterance type, its size is 0 if there are none
+        """
+        key = (frozenset(unique_props), num_distractors)
+        if key not in self.__spaces:
+            if num_distractors < 1:
+                pools, count_options = [], []
+            else:
+                pools, count_options = self.__get_pools(set(unique_props), num_distractors)
+            self.__spaces[key] = DistractorSetSpace(pools, count_options)
+        return self.__spaces[key]
+
+    def count_distractor_groups(self, utterance_type, pieces_per_set) -> int:
+        """
+        :return: the number of distinct distractor sets with the given (min, max) pieces per set (incl. target)
+        """
+        n_min, n_max = pieces_per_set[0], pieces_per_set[1]
+        return sum(self.get_distractor_space(set(utterance_type), set_size - 1).size
+                   for set_size in range(n_min, n_max + 1))
 
     def sample_many_distractor_groups(self, utterance_type, n_sets, pieces_per_set, verbose=False, rotate_pieces=False):
+        """
+        Sample distinct distractor sets without replacement: the set size is drawn uniformly from the
+        sizes with remaining sets, then one of the remaining sets of that size.
+
+        :return: min(n_sets, count_distractor_groups(utterance_type, pieces_per_set)) sets
+        """
         n_min, n_max = pieces_per_set[0], pieces_per_set[1]
+        # already 1 reserved for target piece
+        spaces = [self.get_distractor_space(set(utterance_type), set_size - 1)
+                  for set_size in range(n_min, n_max + 1)]
+        spaces = [space for space in spaces if space.size > 0]
+        if not spaces:
+            raise ValueError(f"There are no distractor sets for {utterance_type} with {pieces_per_set} pieces "
+                             f"and target {self.target_piece}")
+        n_available = sum(space.size for space in spaces)
+        if verbose and n_available < n_sets:
+            print("Warn: Only", n_available, "distinct sets")
+        indices = [_distinct_indices(space.size) for space in spaces]
+        remaining = [space.size for space in spaces]
         distractors_sets = set()
-        retries = 0
-        while len(distractors_sets) < n_sets and retries < self.n_retries:
-            set_size = random.randint(n_min, n_max) - 1  # already 1 reserved for target piece
-            distractor_set = self.create_distractor_configs_csp(unique_props=set(utterance_type),
-                                                                num_distractors=set_size)
+        while len(distractors_sets) < min(n_sets, n_available):
+            k = random.choice([k for k, n in enumerate(remaining) if n > 0])
+            remaining[k] -= 1
+            distractor_set = spaces[k].get(next(indices[k]))
             if rotate_pieces:
-                for d in distractor_set:
-                    d.rotation = Rotations.from_random()
-            if distractor_set in distractors_sets:  # avoid duplicates (if sample space is small)
-                retries += 1
-                continue
+                distractor_set = SymbolicPieceGroup([SymbolicPiece(d.color, d.shape, d.rel_position,
+                                                                   Rotations.from_random()) for d in distractor_set])
             distractors_sets.add(distractor_set)
-        if verbose and len(distractors_sets) < n_sets:
-            print("Warn: Too many duplicates. Sampled sets:", len(distractors_sets))
-        if verbose and retries > 0:
-            print("Warn: Retries", retries)
         return distractors_sets
 
     def create_distractor_configs_csp(self, unique_props: Set[PropertyNames], num_distractors: int = 1):
@@ -249,85 +431,16 @@ class UtteranceTypeOrientedDistractorSetSampler:
             color,shape,position:
                         Some(color), Some(shape), Some(pos)
 
-        :return:
+        The set is drawn uniformly from the distinct sets of get_distractor_space, so that the sampling cannot run
+        out of candidate pieces, also for sparse piece lists.
+
+        :return: a SymbolicPieceGroup of distractors
+        :raises ValueError: if there is no distractor set for the utterance type and number of distractors
         """
         if num_distractors < 1:
-            raise Exception(f"There must be at least one distractor, but num_distractors is {num_distractors}")
-
-        # When we have a single uniq prop, then all other pieces are disallowed to have that prop
-        if len(unique_props) == 1:
-            unique_prop = list(unique_props)[0]
-            disallowed_positions = []
-            """
-            color:    any other distractor, but different colors
-                        Diff(color), Any(shape), Any(pos)
-            """
-            if unique_prop == PropertyNames.COLOR:
-                # all pieces which do not share the same color
-                possible_distractors = [piece for piece in self.pieces if piece.color != self.target_piece.color]
-
-            """
-            shape:    all having the same color (no exclusions), but different shapes; random positions
-                        All(color), Diff(shape), Any(pos)
-            """
-            if unique_prop == PropertyNames.SHAPE:
-                possible_distractors = self.pieces_by_value[self.target_piece.color]
-                possible_distractors = [piece for piece in possible_distractors
-                                        if piece.shape != self.target_piece.shape]
-
-            """
-            position: all having the same color and shape (no exclusions), but different positions
-                        All(color), All(shape), Diff(pos)
-            """
-            if unique_prop == PropertyNames.REL_POSITION:
-                possible_distractors = self.pieces_by_value[self.target_piece.color]
-                possible_distractors = [piece for piece in possible_distractors
-                                        if piece.shape == self.target_piece.shape]
-                possible_distractors = [piece for piece in possible_distractors
-                                        if piece.rel_position != self.target_piece.rel_position]
-                disallowed_positions.append(self.target_piece.rel_position)
-
-            sampler = RestrictivePieceConfigGroupSampler(possible_distractors)
-            return sampler.sample_with_position_restriction(num_distractors, disallow_pos=disallowed_positions)
-
-        if len(unique_props) == 2:
-            """
-            color,shape:    at least one (and never all) distractor shares the color or the shape
-                        Some(color), Some(shape), Any(pos)
-            """
-            if PropertyNames.COLOR in unique_props and PropertyNames.SHAPE in unique_props:
-                sampler = RestrictivePieceConfigGroupSampler(self.pieces)
-                return sampler.sample_some_with_prop1_and_prop2(self.target_piece,
-                                                                PropertyNames.COLOR,
-                                                                PropertyNames.SHAPE,
-                                                                n_pieces=num_distractors)
-            """
-            color,position: at least one (and never all) distractor shares the color or the position; all same shapes
-                        Some(color), All(shape), Some(pos)
-            """
-            if PropertyNames.COLOR in unique_props and PropertyNames.REL_POSITION in unique_props:
-                possible_distractors = self.pieces_by_value[self.target_piece.shape]
-                sampler = RestrictivePieceConfigGroupSampler(possible_distractors)
-                return sampler.sample_some_with_prop1_and_position(self.target_piece,
-                                                                   PropertyNames.COLOR,
-                                                                   n_pieces=num_distractors)
-            """
-            shape,position: at least one (and never all) distractor shares the shape or the position; all same color
-                        All(color), Some(shape), Some(pos)
-            """
-            if PropertyNames.SHAPE in unique_props and PropertyNames.REL_POSITION in unique_props:
-                possible_distractors = self.pieces_by_value[self.target_piece.color]
-                sampler = RestrictivePieceConfigGroupSampler(possible_distractors)
-                return sampler.sample_some_with_prop1_and_position(self.target_piece,
-                                                                   PropertyNames.SHAPE,
-                                                                   n_pieces=num_distractors)
-
-        if len(unique_props) == 3:
-            """
-            color,shape,position:
-                        1 x Share(color), 1 Share(shape), Diff(pos)
-                        1 x Share(color), 1 Diff(shape), Diff(pos), 
-                     others Any(color), Any(shape), Any(pos)
-            """
-            sampler = RestrictivePieceConfigGroupSampler(self.pieces)
-            return sampler.sample_special(self.target_piece, n_pieces=num_distractors)
+            raise ValueError(f"There must be at least one distractor, but num_distractors is {num_distractors}")
+        space = self.get_distractor_space(unique_props, num_distractors)
+        if space.size == 0:
+            raise ValueError(f"There are no sets of {num_distractors} distractors for {unique_props} "
+                             f"and target {self.target_piece}")
+        return space.get(random.randrange(space.size))
@@ -3,6 +3,8 @@ from enum import Enum, IntEnum
 import random
 from typing import List, Tuple, Dict
 
+import numpy as np
+
 
 class Shapes(Enum):
     F = "F"
@@ -21,11 +23,8 @@ class Shapes(Enum):
     def __repr__(self):
         return f"{self.value}"
 
-    def __key(self):
-        return self.value
-
     def __hash__(self):
-        return hash(self.__key())
+        return self.code
 
     def __str__(self):
         return self.value
@@ -55,11 +54,8 @@ class Rotations(IntEnum):
     def __repr__(self):
         return f"{self.value}"
 
-    def __key(self):
-        return self.value
-
     def __hash__(self):
-        return hash(self.__key())
+        return self.code
 
     def __str__(self):
         return str(self.value)
@@ -107,11 +103,8 @@ class Colors(Enum):
     def __repr__(self):
         return f"{self.value_name}"
 
-    def __key(self):
-        return self.value_name
-
     def __hash__(self):
-        return hash(self.__key())
+        return self.code
 
     def __str__(self):
         return self.value_name
@@ -153,11 +146,8 @@ class RelPositions(Enum):
     def __repr__(self):
         return f"{self.value}"
 
-    def __key(self):
-        return self.value
-
     def __hash__(self):
-        return hash(self.__key())
+        return self.code
 
     def __str__(self):
         return self.value
@@ -178,6 +168,14 @@ class RelPositions(Enum):
         return cls[value.upper().replace(" ", "_")]
 
     def to_random_coords(self, board_width, board_height):
+        (x_min, x_max), (y_min, y_max) = self.to_coord_ranges(board_width, board_height)
+        return random.randint(x_min, x_max), random.randint(y_min, y_max)
+
+    def to_coord_ranges(self, board_width, board_height):
+        """
+        @return tuple ((x_min, x_max), (y_min, y_max)) of the inclusive ranges of the
+                piece coords (upper-left corners) in this relative position
+        """
         # the relative positions are derived from their own "grid"-like board
         # with 3,3 there are as many RelPositions as cells in the grid, but
         # we could have also "thinner" slices or put more "space" onto the edges
@@ -236,7 +234,7 @@ class RelPositions(Enum):
         if self == RelPositions.CENTER:
             x_min, x_max = x_center
             y_min, y_max = y_center
-        return random.randint(x_min, x_max - piece_grid_size), random.randint(y_min, y_max - piece_grid_size)
+        return (x_min, x_max - piece_grid_size), (y_min, y_max - piece_grid_size)
 
     @staticmethod
     def from_coords(x, y, board_width, board_height):
@@ -280,11 +278,8 @@ class PropertyNames(Enum):
     def __repr__(self):
         return f"{self.value}"
 
-    def __key(self):
-        return self.value
-
     def __hash__(self):
-        return hash(self.__key())
+        return self.code
 
     def __str__(self):
         return self.value
@@ -312,16 +307,99 @@ class PropertyNames(Enum):
         return None
 
 
+def _set_codes(enum_cls):
+    """ Set the integer code of each member (its 1-based index, 0 stands for None) and return the members by code """
+    for code, member in enumerate(enum_cls, start=1):
+        member.code = code
+    return (None,) + tuple(enum_cls)
+
+
+_COLORS = _set_codes(Colors)
+_SHAPES = _set_codes(Shapes)
+_POSITIONS = _set_codes(RelPositions)
+_ROTATIONS = _set_codes(Rotations)
+_set_codes(PropertyNames)
+
+
 class SymbolicPiece:
-    """ Symbolic piece representation consisting of a tuple of discrete colors, shapes and positions"""
+    """ Symbolic piece representation consisting of a tuple of discrete colors, shapes and positions
+
+    The properties are packed into the integer code: the codes of color, shape and position take 4 bits each and
+    the rotation the 3 bits above (color | shape << 4 | position << 8 | rotation << 12). Pieces are equal when their
+    codes without the rotation (key_code) are equal, so that sets and dicts of pieces hash and compare integers.
+    """
+    __slots__ = ("code",)
+
+    KEY_MASK = 0xFFF
+    PROPERTY_SHIFTS = {PropertyNames.COLOR: 0, PropertyNames.SHAPE: 4, PropertyNames.REL_POSITION: 8,
+                       PropertyNames.ROTATION: 12}
+    PROPERTY_MASKS = {PropertyNames.COLOR: 0xF, PropertyNames.SHAPE: 0xF0, PropertyNames.REL_POSITION: 0xF00,
+                      PropertyNames.ROTATION: 0x7000}
+    PROPERTY_VALUES = {PropertyNames.COLOR: _COLORS, PropertyNames.SHAPE: _SHAPES,
+                       PropertyNames.REL_POSITION: _POSITIONS, PropertyNames.ROTATION: _ROTATIONS}
 
     def __init__(self, color: Colors = None, shape: Shapes = None, rel_position: RelPositions = None,
                  rotation=Rotations.DEGREE_0):
+        self.code = 0
         self.color = color
         self.shape = shape
         self.rel_position = rel_position
         self.rotation = rotation
 
+    @classmethod
+    def from_code(cls, code: int):
+        """ :return: a new piece with the properties packed into the code """
+        piece = object.__new__(SymbolicPiece)
+        piece.code = code
+        return piece
+
+    @property
+    def key_code(self) -> int:
+        """ The code without the rotation, equal pieces have the same key code """
+        return self.code & SymbolicPiece.KEY_MASK
+
+    def _get_property(self, prop_name: PropertyNames):
+        value_code = (self.code & SymbolicPiece.PROPERTY_MASKS[prop_name]) >> \
+            SymbolicPiece.PROPERTY_SHIFTS[prop_name]
+        return SymbolicPiece.PROPERTY_VALUES[prop_name][value_code]
+
+    def _set_property(self, prop_name: PropertyNames, value):
+        value_code = value.code if value is not None else 0
+        self.code = self.code & ~SymbolicPiece.PROPERTY_MASKS[prop_name] \
+            | value_code << SymbolicPiece.PROPERTY_SHIFTS[prop_name]
+
+    @property
+    def color(self) -> Colors:
+        return self._get_property(PropertyNames.COLOR)
+
+    @color.setter
+    def color(self, value: Colors):
+        self._set_property(PropertyNames.COLOR, value)
+
+    @property
+    def shape(self) -> Shapes:
+        return self._get_property(PropertyNames.SHAPE)
+
+    @shape.setter
+    def shape(self, value: Shapes):
+        self._set_property(PropertyNames.SHAPE, value)
+
+    @property
+    def rel_position(self) -> RelPositions:
+        return self._get_property(PropertyNames.REL_POSITION)
+
+    @rel_position.setter
+    def rel_position(self, value: RelPositions):
+        self._set_property(PropertyNames.REL_POSITION, value)
+
+    @property
+    def rotation(self) -> Rotations:
+        return self._get_property(PropertyNames.ROTATION)
+
+    @rotation.setter
+    def rotation(self, value: Rotations):
+        self._set_property(PropertyNames.ROTATION, value)
+
     def __getitem__(self, prop_name: PropertyNames):
         if prop_name == PropertyNames.COLOR:
             return self.color
@@ -358,18 +436,28 @@ class SymbolicPiece:
         return self.shape, self.color, self.rel_position
 
     def __hash__(self):
-        return hash(self.__key())
+        return self.key_code
 
     def __lt__(self, other):
         return self.__key() < other.__key()
 
     def __eq__(self, other):
         if isinstance(other, SymbolicPiece):
-            return self.__key() == other.__key()
+            return self.key_code == other.key_code
         raise ValueError(f"Other is not {self.__class__} but {other.__class__}")
 
+    def __getstate__(self):
+        return self.code
+
+    def __setstate__(self, code):
+        self.code = code
+
     def copy(self):
-        return SymbolicPiece(self.color, self.shape, self.rel_position)
+        """ :return: a new piece with the same color, shape and position (and rotation DEGREE_0) """
+        piece = object.__new__(SymbolicPiece)
+        piece.code = self.key_code
+        piece.rotation = Rotations.DEGREE_0
+        return piece
 
     def to_json(self):
         return self.color.to_json(), self.shape.to_json(), self.rel_position.to_json(), self.rotation.to_json()
@@ -415,6 +503,72 @@ class SymbolicPiece:
         return groups
 
 
+class SymbolicSpace:
+    """
+    All symbolic pieces, i.e. the combinations of colors, shapes, positions and rotations (each also None), as a
+    structured array with the fields code, color, shape, rel_position and rotation (the value codes, see
+    SymbolicPiece). With the boolean indexes per property value, queries on pieces are vectorized masks over the
+    rows. Use get_symbolic_space() for the shared instance.
+    """
+
+    def __init__(self):
+        property_names = list(SymbolicPiece.PROPERTY_VALUES)
+        value_codes = np.meshgrid(*[np.arange(len(SymbolicPiece.PROPERTY_VALUES[pn])) for pn in property_names],
+                                  indexing="ij")
+        self.table = np.zeros(value_codes[0].size,
+                              dtype=[("code", np.int32)] + [(pn.value, np.uint8) for pn in property_names])
+        for pn, codes in zip(property_names, value_codes):
+            self.table[pn.value] = codes.ravel()
+            self.table["code"] |= codes.ravel() << SymbolicPiece.PROPERTY_SHIFTS[pn]
+        # the row of each piece code
+        self.rows = np.full(SymbolicPiece.PROPERTY_MASKS[PropertyNames.ROTATION] + 1, -1, dtype=np.int32)
+        self.rows[self.table["code"]] = np.arange(len(self.table))
+        # indexes[property_name][value_code]: whether the rows have the value
+        self.indexes = dict([(pn, self.table[pn.value] == np.arange(len(SymbolicPiece.PROPERTY_VALUES[pn]))[:, None])
+                             for pn in property_names])
+
+    def __len__(self):
+        return len(self.table)
+
+    def get_rows(self, pieces: List[SymbolicPiece]) -> np.ndarray:
+        """ :return: the rows of the pieces """
+        return self.rows[np.array([piece.code for piece in pieces], dtype=np.int32)]
+
+    def same(self, target: SymbolicPiece, property_name: PropertyNames) -> np.ndarray:
+        """ :return: the mask of the rows with the target's value of the property """
+        value_code = (target.code & SymbolicPiece.PROPERTY_MASKS[property_name]) >> \
+            SymbolicPiece.PROPERTY_SHIFTS[property_name]
+        return self.indexes[property_name][value_code]
+
+    def select(self, target: SymbolicPiece, same: List[PropertyNames] = None, different: List[PropertyNames] = None,
+               rel_position: RelPositions = None) -> np.ndarray:
+        """
+        :param same: properties with the target's value
+        :param different: properties with another value than the target's
+        :param rel_position: the position of the rows, by default any
+        :return: the mask of the rows
+        """
+        mask = np.ones(len(self.table), dtype=bool)
+        for property_name in same or []:
+            mask &= self.same(target, property_name)
+        for property_name in different or []:
+            mask &= ~self.same(target, property_name)
+        if rel_position is not None:
+            mask &= self.indexes[PropertyNames.REL_POSITION][rel_position.code]
+        return mask
+
+
+_SPACE = None
+
+
+def get_symbolic_space() -> SymbolicSpace:
+    """ :return: the symbolic space, built on first use """
+    global _SPACE
+    if _SPACE is None:
+        _SPACE = SymbolicSpace()
+    return _SPACE
+
+
 class SymbolicPieceGroup:
     """ Multiple symbolic pieces represented together as a comparable entity (order does not matter)"""
 
@@ -437,7 +591,7 @@ class SymbolicPieceGroup:
         return len(self.pieces)
 
     def __key(self):
-        return tuple(sorted(self.pieces))  # we ignore order for comparison
+        return tuple(sorted([piece.key_code for piece in self.pieces]))  # we ignore order for comparison
 
     def __hash__(self):
         return hash(self.__key())
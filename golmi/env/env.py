@@ -0,0 +1,176 @@
+"""
+Headless, gym-style environment for training agents on a golmi board.
+The environment steps a Model in-process: there is no socket
+communication and no greenthread, every action is applied immediately.
+
+The task: each object has a target of the same type and color. An object
+is on its target if it is not gripped and covers the target exactly
+(same position and block matrix). An episode ends when all objects are
+on their targets or after max_steps steps.
+"""
+import random
+
+import numpy as np
+
+from golmi.server.config import Config
+from golmi.server.generator import Generator
+from golmi.server.model import Model
+# discrete actions: (action type, parameters)
+from golmi.server.mover import ACTIONS, ACTION_NAMES  # noqa: F401
+
+
+class GolmiEnv:
+    """
+    Environment with one gripper. Observations are dicts of numpy arrays:
+        "gripper":  [x, y, gripped], gripped is 1 if an object is gripped
+        "objs":     one row per object:
+                    [type, color, x, y, rotation, mirrored, gripped],
+                    type and color are indices into config.get_types() and
+                    config.colors
+        "targets":  one row per object, row i is the target of objs[i]:
+                    [type, color, x, y, rotation, mirrored], objects
+                    without a target have [-1, -1, 0, 0, 0, 0]
+    Actions are indices into ACTIONS, see ACTION_NAMES. Actions not
+    allowed by the config do nothing.
+    The reward is the change in the number of objects on their targets,
+    minus step_penalty for each step.
+    """
+    gr_id = "0"
+
+    def __init__(self, config: Config, n_objs: int = 3, obj_area="top",
+                 target_area="bottom", max_steps: int = 500,
+                 step_penalty: float = 0.0):
+        """
+        @param config       Config of the board
+        @param n_objs       number of objects (and targets) per episode
+        @param obj_area     area objects are placed in, see Generator
+        @param target_area  area targets are placed in, see Generator
+        @param max_steps    number of steps after which an episode ends
+        @param step_penalty subtracted from the reward at each step
+        """
+        self.config = config
+        self.n_objs = n_objs
+        self.obj_area = obj_area
+        self.target_area = target_area
+        self.max_steps = max_steps
+        self.step_penalty = step_penalty
+
+        self.model = Model(config)
+        self.rng = random.Random()
+        self.generator = Generator(config, rng=self.rng)
+        self.n_actions = len(ACTIONS)
+
+        self._type_index = {
+            obj_type: i for i, obj_type in enumerate(config.get_types())
+        }
+        self._color_index = {
+            color: i for i, color in enumerate(config.colors)
+        }
+        # objects and targets in observation order
+        self._objs = list()
+        self._targets = list()
+        self._n_steps = 0
+        self._n_on_target = 0
+
+    def reset(self, seed=None):
+        """
+        Start a new episode on a randomly generated board.
+        @param seed optional seed, the same seed yields the same board
+        @return initial observation
+        """
+        if seed is not None:
+            self.rng.seed(seed)
+        state = self.generator.generate_random_state(
+            self.n_objs, 1, obj_area=self.obj_area,
+            target_area=self.target_area
+        )
+        # make sure the gripper has a known id
+        gripper = state.grippers.pop(next(iter(state.grippers)))
+        gripper.id_n = self.gr_id
+        state.grippers[self.gr_id] = gripper
+        self.model.set_state(state)
+
+        self._objs = [state.objs[obj_id] for obj_id in sorted(state.objs)]
+        self._targets = [state.targets.get(obj.id_n) for obj in self._objs]
+        self._n_steps = 0
+        self._n_on_target = self._count_on_target()
+        return self.observe()
+
+    def step(self, action):
+        """
+        Apply an action of the gripper.
+        @param action   index into ACTIONS
+        @return tuple (observation, reward, done, info), info contains
+                "applied" (whether the action changed the board),
+                "on_target" (number of objects on their targets) and
+                "truncated" (True if the episode ended at max_steps)
+        """
+        action_type, kwargs = ACTIONS[action]
+        applied = False
+        if action_type in self.config.actions:
+            if action_type == "grip":
+                applied = self.model.grip(self.gr_id)
+            else:
+                applied = self.model.mover.apply_movement(
+                    self.model, action_type, self.gr_id, **kwargs
+                )
+        self._n_steps += 1
+
+        n_on_target = self._count_on_target()
+        reward = n_on_target - self._n_on_target - self.step_penalty
+        self._n_on_target = n_on_target
+
+        solved = n_on_target == len(self._objs)
+        truncated = not solved and self._n_steps >= self.max_steps
+        info = {
+            "applied": applied,
+            "on_target": n_on_target,
+            "truncated": truncated
+        }
+        return self.observe(), reward, solved or truncated, info
+
+    def action_mask(self):
+        """
+        @return boolean array, True for each action in ACTIONS that would
+                change the board, see Model.get_action_mask
+        """
+        return self.model.get_action_mask(self.gr_id)
+
+    def observe(self):
+        """
+        @return observation of the current state, see class description
+        """
+        gripper = self.model.state.grippers[self.gr_id]
+        return {
+            "gripper": np.array(
+                [gripper.x, gripper.y, gripper.gripped is not None],
+                dtype=np.float32
+            ),
+            "objs": np.array(
+                [self._describe(obj) + [obj.gripped] for obj in self._objs],
+                dtype=np.float32
+            ).reshape(-1, 7),
+            "targets": np.array(
+                [self._describe(target) if target is not None
+                 else [-1, -1, 0, 0, 0, 0] for target in self._targets],
+                dtype=np.float32
+            ).reshape(-1, 6),
+        }
+
+    def _describe(self, obj):
+        return [self._type_index.get(obj.type, -1),
+                self._color_index.get(obj.color, -1),
+                obj.x, obj.y, obj.rotation, obj.mirrored]
+
+    def _count_on_target(self):
+        return sum(
+            1 for obj, target in zip(self._objs, self._targets)
+            if GolmiEnv._on_target(obj, target)
+        )
+
+    @staticmethod
+    def _on_target(obj, target):
+        # block matrices are interned, so identity means same orientation
+        return target is not None and not obj.gripped and \
+            obj.x == target.x and obj.y == target.y and \
+            obj.block_matrix is target.block_matrix
@@ -0,0 +1,660 @@
+"""
+Vectorized version of GolmiEnv: N boards with the same Config are kept in
+stacked numpy arrays and stepped with one batch of N actions per call.
+The rules follow the Mover and Model: grippers must stay on the grid,
+gripped objects must stay on the board and, with prevent_overlap, must
+not overlap other objects, with snap_to_grid objects released between
+blocks are moved to the nearest free full block, and with lock_on_target
+gripped objects that lie on a target of their type and color are locked.
+
+The arrays can live in shared memory, so that worker processes can step
+different slices of the same boards.
+"""
+import random
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from golmi.server.config import Config
+from golmi.server.generator import Generator
+from golmi.server.mover import ACTIONS
+from golmi.server.obj import Orientation
+
+
+class VectorGolmiEnv:
+    """
+    N independent boards with one gripper each, see GolmiEnv for the task,
+    actions, rewards and observations. Observations are the same dicts,
+    with an additional leading axis over the boards.
+    Boards whose episode ended are reset automatically in step().
+    Positions are stored in grid units: 1 / move_step units per block for
+    move steps below 1, else 1 unit per block.
+    """
+    # name -> (dtype, shape without the leading board axis)
+    # M: objects per board, H/W: board size in units
+    ARRAYS = (
+        ("occupancy", np.int16, ("H", "W")),
+        ("obj_pos", np.int32, ("M", 2)),
+        ("obj_type", np.int16, ("M",)),
+        ("obj_variant", np.int8, ("M",)),
+        ("obj_color", np.int16, ("M",)),
+        ("obj_rotation", np.int16, ("M",)),
+        ("obj_mirrored", np.bool_, ("M",)),
+        ("obj_active", np.bool_, ("M",)),
+        # stacking order, the topmost object is gripped first
+        ("obj_order", np.int64, ("M",)),
+        ("target_pos", np.int32, ("M", 2)),
+        ("target_type", np.int16, ("M",)),
+        ("target_variant", np.int8, ("M",)),
+        ("target_color", np.int16, ("M",)),
+        ("target_rotation", np.int16, ("M",)),
+        ("target_mirrored", np.bool_, ("M",)),
+        ("target_active", np.bool_, ("M",)),
+        # number of targets per unit and the index of the (last) one
+        ("target_count", np.int16, ("H", "W")),
+        ("target_cover", np.int16, ("H", "W")),
+        ("gripper_pos", np.int32, (2,)),
+        # index of the gripped object or -1
+        ("gripped", np.int16, ()),
+        ("steps", np.int32, ()),
+        ("on_target", np.int16, ()),
+    )
+
+    def __init__(self, config: Config, n_envs: int, n_objs: int = 3,
+                 obj_area="top", target_area="bottom", max_steps: int = 500,
+                 step_penalty: float = 0.0, shared_memory=None,
+                 env_slice=None):
+        """
+        @param config       Config of all boards
+        @param n_envs       total number of boards
+        @param n_objs       maximum number of objects (and targets) per board
+        @param obj_area     area objects are placed in, see Generator
+        @param target_area  area targets are placed in, see Generator
+        @param max_steps    number of steps after which an episode ends
+        @param step_penalty subtracted from the reward at each step
+        @param shared_memory    None to keep the arrays in private memory,
+                                True to create a shared memory block (see
+                                shm_name) or the name of a block created by
+                                another instance with the same parameters
+        @param env_slice    optional (start, stop): only boards start to
+                            stop - 1 of the n_envs boards are stepped by this
+                            instance, e.g. one slice per worker process
+        """
+        if target_area is None:
+            raise ValueError("VectorGolmiEnv needs targets, target_area "
+                             "must not be None")
+        self.config = config
+        self.n_objs = n_objs
+        self.obj_area = obj_area
+        self.target_area = target_area
+        self.max_steps = max_steps
+        self.step_penalty = step_penalty
+        self.n_actions = len(ACTIONS)
+
+        # grid units per block and per move step
+        self.multiplier = max(1, int(np.floor(1 / config.move_step)))
+        self.move_units = int(round(config.move_step * self.multiplier))
+        self.height = config.height * self.multiplier
+        self.width = config.width * self.multiplier
+
+        self._build_tables()
+
+        # allocate (shared) arrays for all boards, then select the slice
+        self._shm = None
+        self._owns_shm = False
+        buffer = None
+        if shared_memory is not None and shared_memory is not False:
+            size = self._layout_size(n_envs)
+            if shared_memory is True:
+                self._shm = SharedMemory(
+                    create=True, size=size
+                )
+                self._owns_shm = True
+            else:
+                self._shm = SharedMemory(
+                    name=shared_memory
+                )
+            buffer = self._shm.buf
+        arrays = self._allocate(n_envs, buffer)
+
+        # the creator initializes all boards, also those of other slices
+        if self._owns_shm or buffer is None:
+            arrays["gripped"][:] = -1
+
+        start, stop = env_slice if env_slice is not None else (0, n_envs)
+        self.env_offset = start
+        self.n_envs = stop - start
+        for name, array in arrays.items():
+            setattr(self, name, array[start:stop])
+
+        self._order_counter = int(self.obj_order.max(initial=0)) + 1
+        # cached result of action_mask()
+        self._action_mask = None
+        self._rngs = [random.Random() for _ in range(self.n_envs)]
+        self._generators = [
+            Generator(config, rng=rng) for rng in self._rngs
+        ]
+
+    # --- memory layout --- #
+
+    def _shape(self, dims):
+        sizes = {"M": self.n_objs, "H": self.height, "W": self.width}
+        return tuple(sizes.get(dim, dim) for dim in dims)
+
+    def _layout_size(self, n_envs):
+        size = 0
+        for _, dtype, dims in VectorGolmiEnv.ARRAYS:
+            nbytes = n_envs * int(np.prod(self._shape(dims))) * \
+                np.dtype(dtype).itemsize
+            # keep arrays aligned
+            size += -(-nbytes // 8) * 8
+        return size
+
+    def _allocate(self, n_envs, buffer=None):
+        arrays = dict()
+        offset = 0
+        for name, dtype, dims in VectorGolmiEnv.ARRAYS:
+            shape = (n_envs,) + self._shape(dims)
+            if buffer is None:
+                arrays[name] = np.zeros(shape, dtype=dtype)
+            else:
+                arrays[name] = np.ndarray(
+                    shape, dtype=dtype, buffer=buffer, offset=offset
+                )
+                nbytes = arrays[name].nbytes
+                offset += -(-nbytes // 8) * 8
+        return arrays
+
+    @property
+    def shm_name(self):
+        """
+        @return name of the shared memory block or None
+        """
+        return self._shm.name if self._shm is not None else None
+
+    def close(self):
+        """
+        Release the shared memory, the creating instance also removes it.
+        """
+        if self._shm is not None:
+            # drop all views into the buffer before closing it
+            for name, _, _ in VectorGolmiEnv.ARRAYS:
+                setattr(self, name, None)
+            self._shm.close()
+            if self._owns_shm:
+                self._shm.unlink()
+            self._shm = None
+
+    # --- lookup tables --- #
+
+    def _build_tables(self):
+        """
+        Precompute for every type and each of its 8 variants (see
+        Orientation.variants) the covered grid units and block masks.
+        """
+        self.types = list(self.config.get_types())
+        self._type_index = {t: i for i, t in enumerate(self.types)}
+        self._color_index = {c: i for i, c in enumerate(self.config.colors)}
+        bases = [Orientation.of(self.config.type_config[t])
+                 for t in self.types]
+
+        mult = self.multiplier
+        n_blocks = max(len(base.cells) for base in bases)
+        size = max(max(len(v.matrix), len(v.matrix[0]))
+                   for base in bases for v in base.variants)
+        n_units = n_blocks * mult * mult
+        sub = np.array([(sx, sy) for sy in range(mult) for sx in range(mult)])
+
+        self._offsets = np.zeros((len(bases), 8, n_units, 2), dtype=np.int32)
+        self._valid = np.zeros((len(bases), 8, n_units), dtype=bool)
+        self._masks = np.zeros((len(bases), 8, size, size), dtype=bool)
+        # index of the first variant with the same block matrix
+        self._canonical = np.zeros((len(bases), 8), dtype=np.int8)
+        for t, base in enumerate(bases):
+            for v, variant in enumerate(base.variants):
+                units = (variant.offsets[:, None, :] * mult +
+                         sub[None, :, :]).reshape(-1, 2)
+                self._offsets[t, v, :len(units)] = units
+                self._valid[t, v, :len(units)] = True
+                for x, y in variant.cells:
+                    self._masks[t, v, y, x] = True
+                self._canonical[t, v] = base.variant_index(variant)
+        self._mask_size = size
+
+        # rotating by k quarter turns and flipping, see Orientation.variants
+        variants = np.arange(8)
+        self._rotate = np.array([
+            4 * (variants // 4) + (variants + turns) % 4
+            for turns in range(4)
+        ], dtype=np.int8)
+        self._flip = (4 * (1 - variants // 4) + (-variants) % 4).astype(np.int8)
+
+    # --- episodes --- #
+
+    def reset(self, seed=None):
+        """
+        Start new episodes on all boards.
+        @param seed optional seed, board i is seeded with seed + i (counting
+                    from the start of env_slice)
+        @return initial observation of all boards
+        """
+        for i in range(self.n_envs):
+            if seed is not None:
+                self._rngs[i].seed(seed + self.env_offset + i)
+            self._reset_env(i)
+        return self.observe()
+
+    def _reset_env(self, i):
+        self._action_mask = None
+        state = self._generators[i].generate_random_state(
+            self.n_objs, 1, obj_area=self.obj_area,
+            target_area=self.target_area
+        )
+        mult = self.multiplier
+        self.occupancy[i] = 0
+        self.obj_active[i] = False
+        self.target_active[i] = False
+        self.target_count[i] = 0
+        for j, obj_id in enumerate(sorted(state.objs)[:self.n_objs]):
+            obj = state.objs[obj_id]
+            self._load_obj(i, j, obj, "obj")
+            self.obj_order[i, j] = self._next_order()
+            self._add_footprint(np.array([i]), np.array([j]))
+            target = state.targets.get(obj_id)
+            if target is not None:
+                self._load_obj(i, j, target, "target")
+                self._add_target_footprint(i, j)
+
+        gripper = next(iter(state.grippers.values()))
+        self.gripper_pos[i] = (round(gripper.x * mult),
+                               round(gripper.y * mult))
+        self.gripped[i] = -1
+        self.steps[i] = 0
+        self.on_target[i] = self._count_on_target()[i]
+
+    def _load_obj(self, i, j, obj, prefix):
+        type_index = self._type_index[obj.type]
+        base = Orientation.of(self.config.type_config[obj.type])
+        getattr(self, prefix + "_pos")[i, j] = (
+            round(obj.x * self.multiplier), round(obj.y * self.multiplier)
+        )
+        getattr(self, prefix + "_type")[i, j] = type_index
+        getattr(self, prefix + "_variant")[i, j] = \
+            base.variant_index(obj.get_orientation())
+        getattr(self, prefix + "_color")[i, j] = \
+            self._color_index.get(obj.color, -1)
+        getattr(self, prefix + "_rotation")[i, j] = obj.rotation
+        getattr(self, prefix + "_mirrored")[i, j] = obj.mirrored
+        getattr(self, prefix + "_active")[i, j] = True
+
+    def _next_order(self):
+        self._order_counter += 1
+        return self._order_counter
+
+    # --- stepping --- #
+
+    def step(self, actions):
+        """
+        Apply one action per board.
+        @param actions  sequence of n_envs indices into ACTIONS
+        @return tuple (observations, rewards, dones, info) with arrays over
+                all boards. info has the arrays "applied", "on_target" and
+                "truncated" describing the step before any automatic reset.
+        """
+        actions = np.asarray(actions)
+        applied = np.zeros(self.n_envs, dtype=bool)
+        self._action_mask = None
+
+        for action, (action_type, kwargs) in enumerate(ACTIONS):
+            if action_type not in self.config.actions:
+                continue
+            envs = np.flatnonzero(actions == action)
+            if len(envs) == 0:
+                continue
+            if action_type == "grip":
+                applied[envs] = self._grip(envs)
+            else:
+                applied[envs] = self._move(envs, action_type, kwargs)
+
+        self.steps += 1
+        on_target = self._count_on_target()
+        rewards = (on_target - self.on_target).astype(np.float32) - \
+            self.step_penalty
+        self.on_target[:] = on_target
+
+        solved = on_target == self.obj_active.sum(axis=1)
+        truncated = ~solved & (self.steps >= self.max_steps)
+        dones = solved | truncated
+        info = {
+            "applied": applied,
+            "on_target": on_target.copy(),
+            "truncated": truncated
+        }
+        for i in np.flatnonzero(dones):
+            self._reset_env(i)
+        return self.observe(), rewards, dones, info
+
+    def _move(self, envs, action_type, kwargs):
+        """
+        Apply a move, rotate or flip to the boards envs.
+        @return boolean array, True where the action was applied
+        """
+        applied, new_pos, new_variant = self._check_move(
+            envs, action_type, kwargs
+        )
+        has_obj = self.gripped[envs] >= 0
+        delta = self._delta(action_type, kwargs)
+
+        # grippers without objects only move
+        free = applied & ~has_obj
+        self.gripper_pos[envs[free]] += delta
+
+        # move the gripped objects with legal new placements
+        sel = applied & has_obj
+        e, o = envs[sel], self.gripped[envs[sel]].astype(np.intp)
+        self._remove_footprint(e, o)
+        self.obj_pos[e, o] = new_pos[sel]
+        self.obj_variant[e, o] = new_variant[sel]
+        self._add_footprint(e, o)
+        self.obj_order[e, o] = np.arange(len(e)) + self._next_order()
+        self._order_counter += len(e)
+
+        if action_type == "move":
+            self.gripper_pos[e] += delta
+        elif action_type == "rotate":
+            step = kwargs["direction"] * self.config.rotation_step
+            self.obj_rotation[e, o] = (self.obj_rotation[e, o] + step) % 360
+        elif action_type == "flip":
+            self.obj_mirrored[e, o] = ~self.obj_mirrored[e, o]
+        return applied
+
+    def _delta(self, action_type, kwargs):
+        delta = np.zeros(2, dtype=np.int32)
+        if action_type == "move":
+            delta[:] = (kwargs["x_steps"] * self.move_units,
+                        kwargs["y_steps"] * self.move_units)
+        return delta
+
+    def _check_move(self, envs, action_type, kwargs):
+        """
+        Check a move, rotate or flip on the boards envs without applying it.
+        @return tuple (legal, new_pos, new_variant): boolean array, True
+                where the action would be applied, and the new placements
+                of the gripped objects (undefined for boards without a
+                gripped object)
+        """
+        delta = self._delta(action_type, kwargs)
+        can_move = self._gripper_on_grid(self.gripper_pos[envs] + delta)
+        gripped = self.gripped[envs]
+        has_obj = gripped >= 0
+
+        o = np.maximum(gripped, 0).astype(np.intp)
+        new_pos = self.obj_pos[envs, o] + delta
+        variant = self.obj_variant[envs, o]
+        if action_type == "rotate":
+            step = kwargs["direction"] * self.config.rotation_step
+            turns = round((step % 360) / 90) % 4
+            new_variant = self._rotate[turns][variant]
+        elif action_type == "flip":
+            new_variant = self._flip[variant]
+        else:
+            new_variant = variant
+
+        # grippers without objects only move
+        legal = can_move & ~has_obj if action_type == "move" \
+            else np.zeros(len(envs), dtype=bool)
+        # gripped objects must not be locked and have a legal new placement
+        sel = np.flatnonzero(can_move & has_obj)
+        sel = sel[~self._locked(envs[sel], o[sel])]
+        if len(sel):
+            legal[sel] = self._legal(envs[sel], o[sel], new_pos[sel],
+                                     new_variant[sel])
+        return legal, new_pos, new_variant
+
+    def _grip(self, envs):
+        """
+        Grip or ungrip with the grippers of the boards envs.
+        @return boolean array, True where an object was gripped or ungripped
+        """
+        applied = np.zeros(len(envs), dtype=bool)
+        gripped = self.gripped[envs]
+
+        # ungrip, possibly snapping the object to full blocks
+        ungrip = np.flatnonzero(gripped >= 0)
+        if len(ungrip):
+            e, o = envs[ungrip], gripped[ungrip].astype(np.intp)
+            released, positions = self._snap_positions(e, o)
+            move = released & (positions != self.obj_pos[e, o]).any(axis=1)
+            self._remove_footprint(e[move], o[move])
+            self.obj_pos[e[move], o[move]] = positions[move]
+            self._add_footprint(e[move], o[move])
+            self.obj_order[e[move], o[move]] = \
+                np.arange(move.sum()) + self._next_order()
+            self._order_counter += int(move.sum())
+            self.gripped[e[released]] = -1
+            applied[ungrip] = released
+
+        # grip the topmost object below the gripper
+        grip = np.flatnonzero(gripped < 0)
+        if len(grip):
+            found, top = self._grippable(envs[grip])
+            self.gripped[envs[grip][found]] = top[found]
+            applied[grip] = found
+        return applied
+
+    def _grippable(self, envs):
+        """
+        Find the topmost objects below the grippers, see Model._get_grippable.
+        @return tuple (found, top): boolean array, True where an object
+                was found, and the index of the found object per board
+        """
+        rel = self.gripper_pos[envs][:, None, :] - self.obj_pos[envs]
+        blocks = rel // self.multiplier
+        inside = (blocks >= 0).all(axis=2) & \
+            (blocks < self._mask_size).all(axis=2)
+        blocks = np.clip(blocks, 0, self._mask_size - 1)
+        covers = self._masks[
+            self.obj_type[envs], self.obj_variant[envs],
+            blocks[..., 1], blocks[..., 0]
+        ] & inside & self.obj_active[envs]
+        order = np.where(covers, self.obj_order[envs], -1)
+        top = order.argmax(axis=1)
+        found = order[np.arange(len(envs)), top] >= 0
+        return found, top
+
+    def _snap_positions(self, e, o):
+        """
+        With snap_to_grid, objects positioned between blocks are moved to
+        the first free full block position on ungrip, see
+        Model._snap_position.
+        @return tuple (released, positions): boolean array, True where the
+                object can be released, and the positions after releasing
+        """
+        pos = self.obj_pos[e, o]
+        mult = self.multiplier
+        on_blocks = (pos % mult == 0).all(axis=1)
+        if not self.config.snap_to_grid or on_blocks.all():
+            return np.ones(len(e), dtype=bool), pos
+
+        released = on_blocks.copy()
+        positions = pos.copy()
+        # locked objects between blocks cannot be released
+        locked = np.zeros(len(e), dtype=bool)
+        locked[~on_blocks] = self._locked(e[~on_blocks], o[~on_blocks])
+        floor = pos // mult * mult
+        ceil = -(-pos // mult) * mult
+        candidates = (
+            np.stack([ceil[:, 0], ceil[:, 1]], axis=1),
+            np.stack([ceil[:, 0], floor[:, 1]], axis=1),
+            np.stack([floor[:, 0], ceil[:, 1]], axis=1),
+            np.stack([floor[:, 0], floor[:, 1]], axis=1),
+        )
+        for candidate in candidates:
+            todo = np.flatnonzero(~released & ~locked)
+            if len(todo) == 0:
+                break
+            legal = self._legal(e[todo], o[todo], candidate[todo],
+                                self.obj_variant[e[todo], o[todo]])
+            positions[todo[legal]] = candidate[todo[legal]]
+            released[todo[legal]] = True
+        return released, positions
+
+    def action_mask(self):
+        """
+        Legal actions on all boards, checked with the same rules as step.
+        The mask is cached until the next step or reset, do not modify it.
+        @return (n_envs, n_actions) boolean array, True for each action in
+                ACTIONS that would change the board
+        """
+        if self._action_mask is not None:
+            return self._action_mask
+        mask = np.zeros((self.n_envs, len(ACTIONS)), dtype=bool)
+        envs = np.arange(self.n_envs)
+        for action, (action_type, kwargs) in enumerate(ACTIONS):
+            if action_type not in self.config.actions:
+                continue
+            if action_type != "grip":
+                mask[:, action] = self._check_move(envs, action_type,
+                                                   kwargs)[0]
+                continue
+            gripped = self.gripped >= 0
+            if gripped.any():
+                mask[gripped, action] = self._snap_positions(
+                    envs[gripped], self.gripped[gripped].astype(np.intp)
+                )[0]
+            if not gripped.all():
+                mask[~gripped, action] = self._grippable(envs[~gripped])[0]
+        self._action_mask = mask
+        return mask
+
+    # --- rules --- #
+
+    def _gripper_on_grid(self, positions):
+        return (positions >= 0).all(axis=1) & \
+            (positions[:, 0] < self.width) & (positions[:, 1] < self.height)
+
+    def _cells(self, e, o, pos, variant):
+        types = self.obj_type[e, o]
+        cells = pos[:, None, :] + self._offsets[types, variant]
+        return cells, self._valid[types, variant]
+
+    def _legal(self, e, o, new_pos, new_variant):
+        """
+        Check the placements of objects o on boards e, see
+        Grid.is_legal_position.
+        @return boolean array, True for legal placements
+        """
+        cells, valid = self._cells(e, o, new_pos, new_variant)
+        inside = (cells >= 0).all(axis=2) & \
+            (cells[..., 0] < self.width) & (cells[..., 1] < self.height)
+        legal = (inside | ~valid).all(axis=1)
+        if not self.config.prevent_overlap:
+            return legal
+
+        xs = np.clip(cells[..., 0], 0, self.width - 1)
+        ys = np.clip(cells[..., 1], 0, self.height - 1)
+        occupied = self.occupancy[e[:, None], ys, xs]
+        # cells covered by the object itself do not count
+        own_cells, own_valid = self._cells(
+            e, o, self.obj_pos[e, o], self.obj_variant[e, o]
+        )
+        own = ((cells[:, :, None, :] == own_cells[:, None, :, :]).all(axis=3)
+               & own_valid[:, None, :]).any(axis=2)
+        free = (occupied - own == 0) | ~valid | ~inside
+        return legal & free.all(axis=1)
+
+    def _update_footprint(self, e, o, value):
+        cells, valid = self._cells(e, o, self.obj_pos[e, o],
+                                   self.obj_variant[e, o])
+        boards = np.broadcast_to(e[:, None], valid.shape)[valid]
+        np.add.at(self.occupancy,
+                  (boards, cells[..., 1][valid], cells[..., 0][valid]), value)
+
+    def _add_footprint(self, e, o):
+        self._update_footprint(e, o, 1)
+
+    def _remove_footprint(self, e, o):
+        self._update_footprint(e, o, -1)
+
+    def _add_target_footprint(self, i, j):
+        e, t = np.array([i]), np.array([j])
+        types = self.target_type[e, t]
+        variants = self.target_variant[e, t]
+        cells = self.target_pos[e, t][:, None, :] + \
+            self._offsets[types, variants]
+        valid = self._valid[types, variants] & \
+            (cells >= 0).all(axis=2) & \
+            (cells[..., 0] < self.width) & (cells[..., 1] < self.height)
+        xs, ys = cells[valid][:, 0], cells[valid][:, 1]
+        self.target_count[i, ys, xs] += 1
+        self.target_cover[i, ys, xs] = j
+
+    def _locked(self, e, o):
+        """
+        With lock_on_target, objects o on boards e are locked if each of
+        their cells is covered by exactly one target, the same for all
+        cells, of the same type and color, see Mover._obj_on_target.
+        @return boolean array, True for locked objects
+        """
+        if self.config.lock_on_target is not True or len(e) == 0:
+            return np.zeros(len(e), dtype=bool)
+        cells, valid = self._cells(e, o, self.obj_pos[e, o],
+                                   self.obj_variant[e, o])
+        inside = (cells >= 0).all(axis=2) & \
+            (cells[..., 0] < self.width) & (cells[..., 1] < self.height)
+        xs = np.clip(cells[..., 0], 0, self.width - 1)
+        ys = np.clip(cells[..., 1], 0, self.height - 1)
+        count = self.target_count[e[:, None], ys, xs]
+        cover = self.target_cover[e[:, None], ys, xs]
+        # the first cell is always valid
+        t = cover[:, 0].astype(np.intp)
+        single = ((count == 1) & inside & (cover == t[:, None])) | ~valid
+        return single.all(axis=1) & \
+            (self.target_type[e, t] == self.obj_type[e, o]) & \
+            (self.target_color[e, t] == self.obj_color[e, o])
+
+    def _count_on_target(self):
+        gripped = np.zeros(self.obj_active.shape, dtype=bool)
+        holding = self.gripped >= 0
+        gripped[holding, self.gripped[holding]] = True
+        same_shape = self._canonical[self.obj_type, self.obj_variant] == \
+            self._canonical[self.target_type, self.target_variant]
+        on_target = self.obj_active & self.target_active & ~gripped & \
+            (self.obj_pos == self.target_pos).all(axis=2) & same_shape & \
+            (self.obj_type == self.target_type)
+        return on_target.sum(axis=1).astype(np.int16)
+
+    # --- observations --- #
+
+    def observe(self):
+        """
+        @return observation of all boards, see GolmiEnv.observe
+        """
+        mult = self.multiplier
+        gripped = np.zeros(self.obj_active.shape, dtype=bool)
+        holding = self.gripped >= 0
+        gripped[holding, self.gripped[holding]] = True
+
+        objs = np.stack([
+            self.obj_type, self.obj_color,
+            self.obj_pos[..., 0] / mult, self.obj_pos[..., 1] / mult,
+            self.obj_rotation, self.obj_mirrored, gripped
+        ], axis=2).astype(np.float32)
+        objs[~self.obj_active] = 0
+        objs[~self.obj_active, :2] = -1
+
+        targets = np.stack([
+            self.target_type, self.target_color,
+            self.target_pos[..., 0] / mult, self.target_pos[..., 1] / mult,
+            self.target_rotation, self.target_mirrored
+        ], axis=2).astype(np.float32)
+        targets[~self.target_active] = 0
+        targets[~self.target_active, :2] = -1
+
+        return {
+            "gripper": np.concatenate([
+                self.gripper_pos / mult, holding[:, None]
+            ], axis=1).astype(np.float32),
+            "objs": objs,
+            "targets": targets,
+        }
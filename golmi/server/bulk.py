@@ -0,0 +1,238 @@
+"""
+Bulk generation of random states for datasets. Usage (from the
+repository root):
+
+    python -m golmi.server.bulk OUT_DIR --states N [--config FILE]
+        [--seed S] [--shard-size K] [--workers W] [--format jsonl|npz]
+
+States are generated in shards of shard_size states. Each shard has its
+own random generator seeded from (seed, shard index), so the output only
+depends on seed, config and the generation parameters, not on the number
+of workers. Shards are written by the worker processes, the file
+index.json lists all shards and the parameters needed to reproduce them.
+
+Formats:
+    jsonl   one State.to_dict() per line, extended by "state_id"
+    npz     compressed numpy arrays per shard:
+                "state_ids":    (states,)
+                "n_objs":       (states,) number of objects per state
+                "objs":         (states, n_objs, columns), padded with -1
+                "targets":      (states, n_objs, columns), padded with -1
+                "grippers":     (states, n_grippers, 2) gripper positions
+            the columns are listed in index.json (NPZ_COLUMNS), type and
+            color are indices into config.get_types() and config.colors,
+            orientation is the index into Orientation.variants of the type
+"""
+import argparse
+import json
+import os
+import random
+from multiprocessing import Pool
+
+import numpy as np
+
+from golmi.server.config import Config
+from golmi.server.generator import Generator
+from golmi.server.obj import Orientation
+
+FORMATS = ("jsonl", "npz")
+NPZ_COLUMNS = ("type", "color", "x", "y", "rotation", "mirrored",
+               "orientation")
+INDEX_FILE = "index.json"
+
+
+def shard_rng(seed, shard):
+    """
+    @return random.Random instance for a shard, independent of other shards
+    """
+    state = np.random.SeedSequence((seed, shard)).generate_state(4)
+    return random.Random(int.from_bytes(state.tobytes(), "little"))
+
+
+def _describe(obj, config, type_index, color_index):
+    """
+    @return obj as a row of NPZ_COLUMNS
+    """
+    base = Orientation.of(config.type_config[obj.type])
+    variant = base.variant_index(obj.get_orientation())
+    return [type_index.get(obj.type, -1), color_index.get(obj.color, -1),
+            obj.x, obj.y, obj.rotation, obj.mirrored,
+            -1 if variant is None else variant]
+
+
+def _write_npz(path, states, config, n_objs, n_grippers):
+    type_index = {t: i for i, t in enumerate(config.get_types())}
+    color_index = {c: i for i, c in enumerate(config.colors)}
+    shape = (len(states), n_objs, len(NPZ_COLUMNS))
+    objs = np.full(shape, -1, dtype=np.float32)
+    targets = np.full(shape, -1, dtype=np.float32)
+    grippers = np.full((len(states), n_grippers, 2), -1, dtype=np.float32)
+    counts = np.zeros(len(states), dtype=np.int32)
+    state_ids = np.zeros(len(states), dtype=np.int64)
+
+    for i, state in enumerate(states):
+        state_ids[i] = state.state_id
+        counts[i] = len(state.objs)
+        for j, obj_id in enumerate(sorted(state.objs, key=int)):
+            objs[i, j] = _describe(state.objs[obj_id], config, type_index,
+                                   color_index)
+            target = state.targets.get(obj_id)
+            if target is not None:
+                targets[i, j] = _describe(target, config, type_index,
+                                          color_index)
+        for j, gripper in enumerate(state.grippers.values()):
+            grippers[i, j] = (gripper.x, gripper.y)
+
+    np.savez_compressed(path, state_ids=state_ids, n_objs=counts, objs=objs,
+                        targets=targets, grippers=grippers)
+
+
+def generate_shard(task):
+    """
+    Generate and write one shard, run by the worker processes.
+    @param task dict with the keys "config" (Config dict), "seed", "shard",
+                "first_state_id", "n_states", "out_dir", "format" and
+                "params" (keyword arguments of generate_random_state)
+    @return index entry of the shard
+    """
+    config = Config.from_dict(task["config"])
+    generator = Generator(config, rng=shard_rng(task["seed"], task["shard"]))
+    params = task["params"]
+    extension = "jsonl" if task["format"] == "jsonl" else "npz"
+    file_name = f"shard-{task['shard']:05d}.{extension}"
+    path = os.path.join(task["out_dir"], file_name)
+
+    def states():
+        for i in range(task["n_states"]):
+            state = generator.generate_random_state(**params)
+            state.state_id = task["first_state_id"] + i
+            yield state
+
+    if task["format"] == "jsonl":
+        # stream the states, a shard is never held in memory
+        with open(path, "w") as file:
+            for state in states():
+                file.write(json.dumps(state.to_dict()) + "\n")
+    else:
+        _write_npz(path, list(states()), config, params["n_objs"],
+                   params["n_grippers"])
+
+    return {
+        "file": file_name,
+        "first_state_id": task["first_state_id"],
+        "n_states": task["n_states"]
+    }
+
+
+def generate_states(config, n_states, out_dir, seed=0, shard_size=10000,
+                    n_workers=None, fmt="jsonl", n_objs=3, n_grippers=1,
+                    obj_area="all", target_area="all",
+                    random_gr_position=False):
+    """
+    Generate random states in parallel and write them to sharded files.
+    @param config       Config instance
+    @param n_states     total number of states
+    @param out_dir      directory for the shards and index.json, created if
+                        it does not exist
+    @param seed         seed, the same seed and parameters give the same
+                        files
+    @param shard_size   number of states per shard
+    @param n_workers    number of processes, default: number of cores.
+                        1 generates in the calling process.
+    @param fmt          one of FORMATS
+    @param n_objs, n_grippers, obj_area, target_area, random_gr_position
+                        parameters of Generator.generate_random_state
+    @return the index written to index.json
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format '{fmt}', select one of {FORMATS}")
+    os.makedirs(out_dir, exist_ok=True)
+
+    params = {
+        "n_objs": n_objs,
+        "n_grippers": n_grippers,
+        "obj_area": obj_area,
+        "target_area": target_area,
+        "random_gr_position": random_gr_position
+    }
+    config_dict = config.to_dict()
+    tasks = [
+        {
+            "config": config_dict,
+            "seed": seed,
+            "shard": shard,
+            "first_state_id": first,
+            "n_states": min(shard_size, n_states - first),
+            "out_dir": out_dir,
+            "format": fmt,
+            "params": params
+        }
+        for shard, first in enumerate(range(0, n_states, shard_size))
+    ]
+
+    if n_workers == 1:
+        shards = [generate_shard(task) for task in tasks]
+    else:
+        with Pool(n_workers) as pool:
+            shards = list(pool.imap(generate_shard, tasks))
+
+    index = {
+        "seed": seed,
+        "n_states": n_states,
+        "shard_size": shard_size,
+        "format": fmt,
+        "params": params,
+        "config": config_dict,
+        "shards": shards
+    }
+    if fmt == "npz":
+        index["columns"] = list(NPZ_COLUMNS)
+    with open(os.path.join(out_dir, INDEX_FILE), "w") as file:
+        json.dump(index, file, indent=2)
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generate random states to sharded files."
+    )
+    parser.add_argument("out_dir", help="Directory to write the shards to.")
+    parser.add_argument("--states", type=int, required=True,
+                        help="Number of states to generate.")
+    parser.add_argument(
+        "--config", type=str, default=None,
+        help="Path to a config json file. (Default: pentomino config)"
+    )
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Seed. (Default: %(default)s)")
+    parser.add_argument("--shard-size", type=int, default=10000,
+                        help="States per shard. (Default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of processes. (Default: all cores)")
+    parser.add_argument("--format", choices=FORMATS, default="jsonl",
+                        help="Output format. (Default: %(default)s)")
+    parser.add_argument("--objs", type=int, default=3,
+                        help="Objects per state. (Default: %(default)s)")
+    parser.add_argument("--grippers", type=int, default=1,
+                        help="Grippers per state. (Default: %(default)s)")
+    parser.add_argument("--obj-area", default="all",
+                        help="Area of the objects. (Default: %(default)s)")
+    parser.add_argument("--target-area", default="all",
+                        help="Area of the targets, 'none' for no targets. "
+                             "(Default: %(default)s)")
+    args = parser.parse_args()
+
+    if args.config is None:
+        from golmi.contrib.pentomino.config import PentoConfig
+        config = PentoConfig()
+    else:
+        config = Config.from_json(args.config)
+
+    index = generate_states(
+        config, args.states, args.out_dir, seed=args.seed,
+        shard_size=args.shard_size, n_workers=args.workers, fmt=args.format,
+        n_objs=args.objs, n_grippers=args.grippers, obj_area=args.obj_area,
+        target_area=None if args.target_area == "none" else args.target_area
+    )
+    print(f"Wrote {args.states} states in {len(index['shards'])} shards "
+          f"to {args.out_dir}")
@@ -6,13 +6,15 @@ import json
 from os.path import isfile
 
 from golmi.server.grid import GridConfig
+from golmi.server.obj import Orientation
 
 
 class Config(GridConfig):
     def __init__(self, type_config, width=20, height=20, snap_to_grid=False, prevent_overlap=True,
                  actions=["move", "rotate", "flip", "grip"], move_step=0.5, rotation_step=90, action_interval=0.1,
                  verbose=False, lock_on_target=False, colors=["#ff0000", "#ffa500", "#ffff00", "#008000",
-                                                              "#0000ff", "#800080", "#8b4513", "#808080"]):
+                                                              "#0000ff", "#800080", "#8b4513", "#808080"],
+                 grid_backend="numpy", delta_updates=False, frame_rate=None):
         """
         Constructor.
         @param type_config	    Json file name or dictionary mapping types
@@ -44,15 +46,34 @@ class Config(GridConfig):
                                 Default: ["#ff0000", "#ffa500", "#ffff00",
                                 "#008000","#0000ff", "#800080", "#8b4513",
                                 "#808080"]
+        @param grid_backend     Storage used for the object and target grids:
+                                "numpy" keeps occupancy in integer arrays,
+                                "bitboard" adds row bitmasks for fast
+                                legality checks (integer move steps only,
+                                falls back to "numpy" otherwise),
+                                "tiles" uses one Tile object per cell.
+                                Default: "numpy"
+        @param delta_updates    True to notify views with 'patch' events
+                                containing only the changed objects and
+                                grippers plus a revision number, instead of
+                                full 'update_objs'/'update_grippers' dicts.
+                                Default: False
+        @param frame_rate       Maximum number of updates per second sent to
+                                the views of a room. Changes within a frame
+                                are merged into one message per event type.
+                                None to send every update immediately.
+                                Default: None
         """
         # make sure type_config can be parseds
-        super().__init__(width, height, move_step, prevent_overlap)
+        super().__init__(width, height, move_step, prevent_overlap, grid_backend)
         if isinstance(type_config, str):
             self.type_config = Config.types_from_json(type_config)
         elif isinstance(type_config, dict):
             self.type_config = type_config
         else:
             raise ValueError("type_config must be a json file name or dict")
+        # build all rotated and mirrored block matrices once
+        Orientation.register_types(self.type_config)
         # make sure step size is allowed
         valid_step = Config.is_valid_move_step(move_step)
         if not valid_step:
@@ -68,6 +89,8 @@ class Config(GridConfig):
         self.verbose = verbose
         self.lock_on_target = lock_on_target
         self.colors = colors
+        self.delta_updates = delta_updates
+        self.frame_rate = frame_rate
 
     def __repr__(self):
         properties = ", ".join(vars(self).keys())
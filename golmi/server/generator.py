@@ -9,25 +9,71 @@ random states to initialize a model based on 3 parameters:
 import random
 import math
 
-from golmi.server.grid import Grid
-from golmi.server.obj import Obj
+import numpy as np
+
+from golmi.server.obj import Obj, Orientation
 from golmi.server.state import State
 from golmi.server.gripper import Gripper
 from golmi.server.config import Config
 
 
+def free_anchors(occupied, orientation, x_range, y_range,
+                 prevent_overlap=True):
+    """
+    Find all anchor positions at which an orientation can be placed,
+    checking each block of the orientation on a shifted window of the
+    occupancy array at once.
+    @param occupied         (height, width) boolean array, True for
+                            occupied blocks of the board
+    @param orientation      Orientation to place
+    @param x_range          (start, end), anchors x with start <= x <= end
+    @param y_range          (start, end), anchors y with start <= y <= end
+    @param prevent_overlap  False to allow placements on occupied blocks
+    @return (n, 2) array with one [x, y] row per anchor at which all blocks
+            are on the board (and free if prevent_overlap), in row-major
+            order
+    """
+    height, width = occupied.shape
+    offsets = orientation.offsets
+    if len(offsets) == 0:
+        return np.zeros((0, 2), dtype=int)
+    # anchors keeping all blocks on the board
+    x_start = max(x_range[0], -offsets[:, 0].min())
+    x_end = min(x_range[1], width - 1 - offsets[:, 0].max())
+    y_start = max(y_range[0], -offsets[:, 1].min())
+    y_end = min(y_range[1], height - 1 - offsets[:, 1].max())
+    if x_start > x_end or y_start > y_end:
+        return np.zeros((0, 2), dtype=int)
+
+    free = np.ones((y_end - y_start + 1, x_end - x_start + 1), dtype=bool)
+    if prevent_overlap:
+        for dx, dy in offsets:
+            free &= ~occupied[y_start + dy:y_end + dy + 1,
+                              x_start + dx:x_end + dx + 1]
+    ys, xs = np.nonzero(free)
+    return np.stack([xs + x_start, ys + y_start], axis=1)
+
+
 class Generator:
-    def __init__(self, config: Config, attempts: int = 100):
+    def __init__(self, config: Config, attempts: int = 100, rng=None):
+        """
+        @param config   Config of the generated states
+        @param attempts number of consecutive pieces without a free position
+                        after which no more objects are added
+        @param rng      random.Random instance to draw from, e.g. for
+                        reproducible states. Default: the random module
+        """
         self.config = config
         self.attempts = attempts
+        self.rng = rng if rng is not None else random
 
     def _generate_grippers(self, n_grippers, random_gr_position):
         grippers = dict()
         while len(grippers) < n_grippers:
             if random_gr_position:
                 taken = set()
-                x = random.randint(0, self.config.width)
-                y = random.randint(0, self.config.height)
+                x = self.rng.randint(0, self.config.width)
+                y = self.rng.randint(0, self.config.height)
 
                 # check that grippers do not overlap
                 if (x, y) not in taken:
@@ -89,8 +135,77 @@ class Generator:
 
         return (x_start, x_end), (y_start, y_end)
 
+    def _random_orientation(self, orientation):
+        """
+        randomize rotation and mirroring of an orientation according to
+        the actions of the config
+        @return tuple (orientation, rotation, mirrored)
+        """
+        rotation = 0
+        mirrored = False
+        if "rotate" in self.config.actions:
+            # generate random angle for rotation
+            random_rot = self.rng.randint(
+                0, math.floor(360 / self.config.rotation_step)
+            )
+            rotation = self.config.rotation_step * random_rot
+
+            # rotate matrix
+            orientation = orientation.rotated(rotation)
+
+        if "flip" in self.config.actions:
+            mirrored = bool(self.rng.randint(0, 1))
+            if mirrored:
+                # flip matrix
+                orientation = orientation.flipped
+        return orientation, rotation, mirrored
+
+    def _sample_anchor(self, occupied, orientation, area, width, height):
+        """
+        @param occupied     (height, width) boolean occupancy of the board
+        @param orientation  Orientation to place
+        @param area         area to place the anchor in, see
+                            _restricted_coordinates
+        @param width        width of the piece's unrotated block matrix
+        @param height       height of the piece's unrotated block matrix
+        @return uniformly sampled free anchor (x, y) or None if there is none
+        """
+        (x_start, x_end), (y_start, y_end) = self._restricted_coordinates(area)
+        anchors = free_anchors(
+            occupied, orientation, (x_start, x_end - width),
+            (y_start, y_end - height), self.config.prevent_overlap
+        )
+        if len(anchors) == 0:
+            return None
+        x, y = anchors[self.rng.randrange(len(anchors))]
+        return int(x), int(y)
+
+    def _can_place_any(self, occupied, area):
+        """
+        @return True if some orientation of some type has a free anchor in
+                area
+        """
+        for piece_type in self.config.get_types():
+            base = Orientation.of(self.config.type_config[piece_type])
+            height = len(base.matrix)
+            width = len(base.matrix[0])
+            (x_start, x_end), (y_start, y_end) = \
+                self._restricted_coordinates(area)
+            for orientation in base.variants:
+                if len(free_anchors(
+                        occupied, orientation, (x_start, x_end - width),
+                        (y_start, y_end - height),
+                        self.config.prevent_overlap)) > 0:
+                    return True
+        return False
+
+    @staticmethod
+    def _occupy(occupied, obj):
+        cells = obj.occupied_cells().astype(int)
+        occupied[cells[:, 1], cells[:, 0]] = True
+
     def _generate_target(
-            self, target_grid: Grid, index, piece_type, width, height,
+            self, occupied, index, piece_type, width, height,
             block_matrix, area, color):
         """
         this function generates a target block for the object maintaining:
@@ -103,134 +218,98 @@ class Generator:
             - x and y coordinates
             - rotation
             - if flipped
+        @param occupied boolean occupancy of the targets placed so far
+        @return target Obj or None if the target does not fit on the board
         """
-        (x_start, x_end), (y_start, y_end) = self._restricted_coordinates(area)
-
-        while True:
-            # generate random coordinates
-            x = random.randint(x_start, x_end - width)
-            y = random.randint(y_start, y_end - height)
-
-            # randomize rotation and mirrored
-            rotation = 0
-            mirrored = False
-            if "rotate" in self.config.actions:
-                # generate random angle for rotation
-                random_rot = random.randint(
-                    0, math.floor(360 / self.config.rotation_step)
-                )
-                rotation = self.config.rotation_step * random_rot
-
-                # rotate matrix
-                block_matrix = Obj.rotate_block_matrix(block_matrix, rotation)
-
-            if "flip" in self.config.actions:
-                mirrored = bool(random.randint(0, 1))
-                if mirrored:
-                    # flip matrix
-                    block_matrix = Obj.flip_block_matrix(block_matrix)
-
-            # create target object
-            target_obj = Obj(
-                id_n=index,
-                obj_type=piece_type,
-                x=x,
-                y=y,
-                block_matrix=block_matrix,
-                rotation=rotation,
-                mirrored=mirrored,
-                color=color
-            )
-
-            if target_grid.is_legal_position(
-                    target_obj.occupied(), index):
-                target_grid.add_obj(target_obj)
-                break
-
+        orientation, rotation, mirrored = self._random_orientation(
+            Orientation.of(block_matrix)
+        )
+        anchor = self._sample_anchor(occupied, orientation, area,
+                                     width, height)
+        if anchor is None:
+            return None
+
+        # create target object
+        target_obj = Obj(
+            id_n=index,
+            obj_type=piece_type,
+            x=anchor[0],
+            y=anchor[1],
+            block_matrix=orientation.matrix,
+            rotation=rotation,
+            mirrored=mirrored,
+            color=color
+        )
+        Generator._occupy(occupied, target_obj)
         return target_obj
 
     def _generate_objects(self, n_objs, obj_area, target_area):
         objects = dict()
         targets = dict()
         attempt = 0
-        object_grid = Grid.create_from_config(self.config)
-        target_grid = Grid.create_from_config(self.config)
-
-        (x_start, x_end), (y_start, y_end) = self._restricted_coordinates(
-            obj_area
-        )
+        shape = (self.config.height, self.config.width)
+        occupied_objs = np.zeros(shape, dtype=bool)
+        occupied_targets = np.zeros(shape, dtype=bool)
 
         while len(objects) < n_objs:
             # pick a random type and its height and width
-            piece_type = random.choice(
+            piece_type = self.rng.choice(
                 list(self.config.get_types())
             )
-            block_matrix = self.config.type_config[piece_type]
-            height = len(block_matrix)
-            width = len(block_matrix[0])
-
-            # generate random coordinates
-            x = random.randint(x_start, x_end - width)
-            y = random.randint(y_start, y_end - height)
+            orientation = Orientation.of(self.config.type_config[piece_type])
+            height = len(orientation.matrix)
+            width = len(orientation.matrix[0])
 
             # generate random attributes
-            color = random.choice(self.config.colors)
-            rotation = 0
-            mirrored = False
-
-            if "rotate" in self.config.actions:
-                random_rot = random.randint(
-                    0, math.floor(360 / self.config.rotation_step)
+            color = self.rng.choice(self.config.colors)
+            orientation, rotation, mirrored = \
+                self._random_orientation(orientation)
+
+            # pick one of the free positions
+            anchor = self._sample_anchor(occupied_objs, orientation,
+                                         obj_area, width, height)
+            target_obj = None
+            index = str(len(objects))
+            if anchor is not None and target_area is not None:
+                # create a target
+                target_obj = self._generate_target(
+                    occupied_targets,
+                    index,
+                    piece_type,
+                    width, height,
+                    orientation.matrix,
+                    target_area,
+                    color
                 )
-                rotation = self.config.rotation_step * random_rot
-                block_matrix = Obj.rotate_block_matrix(block_matrix, rotation)
 
-            if "flip" in self.config.actions:
-                mirrored = bool(random.randint(0, 1))
-                if mirrored:
-                    block_matrix = Obj.flip_block_matrix(block_matrix)
+            if anchor is None or \
+                    (target_area is not None and target_obj is None):
+                # no space left for this piece, try again until the number
+                # of maximum attempts is reached or nothing fits anymore
+                attempt += 1
+                if attempt > self.attempts or \
+                        not self._can_place_any(occupied_objs, obj_area) or \
+                        (target_area is not None and not self._can_place_any(
+                            occupied_targets, target_area)):
+                    break
+                continue
 
             # generate object
             obj = Obj(
-                id_n=None,
+                id_n=index,
                 obj_type=piece_type,
-                x=x,
-                y=y,
-                block_matrix=block_matrix,
+                x=anchor[0],
+                y=anchor[1],
+                block_matrix=orientation.matrix,
                 rotation=rotation,
                 mirrored=mirrored,
                 color=color
             )
-
-            # if object does not overlap, add it
-            if object_grid.is_legal_position(obj.occupied(), None):
-                index = str(len(objects))
-                obj.id_n = index
-                object_grid.add_obj(obj)
-
-                # create a target
-                if target_area is not None:
-                    target_obj = self._generate_target(
-                        target_grid,
-                        index,
-                        piece_type,
-                        width, height,
-                        block_matrix,
-                        target_area,
-                        color
-                    )
-
-                    targets[index] = target_obj
-
-                objects[index] = obj
-                attempt = 0
-            else:
-                # object overlaps, try again until number of
-                # maximum attempts is reached
-                if self.config.prevent_overlap:
-                    attempt += 1
-                    if attempt > self.attempts:
-                        break
+            Generator._occupy(occupied_objs, obj)
+            objects[index] = obj
+            if target_obj is not None:
+                targets[index] = target_obj
+            attempt = 0
 
         return objects, targets
 
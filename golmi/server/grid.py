@@ -2,7 +2,7 @@ import itertools
 import json
 import math
 import os
-from typing import List
+from typing import Dict, List
 
 import numpy as np
 
@@ -66,11 +66,18 @@ class Converter:
 
 class GridConfig:
 
-    def __init__(self, width: int, height: int, move_step: float, prevent_overlap: bool):
+    def __init__(self, width: int, height: int, move_step: float, prevent_overlap: bool,
+                 grid_backend: str = "numpy"):
         self.width = width
         self.height = height
         self.move_step = move_step
         self.prevent_overlap = prevent_overlap
+        if grid_backend not in GRID_BACKENDS:
+            raise ValueError(
+                f"Unknown grid_backend '{grid_backend}', "
+                f"select one of {list(GRID_BACKENDS)}"
+            )
+        self.grid_backend = grid_backend
 
     def to_dict(self):
         return {
@@ -78,6 +85,7 @@ class GridConfig:
             "height": self.height,
             "move_step": self.move_step,
             "prevent_overlap": self.prevent_overlap,
+            "grid_backend": self.grid_backend,
         }
 
     def store(self, file_name, data_dir):
@@ -90,7 +98,8 @@ class GridConfig:
 
     @classmethod
     def from_dict(cls, d):
-        return cls(d["width"], d["height"], d["move_step"], d["prevent_overlap"])
+        return cls(d["width"], d["height"], d["move_step"], d["prevent_overlap"],
+                   d.get("grid_backend", "numpy"))
 
     @classmethod
     def load(cls, data_dir, file_name="grid"):
@@ -104,6 +113,7 @@ class Grid:
     """
     a grid is a 2D-Array of Tiles
     """
+    backend = "tiles"
 
     def __init__(self, width, height, step, prevent_overlap):
         self.width = width
@@ -116,11 +126,16 @@ class Grid:
             # otherwise reduce it to the 0-1 interval
             self.step = step % 1
         self.prevent_overlap = prevent_overlap
-        self.clear_grid()
         self.converter = Converter(self.step)
+        # offsets of the converted cells covered by one block
+        self._sub_cells = np.arange(self.converter.multiplier)
+        # notified about every change, see add_observer()
+        self.observers = list()
+        self.clear_grid()
 
     def get_grid_config(self):
-        return GridConfig(self.width, self.height, self.step, self.prevent_overlap)
+        return GridConfig(self.width, self.height, self.step, self.prevent_overlap,
+                          self.backend)
 
     @classmethod
     def create_from_config(cls, config: GridConfig):
@@ -139,6 +154,31 @@ class Grid:
             [Tile(j, i) for j in np.arange(0, self.width, self.step)]
             for i in np.arange(0, self.height, self.step)
         ]
+        self.n_cols = len(self.grid[0]) if self.grid else 0
+        self.n_rows = len(self.grid)
+        self._notify_cleared()
+
+    def add_observer(self, observer):
+        """
+        Register an object to be notified about all changes of the grid,
+        e.g. an ObservationTensor. Observers implement
+            grid_changed(grid, xs, ys, obj, value): obj was added
+                (value 1) to or removed (value -1) from the converted
+                cells (xs, ys)
+            grid_cleared(grid): all objects were removed
+        """
+        self.observers.append(observer)
+
+    def remove_observer(self, observer):
+        self.observers.remove(observer)
+
+    def _notify_changed(self, xs, ys, obj, value):
+        for observer in self.observers:
+            observer.grid_changed(self, xs, ys, obj, value)
+
+    def _notify_cleared(self):
+        for observer in self.observers:
+            observer.grid_cleared(self)
 
     def __repr__(self):
         rep = ""
@@ -199,6 +239,10 @@ class Grid:
         for cell in obj.occupied():
             for new_cell in self.converter(cell):
                 self[new_cell].objects.append(obj)
+        if self.observers:
+            xs, ys = self._to_cells(obj.occupied_cells())
+            self._notify_changed(xs.astype(np.intp), ys.astype(np.intp),
+                                 obj, 1)
 
     def remove_obj(self, obj):  # change to coordinates
         """
@@ -207,6 +251,40 @@ class Grid:
         for cell in obj.occupied():
             for new_cell in self.converter(cell):
                 self[new_cell].objects.remove(obj)
+        if self.observers:
+            xs, ys = self._to_cells(obj.occupied_cells())
+            self._notify_changed(xs.astype(np.intp), ys.astype(np.intp),
+                                 obj, -1)
+
+    def _to_cells(self, coordinates):
+        """
+        expects non converted coordinates
+        --------------------------------------------
+        converts the coordinates of whole blocks to the cells
+        they cover on this grid
+        @param coordinates  list of {"x": x, "y": y} dicts or an (n, 2)
+                            array as returned by Obj.occupied_cells
+        @return tuple (xs, ys) of arrays with converted coordinates
+        """
+        if isinstance(coordinates, np.ndarray):
+            xs = coordinates[:, 0]
+            ys = coordinates[:, 1]
+        else:
+            coordinates = list(coordinates)
+            xs = np.fromiter((c["x"] for c in coordinates), float, len(coordinates))
+            ys = np.fromiter((c["y"] for c in coordinates), float, len(coordinates))
+
+        multiplier = self.converter.multiplier
+        if multiplier == 1:
+            return xs, ys
+
+        # every block covers multiplier x multiplier cells
+        xs = np.round(xs, 5) * multiplier
+        ys = np.round(ys, 5) * multiplier
+        shape = (len(xs), multiplier, multiplier)
+        xs = np.broadcast_to(xs[:, None, None] + self._sub_cells[None, None, :], shape)
+        ys = np.broadcast_to(ys[:, None, None] + self._sub_cells[None, :, None], shape)
+        return xs.ravel(), ys.ravel()
 
     def is_legal_position(self, coordinates, obj):
         """
@@ -228,3 +306,415 @@ class Grid:
                             self[new_cell].objects[0] != obj):
                         return False
         return True
+
+    def is_legal_placement(self, obj, x, y, block_matrix):
+        """
+        expects non converted coordinates
+        --------------------------------------------
+        checks if obj could be placed at x, y with the
+        given block matrix
+        """
+        return self.is_legal_position(obj.occupied(x, y, block_matrix), obj)
+
+    def legal_placements(self, obj, placements):
+        """
+        expects non converted coordinates
+        --------------------------------------------
+        checks several placements of obj at once
+        @param placements   list of (x, y, block_matrix) tuples
+        @return list of booleans, see is_legal_placement
+        """
+        return [
+            self.is_legal_placement(obj, x, y, block_matrix)
+            for x, y, block_matrix in placements
+        ]
+
+
+class NumpyGrid(Grid):
+    """
+    a grid storing occupancy in integer numpy arrays instead of Tiles:
+        -layers: (depth, rows, columns) array of object indices, the objects
+         on a cell are stacked in the order they were added (0 = empty)
+        -counts: (rows, columns) array holding the number of objects per cell
+    Tiles are only built on request (indexing, get_single_tile) and are
+    snapshots: changing their object list does not change the grid.
+    Placements are checked by indexing the bottom layer with cell offsets
+    computed once per orientation.
+    """
+    backend = "numpy"
+
+    def clear_grid(self):
+        """
+        generate an empty grid
+        """
+        self.n_cols = len(np.arange(0, self.width, self.step))
+        self.n_rows = len(np.arange(0, self.height, self.step))
+        self.layers = np.zeros((1, self.n_rows, self.n_cols), dtype=np.int32)
+        self.counts = np.zeros((self.n_rows, self.n_cols), dtype=np.int16)
+        # index 0 is reserved for empty cells
+        self._objs: List[Obj] = [None]
+        self._obj_index: Dict[Obj, int] = dict()
+        self._obj_cells: List[int] = [0]
+        self._free_indices: List[int] = list()
+        # Orientation -> placement offsets, see _placement_offsets
+        self._offsets = dict()
+        self._notify_cleared()
+
+    def __repr__(self):
+        rep = ""
+        for row in self:
+            rep += f"[{' '.join(str(i) for i in row)}]\n"
+        return rep
+
+    def __iter__(self):
+        for row in range(self.n_rows):
+            yield self[row]
+
+    def __getitem__(self, i):
+        """
+        grid can be accessed:
+            -as a normal 2D-array with int as indeces -> matrix[y][x]
+            -by giving a dictionary dict = {"x": x, "y": y}
+
+        expects converted coordinates
+        """
+        if isinstance(i, (int, float, np.integer, np.floating)):
+            row = range(self.n_rows)[int(i)]
+            return [self._get_tile(row, col) for col in range(self.n_cols)]
+
+        elif isinstance(i, dict):
+            return self._get_tile(int(i["y"]), int(i["x"]))
+
+    def __contains__(self, coordinates):
+        """
+        expects converted coordinates
+        """
+        x = coordinates["x"]
+        y = coordinates["y"]
+        return 0 <= x < self.n_cols and 0 <= y < self.n_rows
+
+    def _get_tile(self, row, col):
+        """
+        @return Tile listing the objects on the cell (row, col)
+        """
+        tile = Tile(col * self.step, row * self.step)
+        tile.objects = [
+            self._objs[index]
+            for index in self.layers[:self.counts[row, col], row, col]
+        ]
+        return tile
+
+    def get_single_tile(self, position):
+        """
+        expects non converted coordinates
+        """
+        x = int(position["x"] * self.converter.multiplier)
+        y = int(position["y"] * self.converter.multiplier)
+
+        return self._get_tile(y, x)
+
+    def _on_grid(self, xs, ys):
+        """
+        @return True if all converted coordinates lie on the grid
+        """
+        return bool(
+            np.all((0 <= xs) & (xs < self.n_cols) &
+                   (0 <= ys) & (ys < self.n_rows))
+        )
+
+    def _register(self, obj):
+        """
+        @return the index representing obj in the layers
+        """
+        index = self._obj_index.get(obj)
+        if index is None:
+            if self._free_indices:
+                index = self._free_indices.pop()
+                self._objs[index] = obj
+            else:
+                index = len(self._objs)
+                self._objs.append(obj)
+                self._obj_cells.append(0)
+            self._obj_index[obj] = index
+        return index
+
+    def _release(self, index):
+        """
+        forget about the object with the given index
+        """
+        obj = self._objs[index]
+        del self._obj_index[obj]
+        self._objs[index] = None
+        self._free_indices.append(index)
+
+    def add_obj(self, obj):
+        """
+        expects non converted coordinates
+        """
+        xs, ys = self._to_cells(obj.occupied_cells())
+        xs = xs.astype(np.intp)
+        ys = ys.astype(np.intp)
+        index = self._register(obj)
+
+        depth = self.counts[ys, xs]
+        if depth.size > 0 and depth.max() >= self.layers.shape[0]:
+            # add a layer for objects stacked on top of others
+            new_layer = np.zeros((1, self.n_rows, self.n_cols), dtype=np.int32)
+            self.layers = np.concatenate([self.layers, new_layer])
+
+        self.layers[depth, ys, xs] = index
+        self.counts[ys, xs] += 1
+        self._obj_cells[index] += len(xs)
+        if self.observers:
+            self._notify_changed(xs, ys, obj, 1)
+
+    def remove_obj(self, obj):
+        """
+        expects non converted coordinates
+        """
+        index = self._obj_index.get(obj)
+        if index is None:
+            raise ValueError(f"{obj} is not on the grid")
+        xs, ys = self._to_cells(obj.occupied_cells())
+        xs = xs.astype(np.intp)
+        ys = ys.astype(np.intp)
+
+        stacks = self.layers[:, ys, xs]
+        matches = stacks == index
+        if not np.all(matches.any(axis=0)):
+            raise ValueError(f"{obj} is not on all of its cells")
+
+        if self.layers.shape[0] == 1:
+            self.layers[0, ys, xs] = 0
+        else:
+            # drop the first occurrence on each cell and let the objects
+            # stacked above move down, keeping their order
+            cells = np.arange(len(xs))
+            keep = np.ones_like(matches)
+            keep[matches.argmax(axis=0), cells] = False
+            order = np.argsort(~keep, axis=0, kind="stable")
+            stacks = np.take_along_axis(stacks, order, axis=0)
+            stacks[-1] = 0
+            self.layers[:, ys, xs] = stacks
+
+        self.counts[ys, xs] -= 1
+        self._obj_cells[index] -= len(xs)
+        if self._obj_cells[index] <= 0:
+            self._release(index)
+        if self.observers:
+            self._notify_changed(xs, ys, obj, -1)
+
+    def is_legal_position(self, coordinates, obj):
+        """
+        expects non converted coordinates
+        --------------------------------------------
+        checks if the passed coordinates are a valid
+        position for the passed item
+        """
+        xs, ys = self._to_cells(coordinates)
+
+        # cells must be on grid
+        if not self._on_grid(xs, ys):
+            return False
+
+        if self.prevent_overlap is True:
+            # cells must be empty or have obj at the bottom
+            bottom = self.layers[0, ys.astype(np.intp), xs.astype(np.intp)]
+            own_index = self._obj_index.get(obj, -1) if isinstance(obj, Obj) else -1
+            return bool(np.all((bottom == 0) | (bottom == own_index)))
+        return True
+
+    def _placement_offsets(self, orientation):
+        """
+        @return tuple (min_x, max_x, min_y, max_y, offsets): the bounding
+                box of the converted cells covered by orientation placed
+                at (0, 0) and the indices of these cells in the flattened
+                layers, computed once per orientation
+        """
+        offsets = self._offsets.get(orientation)
+        if offsets is None:
+            xs, ys = self._to_cells(orientation.offsets)
+            xs = xs.astype(np.intp)
+            ys = ys.astype(np.intp)
+            offsets = (int(xs.min()), int(xs.max()), int(ys.min()),
+                       int(ys.max()), ys * self.n_cols + xs)
+            self._offsets[orientation] = offsets
+        return offsets
+
+    def is_legal_placement(self, obj, x, y, block_matrix):
+        """
+        expects non converted coordinates
+        --------------------------------------------
+        checks if obj could be placed at x, y with the
+        given block matrix
+        """
+        orientation = obj.get_orientation(block_matrix)
+        multiplier = self.converter.multiplier
+        col = round(x * multiplier, 5)
+        row = round(y * multiplier, 5)
+        if not orientation.cells or not (float(col).is_integer() and
+                                         float(row).is_integer()):
+            return self.is_legal_position(
+                obj.occupied_cells(x, y, block_matrix), obj
+            )
+        col, row = int(col), int(row)
+        min_x, max_x, min_y, max_y, offsets = \
+            self._placement_offsets(orientation)
+
+        # cells must be on grid
+        if (col + min_x < 0 or col + max_x >= self.n_cols or
+                row + min_y < 0 or row + max_y >= self.n_rows):
+            return False
+
+        if self.prevent_overlap is True:
+            # cells must be empty or have obj at the bottom, the first
+            # n_rows * n_cols entries of the flattened layers are the
+            # bottom layer
+            bottom = self.layers.take(offsets + (row * self.n_cols + col))
+            own_index = self._obj_index.get(obj, -1) if isinstance(obj, Obj) else -1
+            return set(bottom.tolist()) <= {0, own_index}
+        return True
+
+    # with the offsets cached per orientation, single checks are cheaper
+    # than gathering the cells of all placements
+    legal_placements = Grid.legal_placements
+
+
+class BitboardGrid(NumpyGrid):
+    """
+    a NumpyGrid for integer move steps that additionally keeps
+    a bitboard: one Python int per row, bit x is set if the cell
+    (x, row) is occupied. Block matrices are translated to row masks
+    once, so a legality check only needs a few shifts and ANDs.
+    """
+    backend = "bitboard"
+
+    def __init__(self, width, height, step, prevent_overlap):
+        if not float(step).is_integer():
+            raise ValueError("BitboardGrid requires an integer step size")
+        super().__init__(width, height, step, prevent_overlap)
+
+    def clear_grid(self):
+        """
+        generate an empty grid
+        """
+        super().clear_grid()
+        self.rows: List[int] = [0] * self.n_rows
+
+    def _update_rows(self, ys):
+        """
+        recompute the bitboard rows ys from the count layer
+        """
+        for y in np.unique(ys):
+            occupied = np.packbits(self.counts[y] > 0, bitorder="little")
+            self.rows[y] = int.from_bytes(occupied.tobytes(), "little")
+
+    def add_obj(self, obj):
+        """
+        expects non converted coordinates
+        """
+        super().add_obj(obj)
+        self._update_rows(obj.occupied_cells()[:, 1].astype(np.intp))
+
+    def remove_obj(self, obj):
+        """
+        expects non converted coordinates
+        """
+        super().remove_obj(obj)
+        self._update_rows(obj.occupied_cells()[:, 1].astype(np.intp))
+
+    def _own_rows(self, obj):
+        """
+        @return dict mapping rows to the bits occupied by obj if obj is
+                on the grid, else an empty dict
+        """
+        if not isinstance(obj, Obj) or obj not in self._obj_index:
+            return dict()
+        if not (float(obj.x).is_integer() and float(obj.y).is_integer()):
+            return dict()
+        x, y = int(obj.x), int(obj.y)
+        masks = obj.get_orientation().row_masks[-1]
+        return {y + dy: BitboardGrid._shift(mask, x) for dy, mask in masks}
+
+    @staticmethod
+    def _shift(mask, x):
+        """
+        @return mask moved x columns to the right (left for negative x)
+        """
+        if x >= 0:
+            return mask << x
+        return mask >> -x
+
+    def is_legal_position(self, coordinates, obj):
+        """
+        expects non converted coordinates
+        --------------------------------------------
+        checks if the passed coordinates are a valid
+        position for the passed item
+        """
+        new_rows = dict()
+        for cell in coordinates:
+            x, y = cell["x"], cell["y"]
+            # cell must be on grid
+            if not (0 <= x < self.n_cols and 0 <= y < self.n_rows):
+                return False
+            y = int(y)
+            new_rows[y] = new_rows.get(y, 0) | (1 << int(x))
+        return self._rows_are_free(new_rows.items(), obj)
+
+    def is_legal_placement(self, obj, x, y, block_matrix):
+        """
+        expects non converted coordinates
+        --------------------------------------------
+        checks if obj could be placed at x, y with the
+        given block matrix
+        """
+        if not (float(x).is_integer() and float(y).is_integer()):
+            return super().is_legal_placement(obj, x, y, block_matrix)
+        x, y = int(x), int(y)
+        orientation = obj.get_orientation(block_matrix)
+        min_x, max_x, min_y, max_y, masks = orientation.row_masks
+
+        # blocks must be on grid
+        if (x + min_x < 0 or x + max_x >= self.n_cols or
+                y + min_y < 0 or y + max_y >= self.n_rows):
+            return False
+        return self._rows_are_free(
+            ((y + dy, BitboardGrid._shift(mask, x)) for dy, mask in masks), obj
+        )
+
+    def _rows_are_free(self, new_rows, obj):
+        """
+        @param new_rows iterable of (row, mask) pairs
+        @param obj      object to be placed, its own blocks are not
+                        considered as occupied
+        @return True if overlaps are allowed or no bit of any mask is
+                occupied by another object
+        """
+        if self.prevent_overlap is not True:
+            return True
+        own_rows = self._own_rows(obj)
+        for row, mask in new_rows:
+            if self.rows[row] & ~own_rows.get(row, 0) & mask:
+                return False
+        return True
+
+
+GRID_BACKENDS = {
+    "tiles": Grid,
+    "numpy": NumpyGrid,
+    "bitboard": BitboardGrid,
+}
+
+
+def create_grid(config: GridConfig):
+    """
+    Create an empty grid using the backend selected in config.
+    @param config   GridConfig (or Config) instance
+    @return new Grid instance
+    """
+    grid_class = GRID_BACKENDS[config.grid_backend]
+    # bitboards need whole blocks, use plain arrays for smaller steps
+    if grid_class is BitboardGrid and not float(config.move_step).is_integer():
+        grid_class = NumpyGrid
+    return grid_class.create_from_config(config)
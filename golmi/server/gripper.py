@@ -53,11 +53,16 @@ class Gripper(Obj):
     def to_dict(self):
         """
         Constructs a JSON-friendly dictionary representation of this instance.
+        The dictionary is cached until one of the mutators (move,
+        set_position, set_gripped) is called, so it is shared between callers
+        and must not be modified.
         @return dictionary containing all important properties
         """
-        return {
-            "id_n": self.id_n,
-            "x": self.x,
-            "y": self.y,
-            "color": self.color
-        }
+        if self._dict is None:
+            self._dict = {
+                "id_n": self.id_n,
+                "x": self.x,
+                "y": self.y,
+                "color": self.color
+            }
+        return self._dict
@@ -1,14 +1,18 @@
+from contextlib import contextmanager
 from socket import SocketIO
 
 import eventlet
 import math
+import time
 
 from golmi.server.generator import Generator
 from golmi.server.config import Config
-from golmi.server.grid import Grid
+from golmi.server.grid import create_grid
 from golmi.server.gripper import Gripper
 from golmi.server.state import State
 from golmi.server.mover import Mover
+from golmi.server.scheduler import TickScheduler
+from golmi.server.wire import STATE_EVENTS, WireEncoder
 
 
 class Model:
@@ -20,9 +24,25 @@ class Model:
         self.mover = Mover()
 
         # Contains a dictionary for each available action. The nested dicts map
-        # gripper ids to an eventlet greenthread instance if the respective
+        # gripper ids to a LoopedAction instance if the respective
         # action is currently running (= repeatedly executed), else to None
         self.running_loops = {action: dict() for action in self.config.actions}
+        # executes all running loops at a fixed time step
+        self.scheduler = TickScheduler(self)
+        # event names collected by batch_notifications, None if not batching
+        self._pending_events = None
+        # with a frame rate: event name -> data of the current frame,
+        # ordered by the last update
+        self._frame_events = dict()
+        # greenthread flushing the current frame
+        self._frame_flush = None
+        self._last_flush = 0.0
+        # ids of clients that receive state events in the binary format
+        self.binary_clients = set()
+        self._wire_encoder = None
+        # gripper id -> legal action mask, see get_action_mask()
+        self._action_masks = dict()
+        self._action_mask_key = None
 
     def __repr__(self):
         return f"Model(room: {self.room_id})"
@@ -59,6 +79,12 @@ class Model:
         """
         return self.state.get_gripper_coords(gr_id)
 
+    def get_state_dict(self):
+        """
+        @return full state dict including the current revision
+        """
+        return self.state.to_dict(include_revision=True)
+
     def get_config(self):
         return self.config.to_dict()
 
@@ -79,9 +105,135 @@ class Model:
         @param event_name 	event type (str), e.g. "update_grippers"
         @param data 	serializable data to send to listeners
         """
+        if self.sio is None:
+            return
+        if not self.config.frame_rate:
+            self._emit(event_name, data)
+            return
+
+        # merge into the current frame, the views are notified at the end
+        # of the frame
+        if event_name == "update_state":
+            # a new state supersedes all pending updates
+            for superseded in ("update_objs", "update_grippers",
+                               "update_targets", "patch"):
+                self._frame_events.pop(superseded, None)
+        previous = self._frame_events.pop(event_name, None)
+        if event_name == "patch" and previous is not None:
+            data = Model._merge_patches(previous, data)
+        self._frame_events[event_name] = data
+
+        if self._frame_flush is None:
+            frame_end = self._last_flush + 1 / self.config.frame_rate
+            self._frame_flush = eventlet.spawn_after(
+                max(0, frame_end - time.monotonic()), self._flush_frame
+            )
+
+    def _flush_frame(self):
+        """
+        Send all updates collected in the current frame.
+        """
+        frame_events = self._frame_events
+        self._frame_events = dict()
+        self._frame_flush = None
+        self._last_flush = time.monotonic()
         if self.sio is not None:
+            for event_name, data in frame_events.items():
+                self._emit(event_name, data)
+
+    def _emit(self, event_name, data):
+        """
+        Send an event to all clients in the room, in the binary format
+        to clients that requested it.
+        """
+        if self.binary_clients and event_name in STATE_EVENTS:
+            self.sio.emit(event_name, data, room=self.room_id,
+                          skip_sid=list(self.binary_clients))
+            payload = self.encode_payload(event_name, data)
+            for client_id in self.binary_clients:
+                self.sio.emit(event_name, payload, room=client_id)
+        else:
             self.sio.emit(event_name, data, room=self.room_id)
 
+    def encode_payload(self, event_name, data):
+        """
+        @param event_name   name of the event to send
+        @param data         json-friendly payload of the event
+        @return payload in the binary wire format, see golmi.server.wire
+        """
+        if self._wire_encoder is None:
+            self._wire_encoder = WireEncoder(self.get_type_config())
+        return self._wire_encoder.encode(event_name, data)
+
+    @staticmethod
+    def _merge_patches(first, second):
+        """
+        @param first    patch dict, see State.pop_patch
+        @param second   patch dict following first
+        @return new patch containing the changes of both patches
+        """
+        merged = {
+            "base_revision": first["base_revision"],
+            "revision": second["revision"]
+        }
+        for key in ("objs", "grippers", "targets"):
+            merged[key] = {**first[key], **second[key]}
+        return merged
+
+    def _notify_changes(self, *event_names):
+        """
+        Notify all listening views of the changes since the last
+        notification. If delta updates are configured, a single 'patch'
+        event with the changed entries and the new revision is sent.
+        Otherwise the full dictionaries are sent for each of event_names.
+        @param event_names  any of "update_objs", "update_grippers",
+                            "update_targets"
+        """
+        if self._pending_events is not None:
+            for event_name in event_names:
+                if event_name not in self._pending_events:
+                    self._pending_events.append(event_name)
+            return
+
+        if self.sio is None:
+            # nobody to notify, skip serialization
+            self.state.commit_changes()
+            return
+
+        patch = self.state.pop_patch()
+        if self.config.delta_updates:
+            if patch is not None:
+                self._notify_views("patch", patch)
+            return
+
+        for event_name in event_names:
+            if event_name == "update_objs":
+                self._notify_views(event_name, self.get_obj_dict())
+            elif event_name == "update_grippers":
+                self._notify_views(event_name, self.get_gripper_dict())
+            elif event_name == "update_targets":
+                self._notify_views(event_name, self.state.get_target_dict())
+
+    @contextmanager
+    def batch_notifications(self):
+        """
+        Context manager collecting the change notifications of all actions
+        inside the block. Views are notified once when the block is left.
+        """
+        if self._pending_events is not None:
+            # already batching
+            yield
+            return
+
+        self._pending_events = list()
+        try:
+            yield
+        finally:
+            event_names = self._pending_events
+            self._pending_events = None
+            if event_names:
+                self._notify_changes(*event_names)
+
     # --- Set up and configuration --- #
 
     def set_random_state(self, n_objs, n_grippers, obj_area="all",
@@ -118,7 +270,7 @@ class Model:
                             "dict, or State instance.")
 
         # update views
-        self._notify_views("update_state", self.state.to_dict())
+        self._notify_views("update_state", self.get_state_dict())
 
     def set_config(self, config):
         """
@@ -138,9 +290,12 @@ class Model:
             raise TypeError("Parameter config must be a json file name, "
                             "dict, or Config instance")
 
+        # types might have changed
+        self._wire_encoder = None
+
         # create grids
-        self.state.object_grid = Grid.create_from_config(self.config)
-        self.state.target_grid = Grid.create_from_config(self.config)
+        self.state.object_grid = create_grid(self.config)
+        self.state.target_grid = create_grid(self.config)
 
         # in case the available actions changed, reset the looped actions
         self.reset_loops()
@@ -152,7 +307,7 @@ class Model:
         """
         self.state = State.empty_state(self.config)
         self.reset_loops()
-        self._notify_views("update_state", self.state.to_dict())
+        self._notify_views("update_state", self.get_state_dict())
 
     # --- Gripper manipulation --- #
     def add_gr(self, gr_id, start_x: int = None, start_y: int = None):
@@ -169,8 +324,8 @@ class Model:
             start_y = self.get_height()/2
         # if a new gripper was created, notify listeners
         if gr_id not in self.state.grippers:
-            self.state.grippers[gr_id] = Gripper(gr_id, start_x, start_y)
-            self._notify_views("update_grippers", self.get_gripper_dict())
+            self.state.add_gripper(Gripper(gr_id, start_x, start_y))
+            self._notify_changes("update_grippers")
 
     def remove_gr(self, gr_id):
         """
@@ -178,8 +333,8 @@ class Model:
         @param gr_id 	identifier of the gripper to remove
         """
         if gr_id in self.state.grippers:
-            self.state.grippers.pop(gr_id)
-            self._notify_views("update_grippers", self.get_gripper_dict())
+            self.state.remove_gripper(gr_id)
+            self._notify_changes("update_grippers")
 
     def start_gripping(self, gr_id):
         """
@@ -205,51 +360,89 @@ class Model:
         lines (coordinates are float), it will automatically
         try to find a free spot and place the object there
         """
+        obj = self.state.get_obj_by_id(obj_id)
+        position = self._snap_position(obj)
+        # if no nearby position if free, cannot place it
+        if position is None:
+            return False
+
+        if position != (obj.x, obj.y):
+            # move object
+
+            # 1 - remove obj from state
+            self.state.remove_object(obj)
+
+            # 2 - change x and y in object
+            obj.set_position(*position)
+
+            # 3 - add object to state
+            self.state.add_object(obj)
+        return True
+
+    def _snap_position(self, obj):
+        """
+        Find the position obj is placed at when it is ungripped, without
+        changing the state.
+        @param obj  gripped object
+        @return tuple (x, y) or None if obj cannot be ungripped
+        """
         # without snap to grid a gripper can always ungrip
         if self.config.snap_to_grid is False:
-            return True
-
-        obj = self.state.get_obj_by_id(obj_id)
+            return obj.x, obj.y
 
         # integer positions are always plotted on the grid
         if float(obj.x).is_integer() and float(obj.y).is_integer():
-            return True
-        else:
-            # x or y not on grid
-            possible_positions = [
-                (math.ceil(obj.x), math.ceil(obj.y)),
-                (math.ceil(obj.x), math.floor(obj.y)),
-                (math.floor(obj.x), math.ceil(obj.y)),
-                (math.floor(obj.x), math.floor(obj.y))
-            ]
-
-            for new_x, new_y in possible_positions:
-                occupied = obj.occupied(new_x, new_y)
-                if self.mover._is_legal_move(
-                        occupied,
-                        obj,
-                        self.state,
-                        self.config):
-                    # move object
-
-                    # 1 - remove obj from state
-                    self.state.remove_object(obj)
-
-                    # 2 - change x and y in object
-                    obj.x = new_x
-                    obj.y = new_y
-
-                    # 3 - add object to state
-                    self.state.add_object(obj)
-                    return True
-
-            # if no nearby position if free, cannot place it
-            return False
+            return obj.x, obj.y
+
+        # x or y not on grid
+        possible_positions = [
+            (math.ceil(obj.x), math.ceil(obj.y)),
+            (math.ceil(obj.x), math.floor(obj.y)),
+            (math.floor(obj.x), math.ceil(obj.y)),
+            (math.floor(obj.x), math.floor(obj.y))
+        ]
+        if self.config.lock_on_target is True and \
+                self.mover._obj_on_target(obj, self.state):
+            return None
+        legal = self.state.object_grid.legal_placements(
+            obj, [(x, y, obj.block_matrix) for x, y in possible_positions]
+        )
+        for position, is_legal in zip(possible_positions, legal):
+            if is_legal:
+                return position
+        return None
+
+    def get_action_mask(self, gr_id=None):
+        """
+        Legal actions per gripper, see golmi.server.mover.ACTIONS for the
+        order of actions. The masks are cached until the state revision
+        changes, do not modify them.
+        @param gr_id    id of a gripper or None for all grippers
+        @return boolean array with one entry per action if gr_id is given,
+                else dict mapping gripper ids to arrays
+        """
+        key = (self.state, self.state.revision, self.config)
+        if key != self._action_mask_key or self.state.has_changes():
+            # uncommitted changes have no revision yet, do not cache
+            self._action_masks = dict()
+            self._action_mask_key = None if self.state.has_changes() else key
+
+        if gr_id is not None:
+            mask = self._action_masks.get(gr_id)
+            if mask is None:
+                mask = self.mover.legal_actions(self, gr_id)
+                self._action_masks[gr_id] = mask
+            return mask
+        return {
+            gr_id: self.get_action_mask(gr_id)
+            for gr_id in self.state.get_gripper_ids()
+        }
 
     def grip(self, gr_id):
         """
         Attempt a grip / ungrip.
         @param gr_id 	gripper id
+        @return True if an object was gripped or ungripped
         """
         # if some object is already gripped, ungrip it
         old_gripped = self.get_gripped_obj(gr_id)
@@ -259,8 +452,8 @@ class Model:
                 # state takes care of detaching object and gripper
                 self.state.ungrip(gr_id)
                 # notify view of object and gripper change
-                self._notify_views("update_objs", self.get_obj_dict())
-                self._notify_views("update_grippers", self.get_gripper_dict())
+                self._notify_changes("update_objs", "update_grippers")
+                return True
         else:
             # Check if gripper hovers over some object
             new_gripped = self._get_grippable(gr_id)
@@ -269,8 +462,65 @@ class Model:
                 self.state.grip(gr_id, new_gripped)
 
                 # notify view of object and gripper change
-                self._notify_views("update_objs", self.get_obj_dict())
-                self._notify_views("update_grippers", self.get_gripper_dict())
+                self._notify_changes("update_objs", "update_grippers")
+                return True
+        return False
+
+    def apply_actions(self, actions, atomic=True):
+        """
+        Apply an ordered list of actions in one pass. Views are notified
+        once after the last action.
+        @param actions  list of dicts, each with the keys "type" (one of
+                        "move", "rotate", "flip", "grip") and "id" (gripper
+                        id) plus the parameters of the action: "dx" and "dy"
+                        for move, "direction" and optionally "step_size"
+                        for rotate
+        @param atomic   True to undo all actions if one of them is invalid
+                        or cannot be applied. Default: True
+        @return True if all actions were applied
+        """
+        checkpoint = self.state.checkpoint() if atomic else None
+        all_applied = True
+        with self.batch_notifications():
+            for action in actions:
+                applied = self._apply_action(action)
+                all_applied = all_applied and applied
+                if not applied and atomic:
+                    self.state.rollback(checkpoint)
+                    break
+        return all_applied
+
+    def _apply_action(self, action):
+        """
+        Apply a single action of a batch, see apply_actions.
+        @return True if the action was valid and applied
+        """
+        action_type = action.get("type")
+        gr_id = action.get("id")
+        if action_type not in self.config.actions or \
+                self.get_gripper_by_id(gr_id) is None:
+            return False
+
+        if action_type == "grip":
+            return self.grip(gr_id)
+        if action_type == "move":
+            if action.get("dx") is None or action.get("dy") is None:
+                return False
+            return self.mover.apply_movement(
+                self, "move", gr_id,
+                x_steps=action["dx"], y_steps=action["dy"]
+            )
+        if action_type == "rotate":
+            if action.get("direction") is None:
+                return False
+            return self.mover.apply_movement(
+                self, "rotate", gr_id,
+                direction=action["direction"],
+                rotation_step=action.get("step_size")
+            )
+        if action_type == "flip":
+            return self.mover.apply_movement(self, "flip", gr_id)
+        return False
 
     def start_moving(self, gr_id, x_steps, y_steps):
         """
@@ -377,8 +627,10 @@ class Model:
 
     def start_loop(self, action_type, gripper, fn, *args, **kwargs):
         """
-        Spawn a greenthread.GreenThread instance that executes
-        fn until stop_loop is called.
+        Register fn with the scheduler, which executes it repeatedly
+        until stop_loop is called.
+        Moves are repeated every action_interval, rotations, flips and grips
+        are slower (every 0.5 seconds).
 
         @param action_type	str, one of the action types defined by the config
         @param gripper      id of the gripper to perform the action with
@@ -386,24 +638,13 @@ class Model:
         """
         assert action_type in self.running_loops, \
             f"Error at Model.start_loop: action {action_type} not registered"
-        # create a thread executing the action infinitely
 
-        self.running_loops[action_type][gripper] = eventlet.spawn(
-            self._loop, fn, *args, **kwargs
-        )
-
-    def _loop(self, fn, *args, **kwargs):
         # rotations and flips can be slow (0.5)
         # movements should be as fast as in config
-        if args[1] == "move":
-            action_interval = self.config.action_interval
-        else:
-            action_interval = 0.5
-
-        # start loop
-        while True:
-            fn(*args, **kwargs)
-            eventlet.sleep(action_interval)
+        interval = None if action_type == "move" else 0.5
+        self.running_loops[action_type][gripper] = self.scheduler.add(
+            (action_type, gripper), fn, *args, interval=interval, **kwargs
+        )
 
     def stop_loop(self, action_type, gripper):
         """
@@ -412,18 +653,11 @@ class Model:
         assert action_type in self.running_loops, \
             f"Error at Model.stop_loop: action {action_type} not registered"
 
-        if gripper in self.running_loops[action_type] and isinstance(
-                self.running_loops[action_type][gripper],
-                eventlet.greenthread.GreenThread
-                ):
-            self.running_loops[action_type][gripper].kill()
+        if self.running_loops[action_type].get(gripper) is not None:
+            self.scheduler.remove((action_type, gripper))
             self.running_loops[action_type][gripper] = None
 
     def reset_loops(self):
         """Stop all running actions."""
-        # kill any existing thread
-        for action_dict in self.running_loops.values():
-            for thread in action_dict.values():
-                if isinstance(thread, eventlet.greenthread.GreenThread):
-                    thread.kill()
+        self.scheduler.clear()
         self.running_loops = {action: dict() for action in self.config.actions}
@@ -4,7 +4,22 @@ The Mover module implements all movements
 All helpers function needed to make a movement
 are also implemented here.
 """
-from golmi.server.obj import Obj
+import numpy as np
+
+# discrete actions of a gripper: (action type, parameters), the order of
+# the masks returned by Mover.legal_actions
+ACTIONS = (
+    ("move", {"x_steps": 0, "y_steps": -1}),  # up
+    ("move", {"x_steps": 0, "y_steps": 1}),  # down
+    ("move", {"x_steps": -1, "y_steps": 0}),  # left
+    ("move", {"x_steps": 1, "y_steps": 0}),  # right
+    ("rotate", {"direction": -1}),
+    ("rotate", {"direction": 1}),
+    ("flip", {}),
+    ("grip", {}),
+)
+ACTION_NAMES = ("up", "down", "left", "right", "rotate_left", "rotate_right",
+                "flip", "grip")
 
 
 class Mover:
@@ -22,23 +37,23 @@ class Mover:
 
         return state.object_grid.gripper_on_grid(new_gr_pos)
 
-    def _get_new_coordinates(self, config, gr_obj, **kwargs):
+    def _get_new_placement(self, config, gr_obj, **kwargs):
         """
         based on the type of movement this function will
-        return the new coordinates after the movement
+        return the new position and block matrix after the movement
         """
         d_angle = None
+        new_x = gr_obj.x
+        new_y = gr_obj.y
+        new_matrix = gr_obj.block_matrix
 
         if kwargs["type"] == "move":
-            dx = kwargs["dx"]
-            dy = kwargs["dy"]
-            new_coordinates = gr_obj.occupied(
-                gr_obj.x + dx, gr_obj.y + dy, gr_obj.block_matrix
-            )
-            new_matrix = gr_obj.block_matrix
+            new_x += kwargs["dx"]
+            new_y += kwargs["dy"]
 
         elif kwargs["type"] == "rotate":
-            if kwargs.get("rotation_step") is None:
+            step_size = kwargs.get("rotation_step")
+            if step_size is None:
                 step_size = config.rotation_step
 
             direction = kwargs["direction"]
@@ -46,25 +61,13 @@ class Mover:
             d_angle = direction * step_size
 
             # obtain rotated matrix
-            new_matrix = Obj.rotate_block_matrix(
-                gr_obj.block_matrix, d_angle
-            )
-
-            new_coordinates = gr_obj.occupied(
-                gr_obj.x, gr_obj.y, new_matrix
-            )
+            new_matrix = gr_obj.get_orientation().rotated(d_angle).matrix
 
         elif kwargs["type"] == "flip":
             # obtain flipped matrix
-            new_matrix = Obj.flip_block_matrix(
-                gr_obj.block_matrix
-            )
+            new_matrix = gr_obj.get_orientation().flipped.matrix
 
-            new_coordinates = gr_obj.occupied(
-                gr_obj.x, gr_obj.y, new_matrix
-            )
-
-        return new_coordinates, new_matrix, d_angle
+        return new_x, new_y, new_matrix, d_angle
 
     def _obj_on_target(self, obj, state):
         objs_on_target = list()
@@ -82,31 +85,85 @@ class Mover:
 
         # every position on target grid had only 1 element
         if len(set(objs_on_target)) == 1:
-            target_id = objs_on_target[0]
-            target_obj = state.targets[target_id]
+            target_obj = objs_on_target[0]
 
             # object and target must have same form and color
             if target_obj.type == obj.type:
                 if target_obj.color == obj.color:
                     return True
 
-    def _is_legal_move(self, new_coordinates, gr_obj, state, config):
+    def _is_legal_move(self, gr_obj, new_x, new_y, new_matrix, state, config):
         """
         check if the movement is allowed
         """
         # tiles are free and within limits
-        obj_can_move = state.object_grid.is_legal_position(
-            new_coordinates, gr_obj
+        obj_can_move = state.object_grid.is_legal_placement(
+            gr_obj, new_x, new_y, new_matrix
         )
 
         # check if object is on a target
         if config.lock_on_target is True:
-            on_target = self._obj_on_target(gr_obj)
+            on_target = self._obj_on_target(gr_obj, state)
         else:
             on_target = False
 
         return obj_can_move and not on_target
 
+    def legal_actions(self, model, gr_id):
+        """
+        Check all ACTIONS of a gripper with the rules of apply_movement
+        and Model.grip. The placements of a gripped object are checked
+        in one batch.
+        @param model    Model instance
+        @param gr_id    id of the gripper
+        @return boolean array, True for each action in ACTIONS that
+                would be applied
+        """
+        config = model.config
+        state = model.state
+        mask = np.zeros(len(ACTIONS), dtype=bool)
+
+        gr_obj_id = state.get_gripped_obj(gr_id)
+        gr_obj = state.get_obj_by_id(gr_obj_id) if gr_obj_id else None
+        locked = gr_obj is not None and config.lock_on_target is True and \
+            bool(self._obj_on_target(gr_obj, state))
+
+        # (action index, x, y, block matrix) of the gripped object
+        placements = list()
+        for i, (action_type, kwargs) in enumerate(ACTIONS):
+            if action_type not in config.actions:
+                continue
+            if action_type == "grip":
+                if gr_obj is not None:
+                    mask[i] = model._snap_position(gr_obj) is not None
+                else:
+                    mask[i] = model._get_grippable(gr_id) is not None
+                continue
+
+            dx = dy = 0
+            if action_type == "move":
+                dx = round(kwargs["x_steps"]) * config.move_step
+                dy = round(kwargs["y_steps"]) * config.move_step
+                if not self._gripper_can_move(gr_id, dx, dy, state):
+                    continue
+            if gr_obj is None:
+                # only moves change an empty gripper
+                mask[i] = action_type == "move"
+            elif not locked:
+                new_x, new_y, new_matrix, _ = self._get_new_placement(
+                    config, gr_obj, type=action_type, dx=dx, dy=dy,
+                    direction=kwargs.get("direction")
+                )
+                placements.append((i, new_x, new_y, new_matrix))
+
+        if placements:
+            legal = state.object_grid.legal_placements(
+                gr_obj, [placement[1:] for placement in placements]
+            )
+            for (i, _, _, _), is_legal in zip(placements, legal):
+                mask[i] = is_legal
+        return mask
+
     def _move(self, gr_id, dx, dy, state):
         """
         move a gripper and the gripped object
@@ -145,6 +202,9 @@ class Mover:
                         - rotation_step (optional)
 
             - flip:     does not require extra arguments
+
+        @return True if the movement was applied, False if it was illegal
+                or there was nothing to rotate / flip
         """
         # extract config and state from model
         config = model.config
@@ -163,6 +223,7 @@ class Mover:
 
         # make sure gripper can move
         gripper_can_move = self._gripper_can_move(gr_id, dx, dy, state)
+        applied = False
 
         if gripper_can_move:
             # check if gripper has an object
@@ -176,8 +237,8 @@ class Mover:
                 direction = kwargs.get("direction")
                 rotation_step = kwargs.get("rotation_step")
 
-                # obtain coordinates after movement
-                movement_result = self._get_new_coordinates(
+                # obtain position and block matrix after movement
+                movement_result = self._get_new_placement(
                     config,
                     gr_obj,
                     type=movement_type,
@@ -186,11 +247,11 @@ class Mover:
                     direction=direction,
                     rotation_step=rotation_step
                 )
-                new_coordinates, new_matrix, d_angle = movement_result
+                new_x, new_y, new_matrix, d_angle = movement_result
 
-                # check if coordinates are legal
+                # check if the new placement is legal
                 good_move = self._is_legal_move(
-                    new_coordinates, gr_obj, state, config
+                    gr_obj, new_x, new_y, new_matrix, state, config
                 )
 
                 # apply movement
@@ -210,6 +271,7 @@ class Mover:
 
                     # add element to grid
                     state.object_grid.add_obj(gr_obj)
+                    applied = True
 
                     # print grid to terminal if verbose
                     if config.verbose is True:
@@ -218,9 +280,8 @@ class Mover:
             else:
                 # only move the gripper
                 state.move_gr(gr_id, dx, dy)
+                applied = movement_type == "move"
 
             # send update to views
-            model._notify_views(
-                "update_grippers",
-                model.get_gripper_dict()
-            )
+            model._notify_changes("update_grippers")
+        return applied
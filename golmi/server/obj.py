@@ -1,6 +1,161 @@
 import numpy as np
 
 
+class Orientation:
+    """
+    One orientation of a block matrix. Orientations are interned: the
+    matrix is stored once as an immutable tuple of tuples and shared by
+    all objects in this orientation. The first time a block matrix is
+    seen, all of its rotated and mirrored variants are registered and
+    linked, so rotating or flipping is a table lookup afterwards.
+    An orientation also caches the cells covered by its blocks.
+    """
+    __slots__ = ("matrix", "cells", "offsets", "_rotations", "_flipped",
+                 "_row_masks", "_variant_index")
+
+    # matrix (tuple of tuples) -> Orientation
+    _registry = dict()
+
+    def __init__(self, matrix):
+        self.matrix = matrix
+        # (x, y) pairs in row-major order
+        self.cells = tuple(
+            (x, y)
+            for y, line in enumerate(matrix)
+            for x, cell in enumerate(line)
+            if cell == 1
+        )
+        offsets = np.array(self.cells, dtype=int).reshape(-1, 2)
+        offsets.flags.writeable = False
+        self.offsets = offsets
+        # Orientations after 0, 1, 2, 3 clockwise quarter turns
+        self._rotations = None
+        # Orientation after mirroring at the horizontal axis
+        self._flipped = None
+        self._row_masks = None
+        # Orientation -> index in variants, built on demand
+        self._variant_index = None
+
+    def __repr__(self):
+        return f"Orientation({self.matrix})"
+
+    @staticmethod
+    def _freeze(block_matrix):
+        return tuple(tuple(int(cell) for cell in line) for line in block_matrix)
+
+    @classmethod
+    def of(cls, block_matrix):
+        """
+        @param block_matrix 0/1 matrix, e.g. a list of lists
+        @return the interned Orientation with the given block matrix
+        """
+        orientation = None
+        if isinstance(block_matrix, tuple):
+            try:
+                orientation = cls._registry.get(block_matrix)
+            except TypeError:  # tuple of lists
+                pass
+        if orientation is None:
+            key = cls._freeze(block_matrix)
+            orientation = cls._registry.get(key)
+            if orientation is None:
+                orientation = cls._register_variants(key)
+        return orientation
+
+    @classmethod
+    def _register_variants(cls, matrix):
+        """
+        Register all rotations and mirrored rotations of matrix
+        and link them to each other.
+        @return Orientation of matrix
+        """
+        base = np.array(matrix)
+        variants = dict()
+        for mirrored in (False, True):
+            m = np.flip(base, axis=0) if mirrored else base
+            for k in range(4):
+                # negative k for np.rot90 rotates clockwise
+                key = cls._freeze(np.rot90(m, -k).tolist())
+                if key not in cls._registry:
+                    cls._registry[key] = cls(key)
+                variants[(k, mirrored)] = cls._registry[key]
+
+        for (k, mirrored), orientation in variants.items():
+            orientation._rotations = tuple(
+                variants[((k + turns) % 4, mirrored)] for turns in range(4)
+            )
+            # flipping reverses the direction of previous rotations
+            orientation._flipped = variants[((-k) % 4, not mirrored)]
+        return variants[(0, False)]
+
+    @classmethod
+    def register_types(cls, type_config):
+        """
+        Build the orientation table for all types of a type_config.
+        @param type_config  dict mapping type names to block matrices
+        """
+        for block_matrix in type_config.values():
+            cls.of(block_matrix)
+
+    def rotated(self, d_angle):
+        """
+        @param d_angle  float or int, angle to apply clockwise.
+                        Can be negative for leftwards rotation.
+        @return Orientation rotated by d_angle, rounded to multiples of 90
+        """
+        turns = round((d_angle % 360) / 90) % 4
+        return self._rotations[turns]
+
+    @property
+    def flipped(self):
+        """
+        @return Orientation mirrored at the horizontal axis
+        """
+        return self._flipped
+
+    @property
+    def variants(self):
+        """
+        @return tuple of 8 orientations: index k is this orientation
+                rotated by k clockwise quarter turns, index 4 + k is this
+                orientation flipped, then rotated by k quarter turns.
+                Symmetric shapes contain duplicates.
+        """
+        return self._rotations + self._flipped._rotations
+
+    def variant_index(self, orientation):
+        """
+        @param orientation  Orientation to look up
+        @return first index of orientation in variants or None if
+                orientation is not a variant of this orientation
+        """
+        if self._variant_index is None:
+            index = dict()
+            for i, variant in enumerate(self.variants):
+                index.setdefault(variant, i)
+            self._variant_index = index
+        return self._variant_index.get(orientation)
+
+    @property
+    def row_masks(self):
+        """
+        @return tuple (min_x, max_x, min_y, max_y, masks), the bounding
+                box of all blocks and a tuple of (dy, mask) pairs, where
+                bit dx of mask is set if there is a block at (dx, dy)
+        """
+        if self._row_masks is None:
+            rows = dict()
+            for x, y in self.cells:
+                rows[y] = rows.get(y, 0) | (1 << x)
+            if self.cells:
+                xs = [x for x, _ in self.cells]
+                self._row_masks = (min(xs), max(xs), min(rows), max(rows),
+                                   tuple(sorted(rows.items())))
+            else:
+                self._row_masks = (0, -1, 0, -1, tuple())
+        return self._row_masks
+
+
 class Obj:
     def __init__(
             self, id_n, obj_type, x, y, block_matrix=[],
@@ -18,10 +173,33 @@ class Obj:
         self.color = color
         self.block_matrix = block_matrix
         self.gripped = gripped
+        # cached to_dict(), the mutators below reset it
+        self._dict = None
 
     def __repr__(self):
         return f"Object({self.type})"
 
+    @property
+    def block_matrix(self):
+        """
+        interned, immutable block matrix (tuple of tuples)
+        """
+        return self._orientation.matrix
+
+    @block_matrix.setter
+    def block_matrix(self, block_matrix):
+        self._orientation = Orientation.of(block_matrix)
+        self._dict = None
+
+    def get_orientation(self, matrix=None):
+        """
+        @param matrix   optional block matrix, default: own block matrix
+        @return shared Orientation of the (given) block matrix
+        """
+        if matrix is None or matrix is self._orientation.matrix:
+            return self._orientation
+        return Orientation.of(matrix)
+
     def get_center_x(self):
         return self.x + (self.width / 2)
 
@@ -47,27 +225,47 @@ class Obj:
         if x and y are given, consider these as the center of
         the block matrix
         """
-        obj_x = self.x
-        obj_y = self.y
-        block_matrix = self.block_matrix
+        obj_x = self.x if x is None else x
+        obj_y = self.y if y is None else y
+        cells = self.get_orientation(matrix if matrix else None).cells
+        return [{"y": obj_y + cell_y, "x": obj_x + cell_x}
+                for cell_x, cell_y in cells]
+
+    def occupied_cells(self, x=None, y=None, matrix=None):
+        """
+        Array version of occupied()
+        @return (n, 2) array with one [x, y] row per occupied field
+        """
+        obj_x = self.x if x is None else x
+        obj_y = self.y if y is None else y
+        offsets = self.get_orientation(matrix if matrix else None).offsets
+        return offsets + (obj_x, obj_y)
 
-        # overwrite parameters if they are given as arguments
-        if x is not None:
-            obj_x = x
-        if x is not None:
-            obj_y = y
+    def move(self, dx, dy):
+        """
+        Move an object instance *in-place* in direction (dx, dy).
+        @param dx   x direction
+        @param dy   y direction
+        """
+        self.set_position(self.x + dx, self.y + dy)
 
-        if matrix:
-            block_matrix = matrix
+    def set_position(self, x, y):
+        """
+        Place an object instance *in-place* at (x, y).
+        @param x    new x coordinate
+        @param y    new y coordinate
+        """
+        self.x = x
+        self.y = y
+        self._dict = None
 
-        occupied = list()
-        for y, line in enumerate(block_matrix):
-            for x, cell in enumerate(line):
-                if cell == 1:
-                    cell_x = obj_x + x
-                    cell_y = obj_y + y
-                    occupied.append({"y": cell_y, "x": cell_x})
-        return occupied
+    def set_gripped(self, gripped):
+        """
+        Change the gripped attribute of an object instance *in-place*.
+        @param gripped  new value of the gripped attribute
+        """
+        self.gripped = gripped
+        self._dict = None
 
     def rotate(self, d_angle):
         """
@@ -78,9 +276,8 @@ class Obj:
         self.rotation = (self.rotation + d_angle) % 360
 
         # update block matrix
-        self.block_matrix = Obj.rotate_block_matrix(
-            self.block_matrix, d_angle
-        )
+        self._orientation = self._orientation.rotated(d_angle)
+        self._dict = None
 
     def flip(self):
         """
@@ -90,7 +287,8 @@ class Obj:
         self.mirrored = not self.mirrored
 
         # update the block matrix
-        self.block_matrix = Obj.flip_block_matrix(self.block_matrix)
+        self._orientation = self._orientation.flipped
+        self._dict = None
 
     @staticmethod
     def rotate_block_matrix(old_matrix, d_angle):
@@ -102,30 +300,8 @@ class Obj:
                             Can be negative for leftwards rotation.
         @return the new block matrix with changed block position
         """
-        # normalize the angle (moves all values in the range [0-360])
-        d_angle = d_angle % 360
-
-        # can only process multiples of 90, so round to the next step here
-        approx_angle = round(d_angle / 90) * 90
-
-        # nothing to do if rotation is 0
-        if approx_angle == 0:
-            return old_matrix
-
-        # otherwise compute rotation with numpy
-        matrix = np.array(old_matrix)
-
-        # choose k parameters for np.rot90
-        # k = how often a COUNTERclockwise rotation will be applied
-        angle_to_k = {
-            90: 3,
-            180: 2,
-            270: 1
-        }
-
-        # apply rotation and return matrix as a python list
-        k = angle_to_k[approx_angle]
-        return np.rot90(matrix, k).tolist()
+        new_matrix = Orientation.of(old_matrix).rotated(d_angle).matrix
+        return [list(line) for line in new_matrix]
 
     @staticmethod
     def flip_block_matrix(old_matrix):
@@ -134,8 +310,8 @@ class Obj:
         @param old_matrix 	block matrix describing the current block positions
         @return a new block matrix with 1s in horizontally mirrored positions
         """
-        matrix = np.array(old_matrix)
-        return np.flip(matrix, axis=0).tolist()
+        new_matrix = Orientation.of(old_matrix).flipped.matrix
+        return [list(line) for line in new_matrix]
 
     @classmethod
     def from_dict(cls, id_n, source_dict, type_config=None):
@@ -201,19 +377,24 @@ class Obj:
     def to_dict(self):
         """
         Constructs a JSON-friendly dictionary representation of this instance.
+        The dictionary is cached until one of the mutators (move,
+        set_position, set_gripped, rotate, flip or setting block_matrix) is
+        called, so it is shared between callers and must not be modified.
         @return dictionary containing all important properties
         """
-        d = {
-            "id_n": self.id_n,
-            "type": self.type,
-            "x": self.x,
-            "y": self.y,
-            "rotation": self.rotation,
-            "color": self.color,
-            "block_matrix": self.block_matrix
-        }
-        if self.mirrored:
-            d["mirrored"] = self.mirrored
-        if self.gripped:
-            d["gripped"] = self.gripped
-        return d
+        if self._dict is None:
+            d = {
+                "id_n": self.id_n,
+                "type": self.type,
+                "x": self.x,
+                "y": self.y,
+                "rotation": self.rotation,
+                "color": self.color,
+                "block_matrix": self.block_matrix
+            }
+            if self.mirrored:
+                d["mirrored"] = self.mirrored
+            if self.gripped:
+                d["gripped"] = self.gripped
+            self._dict = d
+        return self._dict
@@ -0,0 +1,144 @@
+import numpy as np
+
+
+class ObservationTensor:
+    """
+    Multi-channel array representation of a State for learning agents.
+    The array has the shape (channels, rows, columns) on the cells of the
+    state's object grid and counts per cell:
+        "objects":      objects
+        "color:<c>":    objects of color c, one channel per color
+        "type:<t>":     objects of type t, one channel per type
+        "targets":      targets
+        "gripper":      grippers
+    The tensor observes the object and target grid, so it is updated in
+    place whenever an object is added to or removed from a grid. Grippers
+    are redrawn when the state marks them as changed, see State.touch_gripper.
+    """
+    def __init__(self, state, types, colors):
+        """
+        @param state    State instance to observe
+        @param types    list of object types with a channel each
+        @param colors   list of object colors with a channel each
+        """
+        self.state = state
+        self.types = list(types)
+        self.colors = list(colors)
+        self.object_grid = state.object_grid
+        self.target_grid = state.target_grid
+        self.multiplier = self.object_grid.converter.multiplier
+
+        self.channels = ["objects"] + \
+            [f"color:{color}" for color in self.colors] + \
+            [f"type:{obj_type}" for obj_type in self.types] + \
+            ["targets", "gripper"]
+        self._color_channels = {
+            color: 1 + i for i, color in enumerate(self.colors)
+        }
+        self._type_channels = {
+            obj_type: 1 + len(self.colors) + i
+            for i, obj_type in enumerate(self.types)
+        }
+        self.target_channel = len(self.channels) - 2
+        self.gripper_channel = len(self.channels) - 1
+
+        self._array = np.zeros(
+            (len(self.channels), self.object_grid.n_rows,
+             self.object_grid.n_cols),
+            dtype=np.int16
+        )
+        # cells currently marked in the gripper channel
+        self._gripper_cells = list()
+        self._grippers_changed = True
+
+        for obj in state.objs.values():
+            self._plot(self.object_grid, obj, 1)
+        for target in state.targets.values():
+            self._plot(self.target_grid, target, 1)
+        self.object_grid.add_observer(self)
+        self.target_grid.add_observer(self)
+
+    @property
+    def array(self):
+        """
+        The array is updated in place, do not modify it.
+        @return (channels, rows, columns) int16 array
+        """
+        if self._grippers_changed:
+            self._plot_grippers()
+        return self._array
+
+    def observes(self, state):
+        """
+        @return True if this tensor is attached to the current grids of state
+        """
+        return self.state is state and \
+            self.object_grid is state.object_grid and \
+            self.target_grid is state.target_grid
+
+    def detach(self):
+        """
+        Stop observing the grids.
+        """
+        self.object_grid.remove_observer(self)
+        self.target_grid.remove_observer(self)
+
+    def grippers_changed(self):
+        """
+        Redraw the gripper channel before the next read.
+        """
+        self._grippers_changed = True
+
+    # --- grid observer --- #
+
+    def grid_changed(self, grid, xs, ys, obj, value):
+        """
+        Add (value 1) or remove (value -1) obj on the converted cells xs, ys.
+        """
+        on_grid = (0 <= xs) & (xs < self._array.shape[2]) & \
+            (0 <= ys) & (ys < self._array.shape[1])
+        xs, ys = xs[on_grid], ys[on_grid]
+        if grid is self.target_grid:
+            self._array[self.target_channel, ys, xs] += value
+            return
+
+        self._array[0, ys, xs] += value
+        color_channel = self._channel(self._color_channels, obj.color)
+        if color_channel is not None:
+            self._array[color_channel, ys, xs] += value
+        type_channel = self._channel(self._type_channels, obj.type)
+        if type_channel is not None:
+            self._array[type_channel, ys, xs] += value
+
+    def grid_cleared(self, grid):
+        if grid is self.target_grid:
+            self._array[self.target_channel] = 0
+        else:
+            self._array[:self.target_channel] = 0
+
+    # --- helper functions --- #
+
+    @staticmethod
+    def _channel(channels, key):
+        try:
+            return channels.get(key)
+        except TypeError:
+            # unhashable values, e.g. colors given as lists
+            return None
+
+    def _plot(self, grid, obj, value):
+        xs, ys = grid._to_cells(obj.occupied_cells())
+        self.grid_changed(grid, xs.astype(np.intp), ys.astype(np.intp),
+                          obj, value)
+
+    def _plot_grippers(self):
+        for x, y in self._gripper_cells:
+            self._array[self.gripper_channel, y, x] -= 1
+        self._gripper_cells = list()
+        for gr in self.state.grippers.values():
+            x = int(gr.x * self.multiplier)
+            y = int(gr.y * self.multiplier)
+            if 0 <= x < self._array.shape[2] and 0 <= y < self._array.shape[1]:
+                self._array[self.gripper_channel, y, x] += 1
+                self._gripper_cells.append((x, y))
+        self._grippers_changed = False
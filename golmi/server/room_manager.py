@@ -106,6 +106,8 @@ class RoomManager:
         if isinstance(self.room_to_clients.get(room_id), list) and \
                 client_id in self.room_to_clients[room_id]:
             self.room_to_clients[room_id].remove(client_id)
+        if self.has_room(room_id):
+            self.room_to_model[room_id].binary_clients.discard(client_id)
         # leave socket room
         if room_id in rooms(client_id):
             leave_room(room_id, sid=client_id)
@@ -0,0 +1,117 @@
+import time
+import traceback
+
+import eventlet
+
+
+class LoopedAction:
+    """
+    An action repeated by a TickScheduler.
+    """
+    __slots__ = ("fn", "args", "kwargs", "interval", "countdown")
+
+    def __init__(self, fn, args, kwargs, interval=None):
+        """
+        @param fn       function to call repeatedly
+        @param args     positional arguments for fn
+        @param kwargs   keyword arguments for fn
+        @param interval seconds between two calls, None to call fn at
+                        every tick
+        """
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.interval = interval
+        # ticks left until the next call, 0: call at the next tick
+        self.countdown = 0
+
+
+class TickScheduler:
+    """
+    Executes the looped actions of one model at a fixed time step.
+    All actions due in a tick are applied as one batch, so the model
+    sends a single update per tick. A single greenthread runs the ticks
+    and only exists while some action is active.
+    """
+    def __init__(self, model):
+        """
+        @param model    Model instance the actions are applied to. The tick
+                        length is the model's config.action_interval.
+        """
+        self.model = model
+        # (action type, gripper id) -> LoopedAction
+        self.actions = dict()
+        self._thread = None
+
+    @property
+    def tick_interval(self):
+        return self.model.config.action_interval
+
+    def add(self, key, fn, *args, interval=None, **kwargs):
+        """
+        Start repeating fn, replacing any action registered for key.
+        @param key      identifier of the action, e.g. (action type, gripper)
+        @param fn       function to call repeatedly
+        @param interval seconds between two calls, rounded to whole ticks.
+                        Default: every tick
+        @return the new LoopedAction
+        """
+        action = LoopedAction(fn, args, kwargs, interval)
+        self.actions[key] = action
+        if self._thread is None:
+            self._thread = eventlet.spawn(self._run)
+        return action
+
+    def remove(self, key):
+        """
+        Stop repeating the action registered for key, if any.
+        """
+        self.actions.pop(key, None)
+
+    def clear(self):
+        """
+        Stop all actions.
+        """
+        self.actions.clear()
+
+    def tick(self):
+        """
+        Apply all actions that are due, notifying views once.
+        """
+        due = list()
+        for action in self.actions.values():
+            if action.countdown <= 0:
+                due.append(action)
+                if action.interval is None:
+                    action.countdown = 1
+                else:
+                    action.countdown = max(
+                        1, round(action.interval / self.tick_interval)
+                    )
+            action.countdown -= 1
+
+        with self.model.batch_notifications():
+            for action in due:
+                try:
+                    action.fn(*action.args, **action.kwargs)
+                except Exception:
+                    # a failing action must not stop the others
+                    traceback.print_exc()
+                    for key, other in list(self.actions.items()):
+                        if other is action:
+                            self.actions.pop(key)
+
+    def _run(self):
+        next_tick = time.monotonic()
+        try:
+            while self.actions:
+                self.tick()
+                # fixed time step: sleep until the next tick is due
+                next_tick += self.tick_interval
+                now = time.monotonic()
+                if next_tick < now:
+                    # ticks took too long, do not try to catch up
+                    next_tick = now
+                eventlet.sleep(next_tick - now)
+        finally:
+            self._thread = None
@@ -4,7 +4,8 @@ from typing import Dict
 
 from .obj import Obj
 from .gripper import Gripper
-from .grid import Grid, GridConfig
+from .grid import GridConfig, create_grid
+from .observation import ObservationTensor
 
 
 class State:
@@ -16,10 +17,26 @@ class State:
         self.grippers = grippers
         self.targets = targets
         self.grid_config = grid_config
-        self.object_grid = Grid.create_from_config(grid_config)
-        self.target_grid = Grid.create_from_config(grid_config)
+        self.object_grid = create_grid(grid_config)
+        self.target_grid = create_grid(grid_config)
         self.plot_objects_targets()
 
+        # incremented with every patch, see pop_patch()
+        self.revision = 0
+        # ids of entities changed since the last patch
+        self._changed_objs = set()
+        self._changed_grippers = set()
+        self._changed_targets = set()
+
+        # serialized dictionaries, reset by the touch_* methods
+        self._obj_dict = None
+        self._gripper_dict = None
+        self._target_dict = None
+        # (include_grid_config, include_revision) -> state dict
+        self._state_dicts = dict()
+        # created on request, see get_observation()
+        self._observation = None
+
     def plot_objects_targets(self):
         """
         clear grids and replot all objects and targets
@@ -44,15 +61,25 @@ class State:
 
     def get_obj_dict(self):
         """
+        The dictionary is cached until an object changes, do not modify it.
         @return Dictionary mapping object ids to object dictionaries
         """
-        return {obj_id: obj.to_dict() for obj_id, obj in self.objs.items()}
+        if self._obj_dict is None:
+            self._obj_dict = {
+                obj_id: obj.to_dict() for obj_id, obj in self.objs.items()
+            }
+        return self._obj_dict
 
     def get_target_dict(self):
         """
+        The dictionary is cached until a target changes, do not modify it.
         @return Dictionary mapping object ids to object dictionaries
         """
-        return {obj_id: obj.to_dict() for obj_id, obj in self.targets.items()}
+        if self._target_dict is None:
+            self._target_dict = {
+                obj_id: obj.to_dict() for obj_id, obj in self.targets.items()
+            }
+        return self._target_dict
 
     def get_object_ids(self):
         return self.objs.keys()
@@ -68,19 +95,32 @@ class State:
         In contrast to get_obj_dict, each gripper dict has
         the entry "gripped", which itself is None or a
         dictionary mapping the gripped object to an object dictionary.
+        The dictionary is cached until a gripper or object changes, do not
+        modify it.
         @return Dictionary mapping gripper ids to gripper dictionaries.
         """
-        gr_dict = dict()
-        for gr_id, gr in self.grippers.items():
-            gr_dict[gr_id] = gr.to_dict()
-            # if some object is gripped, add all the info on that object too
-            if gr.gripped:
-                gr_dict[gr_id]["gripped"] = {
-                    gr.gripped: self.get_obj_by_id(gr.gripped).to_dict()
-                }
-            else:
-                gr_dict[gr_id]["gripped"] = None
-        return gr_dict
+        if self._gripper_dict is None:
+            self._gripper_dict = {
+                gr_id: self._get_gripper_entry(gr)
+                for gr_id, gr in self.grippers.items()
+            }
+        return self._gripper_dict
+
+    def _get_gripper_entry(self, gr):
+        """
+        @return gripper dictionary including the gripped object, see
+                get_gripper_dict
+        """
+        # copy, the gripper's own dict is cached
+        gr_entry = dict(gr.to_dict())
+        # if some object is gripped, add all the info on that object too
+        if gr.gripped:
+            gr_entry["gripped"] = {
+                gr.gripped: self.get_obj_by_id(gr.gripped).to_dict()
+            }
+        else:
+            gr_entry["gripped"] = None
+        return gr_entry
 
     def get_gripper_ids(self):
         return self.grippers.keys()
@@ -110,6 +150,215 @@ class State:
         else:
             return None
 
+    # --- change tracking --- #
+
+    def touch_obj(self, obj_id):
+        """
+        Mark an object as changed for the next patch and drop
+        the cached dictionaries containing it. Changes that bypass the
+        State methods must call this.
+        @param obj_id   id of an added, modified or removed object
+        """
+        self._changed_objs.add(obj_id)
+        self._obj_dict = None
+        # gripper entries contain the gripped object
+        self._gripper_dict = None
+        self._state_dicts.clear()
+
+    def touch_gripper(self, gr_id):
+        """
+        Mark a gripper as changed for the next patch and drop
+        the cached dictionaries containing it.
+        @param gr_id    id of an added, modified or removed gripper
+        """
+        self._changed_grippers.add(gr_id)
+        self._gripper_dict = None
+        self._state_dicts.clear()
+        if self._observation is not None:
+            self._observation.grippers_changed()
+
+    def touch_target(self, obj_id):
+        """
+        Mark a target as changed for the next patch and drop
+        the cached dictionaries containing it.
+        @param obj_id   id of an added, modified or removed target
+        """
+        self._changed_targets.add(obj_id)
+        self._target_dict = None
+        self._state_dicts.clear()
+
+    def has_changes(self):
+        """
+        @return True if some entity changed since the last patch
+        """
+        return bool(
+            self._changed_objs or self._changed_grippers or
+            self._changed_targets
+        )
+
+    def commit_changes(self):
+        """
+        Advance the revision if something changed since the last commit
+        and forget the changes, without collecting a patch.
+        @return True if the revision was advanced
+        """
+        if not self.has_changes():
+            return False
+        self._changed_objs = set()
+        self._changed_grippers = set()
+        self._changed_targets = set()
+        self.revision += 1
+        self._state_dicts.clear()
+        return True
+
+    def pop_patch(self):
+        """
+        Collect all entities changed since the last call and advance
+        the revision. Removed entities map to None. A gripper is also
+        included if its gripped object changed, as gripper entries
+        contain the gripped object.
+        @return None if nothing changed, else a dict with the keys
+                "base_revision" (the revision the patch applies to),
+                "revision", "objs", "grippers" and "targets", each mapping
+                ids to the same dictionaries as in to_dict
+        """
+        if not self.has_changes():
+            return None
+        base_revision = self.revision
+
+        changed_grippers = self._changed_grippers
+        if self._changed_objs:
+            changed_grippers = changed_grippers | {
+                gr_id for gr_id, gr in self.grippers.items()
+                if gr.gripped in self._changed_objs
+            }
+
+        objs = dict()
+        for obj_id in self._changed_objs:
+            obj = self.objs.get(obj_id)
+            objs[obj_id] = obj.to_dict() if obj is not None else None
+        grippers = dict()
+        for gr_id in changed_grippers:
+            gr = self.grippers.get(gr_id)
+            grippers[gr_id] = self._get_gripper_entry(gr) \
+                if gr is not None else None
+        targets = dict()
+        for obj_id in self._changed_targets:
+            target = self.targets.get(obj_id)
+            targets[obj_id] = target.to_dict() \
+                if target is not None else None
+
+        self.commit_changes()
+        return {
+            "base_revision": base_revision,
+            "revision": self.revision,
+            "objs": objs,
+            "grippers": grippers,
+            "targets": targets
+        }
+
+    # --- rollback --- #
+
+    def checkpoint(self):
+        """
+        Save the mutable attributes of all objects and grippers, e.g. before
+        applying a batch of actions. Adding or removing objects, grippers
+        and targets is not covered.
+        @return checkpoint to pass to rollback()
+        """
+        objs = {
+            obj_id: (obj.x, obj.y, obj.rotation, obj.mirrored,
+                     obj.block_matrix, obj.gripped)
+            for obj_id, obj in self.objs.items()
+        }
+        grippers = {
+            gr_id: (gr.x, gr.y, gr.gripped)
+            for gr_id, gr in self.grippers.items()
+        }
+        changes = (set(self._changed_objs), set(self._changed_grippers),
+                   set(self._changed_targets))
+        return objs, grippers, changes
+
+    def rollback(self, checkpoint):
+        """
+        Undo all changes to objects and grippers since checkpoint was
+        created and replot the grids.
+        @param checkpoint   return value of checkpoint()
+        """
+        objs, grippers, changes = checkpoint
+        for obj_id, attributes in objs.items():
+            obj = self.objs[obj_id]
+            x, y, obj.rotation, obj.mirrored, block_matrix, gripped = \
+                attributes
+            obj.block_matrix = block_matrix
+            obj.set_position(x, y)
+            obj.set_gripped(gripped)
+        for gr_id, (x, y, gripped) in grippers.items():
+            gr = self.grippers[gr_id]
+            gr.set_position(x, y)
+            gr.set_gripped(gripped)
+
+        self._changed_objs, self._changed_grippers, \
+            self._changed_targets = changes
+        self._obj_dict = None
+        self._gripper_dict = None
+        self._state_dicts.clear()
+        if self._observation is not None:
+            self._observation.grippers_changed()
+        self.plot_objects_targets()
+
+    # --- observation --- #
+
+    def get_observation(self, types=None, colors=None):
+        """
+        Multi-channel array representation of the state, see
+        ObservationTensor. The tensor is created on the first call and then
+        updated in place along with the object and target grid, so later
+        calls are cheap.
+        @param types    list of types with a channel each, default: the
+                        types of the config or else of all objects
+        @param colors   list of colors with a channel each, default: the
+                        colors of the config or else of all objects
+        @return ObservationTensor, read the array from its attribute "array"
+        """
+        if types is None:
+            if hasattr(self.grid_config, "get_types"):
+                types = list(self.grid_config.get_types())
+            else:
+                types = sorted({obj.type for obj in self.objs.values()})
+        if colors is None:
+            colors = getattr(self.grid_config, "colors", None)
+            if colors is None:
+                colors = sorted({obj.color for obj in self.objs.values()})
+
+        observation = self._observation
+        if observation is None or not observation.observes(self) or \
+                observation.types != list(types) or \
+                observation.colors != list(colors):
+            if observation is not None:
+                # the grids might have been replaced, e.g. by a new config
+                observation.detach()
+            self._observation = ObservationTensor(self, types, colors)
+        return self._observation
+
+    # --- state changes --- #
+
+    def add_gripper(self, gr):
+        """
+        Add a gripper to the state.
+        @param gr   Gripper instance
+        """
+        self.grippers[gr.id_n] = gr
+        self.touch_gripper(gr.id_n)
+
+    def remove_gripper(self, gr_id):
+        """
+        Remove a gripper from the state.
+        @param gr_id    id of the gripper to remove
+        """
+        self.grippers.pop(gr_id)
+        self.touch_gripper(gr_id)
+
     def move_gr(self, gr_id, dx, dy):
         """
         Change gripper position by moving in direction (dx, dy).
@@ -117,8 +366,8 @@ class State:
         @param dx 	x direction
         @param dy 	y direction
         """
-        self.grippers[gr_id].x += dx
-        self.grippers[gr_id].y += dy
+        self.grippers[gr_id].move(dx, dy)
+        self.touch_gripper(gr_id)
 
     def move_obj(self, obj_id, dx, dy):
         """
@@ -127,8 +376,8 @@ class State:
          @param dx 	x direction
          @param dy 	y direction
         """
-        self.get_obj_by_id(obj_id).x += dx
-        self.get_obj_by_id(obj_id).y += dy
+        self.get_obj_by_id(obj_id).move(dx, dy)
+        self.touch_obj(obj_id)
 
     def rotate_obj(self, obj_id, d_angle):
         """
@@ -139,6 +388,7 @@ class State:
         if d_angle != 0:
             obj = self.get_obj_by_id(obj_id)
             obj.rotate(d_angle)
+            self.touch_obj(obj_id)
 
     def flip_obj(self, obj_id):
         """
@@ -148,6 +398,7 @@ class State:
         # change 'mirrored' attribute
         obj = self.get_obj_by_id(obj_id)
         obj.flip()
+        self.touch_obj(obj_id)
 
     def grip(self, gr_id, obj_id):
         """
@@ -155,16 +406,21 @@ class State:
         @param gr_id 	id of the gripper that grips obj_id
         @param obj_id 	id of object to grip, must be in objects
          """
-        self.objs[obj_id].gripped = True
-        self.grippers[gr_id].gripped = obj_id
+        self.objs[obj_id].set_gripped(True)
+        self.grippers[gr_id].set_gripped(obj_id)
+        self.touch_obj(obj_id)
+        self.touch_gripper(gr_id)
 
     def ungrip(self, gr_id):
         """
         Detach the currently gripped object from the gripper.
         @param gr_id 	id of the gripper that ungrips
         """
-        self.objs[self.grippers[gr_id].gripped].gripped = False
-        self.grippers[gr_id].gripped = None
+        obj_id = self.grippers[gr_id].gripped
+        self.objs[obj_id].set_gripped(False)
+        self.grippers[gr_id].set_gripped(None)
+        self.touch_obj(obj_id)
+        self.touch_gripper(gr_id)
 
     @classmethod
     def from_json(cls, filename, type_config, config):
@@ -266,9 +522,11 @@ class State:
         if object_is_target:
             dictionary = self.targets
             grid = self.target_grid
+            self.touch_target(obj.id_n)
         else:
             dictionary = self.objs
             grid = self.object_grid
+            self.touch_obj(obj.id_n)
 
         del dictionary[obj.id_n]
         grid.remove_obj(obj)
@@ -282,9 +540,11 @@ class State:
         if object_is_target:
             dictionary = self.targets
             grid = self.target_grid
+            self.touch_target(obj.id_n)
         else:
             dictionary = self.objs
             grid = self.object_grid
+            self.touch_obj(obj.id_n)
 
         dictionary[obj.id_n] = obj
         grid.add_obj(obj)
@@ -301,13 +561,24 @@ class State:
 
         return grid.get_single_tile({"x": x, "y": y})
 
-    def to_dict(self, include_grid_config=False):
+    def to_dict(self, include_grid_config=False, include_revision=False):
         """
         Create a JSON-friendly representation of the current state
+        @param include_grid_config  add the key "grid_config"
+        @param include_revision     add the key "revision", the revision
+                                    the state dict corresponds to
+        The dictionary is cached until the state changes, do not modify it.
         @return dict containing current grippers and objects
         """
+        key = (include_grid_config, include_revision)
+        state_dict = self._state_dicts.get(key)
+        if state_dict is not None:
+            return state_dict
+
         state_dict = dict()
         state_dict["state_id"] = self.state_id
+        if include_revision:
+            state_dict["revision"] = self.revision
         if self.global_id:
             state_dict["global_id"] = self.global_id
         state_dict["grippers"] = self.get_gripper_dict()
@@ -315,4 +586,5 @@ class State:
         state_dict["targets"] = self.get_target_dict()
         if include_grid_config:
             state_dict["grid_config"] = self.object_grid.get_grid_config().to_dict()
+        self._state_dicts[key] = state_dict
         return state_dict
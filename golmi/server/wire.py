@@ -0,0 +1,130 @@
+"""
+Compact binary encoding of the state updates sent to views.
+Clients can opt in when joining a room. Objects and grippers are sent as
+arrays with a fixed field order and without their block matrix: clients
+rebuild the matrix from the type_config they received with the config.
+The arrays are packed with MessagePack, an optional dependency.
+"""
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from golmi.server.obj import Orientation
+
+# supported values for the encoding requested at join
+ENCODINGS = ("json", "msgpack")
+
+# field order of encoded objects. "orientation" is the index of the
+# object's block matrix in Orientation.variants of its type's block matrix,
+# or the block matrix itself for objects whose type is not configured.
+OBJ_FIELDS = ("id_n", "type", "x", "y", "rotation", "mirrored", "color",
+              "gripped", "orientation")
+# field order of encoded grippers. "gripped" is None or an encoded object.
+GRIPPER_FIELDS = ("id_n", "x", "y", "color", "gripped")
+
+# events whose payload is encoded, other events are always sent as json
+STATE_EVENTS = ("update_state", "update_objs", "update_grippers",
+                "update_targets", "patch")
+
+
+def binary_available():
+    """
+    @return True if the binary encoding can be used
+    """
+    return msgpack is not None
+
+
+class WireEncoder:
+    """
+    Encodes the payloads of state events for clients that requested
+    the binary format.
+    """
+    def __init__(self, type_config):
+        """
+        @param type_config  dict mapping type names to block matrices
+        """
+        self.type_config = type_config
+
+    def _orientation(self, obj_dict):
+        matrix = obj_dict["block_matrix"]
+        type_matrix = self.type_config.get(obj_dict["type"])
+        if type_matrix is not None:
+            index = Orientation.of(type_matrix).variant_index(
+                Orientation.of(matrix)
+            )
+            if index is not None:
+                return index
+        return matrix
+
+    def compact_obj(self, obj_dict):
+        """
+        @param obj_dict dictionary as returned by Obj.to_dict
+        @return list with the values of OBJ_FIELDS
+        """
+        return [
+            obj_dict["id_n"],
+            obj_dict["type"],
+            obj_dict["x"],
+            obj_dict["y"],
+            obj_dict["rotation"],
+            obj_dict.get("mirrored", False),
+            obj_dict["color"],
+            obj_dict.get("gripped", False),
+            self._orientation(obj_dict)
+        ]
+
+    def compact_gripper(self, gr_dict):
+        """
+        @param gr_dict  gripper dictionary as in State.get_gripper_dict
+        @return list with the values of GRIPPER_FIELDS
+        """
+        gripped = None
+        if gr_dict.get("gripped"):
+            gripped = self.compact_obj(next(iter(gr_dict["gripped"].values())))
+        return [
+            gr_dict["id_n"],
+            gr_dict["x"],
+            gr_dict["y"],
+            gr_dict["color"],
+            gripped
+        ]
+
+    def _compact_map(self, entries, compact_fn):
+        # removed entries in patches are None
+        return {
+            entry_id: compact_fn(entry) if entry is not None else None
+            for entry_id, entry in entries.items()
+        }
+
+    def compact(self, event_name, data):
+        """
+        @param event_name   one of STATE_EVENTS
+        @param data         payload of the event as sent in json format
+        @return payload with all objects and grippers replaced by arrays
+        """
+        if event_name in ("update_objs", "update_targets"):
+            return self._compact_map(data, self.compact_obj)
+        if event_name == "update_grippers":
+            return self._compact_map(data, self.compact_gripper)
+
+        # update_state and patch
+        compact = dict(data)
+        for key in ("objs", "targets"):
+            if key in compact:
+                compact[key] = self._compact_map(data[key], self.compact_obj)
+        if "grippers" in compact:
+            compact["grippers"] = self._compact_map(
+                data["grippers"], self.compact_gripper
+            )
+        return compact
+
+    def encode(self, event_name, data):
+        """
+        @param event_name   name of the event to send
+        @param data         payload of the event as sent in json format
+        @return MessagePack bytes for state events, data for other events
+        """
+        if event_name not in STATE_EVENTS:
+            return data
+        return msgpack.packb(self.compact(event_name, data))
@@ -0,0 +1,59 @@
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from golmi.contrib.pentomino.config import PentoConfig
+from golmi.server.bulk import INDEX_FILE, NPZ_COLUMNS, generate_states
+
+
+class Test(unittest.TestCase):
+    """
+    Tests on bulk state generation
+    """
+    def setUp(self):
+        self.config = PentoConfig(20, 20)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _read_shards(self, out_dir):
+        lines = list()
+        with open(os.path.join(out_dir, INDEX_FILE)) as file:
+            index = json.load(file)
+        for shard in index["shards"]:
+            with open(os.path.join(out_dir, shard["file"])) as file:
+                lines.extend(file.readlines())
+        return index, lines
+
+    def test_jsonl(self):
+        first = os.path.join(self.tmp_dir.name, "first")
+        second = os.path.join(self.tmp_dir.name, "second")
+        generate_states(self.config, 25, first, seed=3, shard_size=10,
+                        n_workers=2)
+        # the number of workers does not change the output
+        generate_states(self.config, 25, second, seed=3, shard_size=10,
+                        n_workers=1)
+
+        index, lines = self._read_shards(first)
+        self.assertEqual([shard["n_states"] for shard in index["shards"]],
+                         [10, 10, 5])
+        self.assertEqual([json.loads(line)["state_id"] for line in lines],
+                         list(range(25)))
+        self.assertEqual(lines, self._read_shards(second)[1])
+
+    def test_npz(self):
+        out_dir = os.path.join(self.tmp_dir.name, "npz")
+        index = generate_states(self.config, 12, out_dir, seed=3,
+                                shard_size=5, n_workers=1, fmt="npz",
+                                n_objs=4)
+        self.assertEqual(index["columns"], list(NPZ_COLUMNS))
+        shard = np.load(os.path.join(out_dir, index["shards"][-1]["file"]))
+        self.assertEqual(shard["objs"].shape, (2, 4, len(NPZ_COLUMNS)))
+        self.assertEqual(list(shard["state_ids"]), [10, 11])
+        self.assertTrue((shard["n_objs"] == 4).all())
+        # orientations are known variants
+        self.assertTrue((shard["objs"][..., -1] >= 0).all())
@@ -0,0 +1,100 @@
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from golmi.contrib.pentomino.dataset import DatasetConfig, build_dataset, get_shard_prefix, sample_pieces
+from golmi.contrib.pentomino.objects import Board
+from golmi.contrib.pentomino.symbolic.types import Colors, PropertyNames, Shapes
+from golmi.server.grid import GridConfig
+
+
+class Test(unittest.TestCase):
+    """
+    Tests on the dataset pipeline
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.config = DatasetConfig(10, GridConfig(20, 20, 1, True), image_size=(32, 32), shard_size=4, seed=3)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _read_shard(self, out_dir, shard_id):
+        prefix = get_shard_prefix(out_dir, shard_id)
+        with open(prefix + ".jsonl") as file:
+            annotations = [json.loads(line) for line in file]
+        return np.load(prefix + ".npy"), annotations
+
+    def test_build_dataset(self):
+        out_dir = os.path.join(self.tmp_dir.name, "dataset")
+        shards = build_dataset(self.config, out_dir, n_workers=2)
+        self.assertEqual(sorted(shards), [0, 1, 2])
+        self.assertEqual(sum(shard["n_samples"] + len(shard["skipped"]) for shard in shards.values()), 10)
+        sample_ids = list()
+        for shard_id, shard in shards.items():
+            n_samples = shard["n_samples"]
+            images, annotations = self._read_shard(out_dir, shard_id)
+            self.assertEqual(images.shape, (n_samples, 32, 32, 3))
+            self.assertEqual(len(annotations), n_samples)
+            for image, annotation in zip(images, annotations):
+                sample_ids.append(annotation["sample_id"])
+                self.assertTrue(annotation["expression"])
+                board = Board.from_state_dict(annotation["state"], self.config.grid_config)
+                np.testing.assert_array_equal(image, board.to_image_array((32, 32)))
+        skipped = [sample_id for shard in shards.values() for sample_id in shard["skipped"]]
+        self.assertEqual(sorted(sample_ids + skipped), list(range(10)))
+
+    def test_skip_infeasible(self):
+        # a single piece per color and shape: there are no distractors of the same color and shape
+        config = DatasetConfig(6, image_size=(32, 32), shard_size=6, colors=[Colors.RED], shapes=[Shapes.T],
+                               utterance_types=[[PropertyNames.REL_POSITION], [PropertyNames.COLOR]],
+                               n_distractors=(1, 2))
+        shards = build_dataset(config, os.path.join(self.tmp_dir.name, "dataset"), n_workers=1)
+        _, annotations = self._read_shard(os.path.join(self.tmp_dir.name, "dataset"), 0)
+        # only position utterances are possible, the color ones are left out
+        self.assertEqual([annotation["utterance_type"] for annotation in annotations],
+                         [["rel_position"]] * shards[0]["n_samples"])
+        self.assertEqual(shards[0]["n_samples"] + len(shards[0]["skipped"]), 6)
+
+    def test_sample_pieces(self):
+        # few pieces: the distractors of some sizes are infeasible
+        config = DatasetConfig(30, colors=[Colors.RED, Colors.BLUE], shapes=[Shapes.T, Shapes.X],
+                               utterance_types=[[PropertyNames.COLOR, PropertyNames.SHAPE]], n_distractors=(1, 6))
+        skipped = list()
+        samples = list(sample_pieces(config, range(30), skipped=skipped))
+        self.assertTrue(samples)
+        self.assertTrue(skipped)
+        self.assertEqual(sorted([sample["sample_id"] for sample in samples] + skipped), list(range(30)))
+        for sample in samples:
+            # at least one, but never all distractors share the color of the target
+            same_color = [distractor.color == sample["target"].color for distractor in sample["distractors"]]
+            self.assertTrue(any(same_color) and not all(same_color))
+
+    def test_resume(self):
+        first = os.path.join(self.tmp_dir.name, "first")
+        second = os.path.join(self.tmp_dir.name, "second")
+        build_dataset(self.config, first, n_workers=1)
+        # an interrupted run: the checkpoint lacks the last shard
+        build_dataset(DatasetConfig.from_dict(self.config.to_dict()), second, n_workers=2)
+        with open(os.path.join(second, "checkpoint.json")) as file:
+            checkpoint = json.load(file)
+        del checkpoint["shards"]["2"]
+        with open(os.path.join(second, "checkpoint.json"), "w") as file:
+            json.dump(checkpoint, file)
+        os.remove(get_shard_prefix(second, 2) + ".npy")
+        self.assertEqual(build_dataset(self.config, second, n_workers=1), build_dataset(self.config, first))
+        # the samples do not depend on the workers
+        for shard_id in range(3):
+            first_images, first_annotations = self._read_shard(first, shard_id)
+            second_images, second_annotations = self._read_shard(second, shard_id)
+            np.testing.assert_array_equal(first_images, second_images)
+            self.assertEqual(first_annotations, second_annotations)
+        with self.assertRaises(ValueError):
+            build_dataset(DatasetConfig(11, shard_size=4), second)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+
+import numpy as np
+
+from golmi.contrib.pentomino.config import PentoConfig
+from golmi.env.env import ACTION_NAMES, GolmiEnv
+
+
+class Test(unittest.TestCase):
+    """
+    Tests on the headless environment
+    """
+    def setUp(self):
+        self.env = GolmiEnv(PentoConfig(20, 20), n_objs=2, max_steps=10)
+
+    def test_reset_seed(self):
+        first = self.env.reset(seed=3)
+        second = self.env.reset(seed=3)
+        for key in first:
+            np.testing.assert_array_equal(first[key], second[key])
+        self.assertEqual(first["objs"].shape, (2, 7))
+        self.assertEqual(first["targets"].shape, (2, 6))
+
+    def test_missing_target(self):
+        observation = self.env.reset(seed=3)
+        self.env._targets[0] = None
+        targets = self.env.observe()["targets"]
+        # row i stays the target of objs[i]
+        self.assertEqual(targets.shape, (2, 6))
+        np.testing.assert_array_equal(targets[0], [-1, -1, 0, 0, 0, 0])
+        np.testing.assert_array_equal(targets[1], observation["targets"][1])
+
+    def test_step(self):
+        observation = self.env.reset(seed=3)
+        x, y, _ = observation["gripper"]
+
+        observation, reward, done, info = self.env.step(
+            ACTION_NAMES.index("right")
+        )
+        self.assertTrue(info["applied"])
+        self.assertEqual(observation["gripper"][0], x + 1)
+        self.assertEqual(reward, 0)
+        self.assertFalse(done)
+
+        # episodes end after max_steps
+        for _ in range(9):
+            _, _, done, info = self.env.step(ACTION_NAMES.index("flip"))
+        self.assertTrue(done)
+        self.assertTrue(info["truncated"])
+
+    def test_reward(self):
+        self.env.reset(seed=3)
+        state = self.env.model.state
+        obj = state.objs["0"]
+        target = state.targets["0"]
+
+        # put the object on its target
+        state.remove_object(obj)
+        obj.x, obj.y = target.x, target.y
+        obj.block_matrix = target.block_matrix
+        state.add_object(obj)
+
+        _, reward, _, info = self.env.step(ACTION_NAMES.index("flip"))
+        self.assertEqual(reward, 1)
+        self.assertEqual(info["on_target"], 1)
+
+    def test_action_mask(self):
+        self.env.reset(seed=3)
+        for action in range(self.env.n_actions):
+            mask = self.env.action_mask()
+            _, _, _, info = self.env.step(action)
+            self.assertEqual(mask[action], info["applied"])
@@ -0,0 +1,78 @@
+import random
+import unittest
+
+import numpy as np
+
+from golmi.contrib.pentomino.config import load_colors_as_list, \
+    load_shapes_as_dict
+from golmi.server.config import Config
+from golmi.server.generator import Generator, free_anchors
+from golmi.server.obj import Obj, Orientation
+
+
+class Test(unittest.TestCase):
+    """
+    Tests on Generator
+    """
+    def _config(self, size):
+        return Config(
+            type_config=load_shapes_as_dict(), colors=load_colors_as_list(),
+            width=size, height=size, move_step=1, prevent_overlap=True,
+            actions=["move", "rotate", "flip", "grip"]
+        )
+
+    def test_free_anchors(self):
+        rng = np.random.default_rng(0)
+        occupied = rng.random((12, 15)) < 0.2
+        orientation = Orientation.of(load_shapes_as_dict()["F"]).rotated(90)
+        anchors = free_anchors(occupied, orientation, (-5, 20), (2, 20))
+
+        # same anchors as checking every position on its own
+        expected = list()
+        for y in range(2, 21):
+            for x in range(-5, 21):
+                cells = orientation.offsets + (x, y)
+                if (cells >= 0).all() and (cells[:, 0] < 15).all() and \
+                        (cells[:, 1] < 12).all() and \
+                        not occupied[cells[:, 1], cells[:, 0]].any():
+                    expected.append([x, y])
+        self.assertEqual(anchors.tolist(), expected)
+
+    def test_dense_board(self):
+        config = self._config(10)
+        generator = Generator(config, rng=random.Random(1))
+        # far more objects than fit on the board
+        state = generator.generate_random_state(50, 1, target_area="all")
+        self.assertGreater(len(state.objs), 0)
+        self.assertLess(len(state.objs), 50)
+        self.assertEqual(len(state.objs), len(state.targets))
+        for pieces in (state.objs, state.targets):
+            occupied = np.zeros((10, 10), dtype=int)
+            for obj in pieces.values():
+                cells = obj.occupied_cells().astype(int)
+                occupied[cells[:, 1], cells[:, 0]] += 1
+            self.assertLessEqual(occupied.max(), 1)
+
+    def test_no_space(self):
+        config = self._config(2)
+        generator = Generator(config, rng=random.Random(1))
+        # no pentomino fits on a 2x2 board
+        state = generator.generate_random_state(3, 1, target_area="all")
+        self.assertEqual(len(state.objs), 0)
+
+    def test_no_target_space(self):
+        config = self._config(10)
+        generator = Generator(config, rng=random.Random(1))
+        occupied = np.zeros((10, 10), dtype=bool)
+        occupied[:, ::2] = True
+        target = generator._generate_target(
+            occupied, "0", "F", 3, 3, config.type_config["F"], "all",
+            "red"
+        )
+        self.assertIsNone(target)
+        self.assertIsInstance(
+            generator._generate_target(
+                np.zeros((10, 10), dtype=bool), "0", "F", 3, 3,
+                config.type_config["F"], "all", "red"
+            ), Obj
+        )
@@ -1,7 +1,10 @@
+import itertools
 import unittest
 
+import numpy as np
+
 from golmi.server.obj import Obj
-from golmi.server.grid import Grid
+from golmi.server.grid import BitboardGrid, Grid, GridConfig, NumpyGrid, create_grid
 
 
 class Test(unittest.TestCase):
@@ -143,3 +146,131 @@ class Test(unittest.TestCase):
             results.append(g.gripper_on_grid(gripper))
 
         self.assertEqual(results, golden)
+
+
+class NumpyGridTest(unittest.TestCase):
+    """
+    Tests on NumpyGrid
+    """
+    matrix = [
+        [0, 0, 0, 0, 0],
+        [0, 1, 0, 0, 0],
+        [0, 1, 0, 0, 0],
+        [0, 1, 0, 0, 0],
+        [0, 1, 1, 1, 1]
+    ]
+
+    def test_create_grid(self):
+        config = GridConfig(5, 5, 0.5, True, grid_backend="numpy")
+        self.assertIsInstance(create_grid(config), NumpyGrid)
+        config = GridConfig(5, 5, 0.5, True, grid_backend="tiles")
+        self.assertNotIsInstance(create_grid(config), NumpyGrid)
+
+    def test_prevent_overlap(self):
+        g = NumpyGrid(width=5, height=5, step=0.5, prevent_overlap=True)
+        o1 = Obj(1, "L", 0, 0, block_matrix=self.matrix)
+        o2 = Obj(2, "L", 0.5, 0, block_matrix=self.matrix)
+        g.add_obj(o1)
+
+        # the object itself does not block its new position
+        self.assertTrue(g.is_legal_position(o1.occupied(0, -0.5), o1))
+        # but other objects do
+        self.assertFalse(g.is_legal_position(o2.occupied(), o2))
+        # cells must be on the grid
+        self.assertFalse(g.is_legal_position(o1.occupied(0.5, 0), o1))
+
+    def test_add_remove_object(self):
+        g = NumpyGrid(width=5, height=5, step=0.5, prevent_overlap=False)
+        o1 = Obj(1, "L", 0, 0, block_matrix=self.matrix)
+        o2 = Obj(2, "L", 0, 0, block_matrix=self.matrix)
+        g.add_obj(o1)
+        g.add_obj(o2)
+
+        # objects are stacked in the order they were added
+        self.assertEqual(g.get_single_tile({"x": 1, "y": 4}).objects, [o1, o2])
+        self.assertEqual(g.counts.sum(), 2 * 7 * 4)
+
+        g.remove_obj(o1)
+        self.assertEqual(g.get_single_tile({"x": 1.5, "y": 4.5}).objects, [o2])
+
+        g.remove_obj(o2)
+        self.assertEqual(g.counts.sum(), 0)
+        self.assertFalse(g.layers.any())
+
+    def test_same_as_tiles(self):
+        tiles = Grid(width=5, height=5, step=1, prevent_overlap=False)
+        arrays = NumpyGrid(width=5, height=5, step=1, prevent_overlap=False)
+        o1 = Obj("1", "L", 0, 0, block_matrix=self.matrix)
+        for g in (tiles, arrays):
+            g.add_obj(o1)
+        self.assertEqual(repr(tiles), repr(arrays))
+
+    def test_legal_placement(self):
+        for step in (1, 0.5):
+            tiles = Grid(width=6, height=6, step=step, prevent_overlap=True)
+            arrays = NumpyGrid(width=6, height=6, step=step, prevent_overlap=True)
+            o1 = Obj(1, "L", 0, 0, block_matrix=self.matrix)
+            o2 = Obj(2, "L", 3, 2, block_matrix=[[1]])
+            for g in (tiles, arrays):
+                g.add_obj(o1)
+                g.add_obj(o2)
+
+            # all positions and orientations around the blocking object
+            for x, y in itertools.product(np.arange(-2, 4, step), repeat=2):
+                for orientation in o1.get_orientation().variants:
+                    self.assertEqual(
+                        arrays.is_legal_placement(o1, x, y, orientation.matrix),
+                        tiles.is_legal_placement(o1, x, y, orientation.matrix),
+                        f"step {step}, x {x}, y {y}, {orientation}"
+                    )
+
+
+class BitboardGridTest(unittest.TestCase):
+    """
+    Tests on BitboardGrid
+    """
+    matrix = NumpyGridTest.matrix
+
+    def test_create_grid(self):
+        config = GridConfig(5, 5, 1, True, grid_backend="bitboard")
+        self.assertIsInstance(create_grid(config), BitboardGrid)
+        # bitboards need integer steps
+        config = GridConfig(5, 5, 0.5, True, grid_backend="bitboard")
+        self.assertNotIsInstance(create_grid(config), BitboardGrid)
+
+    def test_rows(self):
+        g = BitboardGrid(width=6, height=6, step=1, prevent_overlap=True)
+        o1 = Obj(1, "L", 1, 0, block_matrix=self.matrix)
+        g.add_obj(o1)
+        self.assertEqual(g.rows, [0, 4, 4, 4, 60, 0])
+
+        g.remove_obj(o1)
+        self.assertEqual(g.rows, [0] * 6)
+
+    def test_legal_placement(self):
+        g = BitboardGrid(width=6, height=6, step=1, prevent_overlap=True)
+        o1 = Obj(1, "L", 0, 0, block_matrix=self.matrix)
+        o2 = Obj(2, "L", 0, 1, block_matrix=[[1]])
+        g.add_obj(o1)
+        g.add_obj(o2)
+
+        # the empty first column may leave the grid
+        self.assertTrue(g.is_legal_placement(o1, -1, 1, self.matrix))
+        # moving onto another object or off the grid is not allowed
+        self.assertFalse(g.is_legal_placement(o1, -1, 0, self.matrix))
+        self.assertFalse(g.is_legal_placement(o1, 2, 0, self.matrix))
+        # rotation and flip only need new masks
+        rotated = Obj.rotate_block_matrix(self.matrix, 90)
+        flipped = Obj.flip_block_matrix(self.matrix)
+        self.assertTrue(g.is_legal_placement(o1, 1, 0, rotated))
+        self.assertFalse(g.is_legal_placement(o1, 0, 0, rotated))
+        self.assertFalse(g.is_legal_placement(o1, 0, -1, flipped))
+
+        # same answers as the coordinate based check
+        for x, y, matrix in [(-1, 1, self.matrix), (-1, 0, self.matrix),
+                             (1, 0, rotated), (0, 0, rotated),
+                             (0, -1, flipped)]:
+            self.assertEqual(
+                g.is_legal_placement(o1, x, y, matrix),
+                g.is_legal_position(o1.occupied(x, y, matrix), o1)
+            )
@@ -1,8 +1,11 @@
 from pathlib import Path
 import unittest
 
+import eventlet
+
 from golmi.server.model import Model
 from golmi.server.config import Config
+from golmi.server.obj import Obj
 from app.app import app, DEFAULT_CONFIG_FILE
 
 
@@ -15,6 +18,17 @@ class FakeSocket:
         pass
 
 
+class RecordingSocket:
+    """
+    collects emitted events as (event name, data) tuples
+    """
+    def __init__(self):
+        self.emitted = list()
+
+    def emit(self, event_name, data, **kwargs):
+        self.emitted.append((event_name, data))
+
+
 class Test(unittest.TestCase):
     """
     tests on model
@@ -68,3 +82,252 @@ class Test(unittest.TestCase):
         self.assertTrue(
             model.running_loops["grip"][100] is None
         )
+
+    def test_delta_updates(self):
+        socket = RecordingSocket()
+        config = Config.from_json(self.config)
+        config.delta_updates = True
+        model = Model(config, socket, "TestRoom")
+
+        model.add_gr("0", 5, 5)
+        model.add_gr("1", 10, 10)
+        event_name, patch = socket.emitted[-1]
+        self.assertEqual(event_name, "patch")
+        self.assertEqual(patch["revision"], 2)
+        # only the new gripper is sent
+        self.assertEqual(list(patch["grippers"].keys()), ["1"])
+
+        model.mover.apply_movement(model, "move", "0", x_steps=1, y_steps=0)
+        _, patch = socket.emitted[-1]
+        self.assertEqual(patch["revision"], 3)
+        self.assertEqual(list(patch["grippers"].keys()), ["0"])
+        self.assertEqual(patch["grippers"]["0"]["x"], 5 + config.move_step)
+        self.assertEqual(patch["objs"], dict())
+
+        # removed entities map to None
+        model.remove_gr("1")
+        _, patch = socket.emitted[-1]
+        self.assertEqual(patch["grippers"], {"1": None})
+
+        # a snapshot carries the current revision
+        self.assertEqual(model.get_state_dict()["revision"], 4)
+
+    def test_full_updates(self):
+        socket = RecordingSocket()
+        model = Model(Config.from_json(self.config), socket, "TestRoom")
+
+        model.add_gr("0", 5, 5)
+        model.add_gr("1", 10, 10)
+        event_name, grippers = socket.emitted[-1]
+        self.assertEqual(event_name, "update_grippers")
+        self.assertEqual(set(grippers.keys()), {"0", "1"})
+
+    def test_cached_state_dict(self):
+        model = self.get_model()
+        model.add_gr("0", 5, 5)
+        state_dict = model.state.to_dict()
+        grippers = model.get_gripper_dict()
+        self.assertIs(state_dict, model.state.to_dict())
+
+        model.mover.apply_movement(model, "move", "0", x_steps=1, y_steps=0)
+        self.assertIsNot(grippers, model.get_gripper_dict())
+        self.assertEqual(
+            model.state.to_dict()["grippers"]["0"]["x"],
+            5 + model.config.move_step
+        )
+        # the gripper's own cached dict is not modified
+        self.assertNotIn("gripped", model.get_gripper_by_id("0").to_dict())
+
+    def test_scheduler_tick(self):
+        socket = RecordingSocket()
+        model = Model(Config.from_json(self.config), socket, "TestRoom")
+        model.add_gr("0", 5, 5)
+        model.add_gr("1", 10, 10)
+        socket.emitted.clear()
+
+        model.start_moving("0", 1, 0)
+        model.start_moving("1", 0, 1)
+        model.start_flipping("0")
+        # flips are slower than moves
+        flip_ticks = round(0.5 / model.config.action_interval)
+
+        for _ in range(flip_ticks):
+            model.scheduler.tick()
+
+        # one coalesced update per tick
+        self.assertEqual(len(socket.emitted), flip_ticks)
+        self.assertEqual(
+            model.get_gripper_coords("0"),
+            [5 + flip_ticks * model.config.move_step, 5]
+        )
+        self.assertEqual(
+            model.get_gripper_coords("1"),
+            [10, 10 + flip_ticks * model.config.move_step]
+        )
+
+        model.stop_moving("0")
+        model.stop_moving("1")
+        self.assertEqual(
+            list(model.scheduler.actions.keys()), [("flip", "0")]
+        )
+        model.reset_loops()
+        self.assertEqual(len(model.scheduler.actions), 0)
+
+    def test_scheduler_thread(self):
+        model = self.get_model()
+        model.config.action_interval = 0.01
+        model.add_gr("0", 5, 5)
+
+        model.start_moving("0", 1, 0)
+        eventlet.sleep(0.055)
+        model.stop_moving("0")
+        x, _ = model.get_gripper_coords("0")
+        self.assertGreater(x, 5)
+
+        # the scheduler thread ends without running actions
+        eventlet.sleep(0.02)
+        self.assertIsNone(model.scheduler._thread)
+
+    def test_frame_rate(self):
+        socket = RecordingSocket()
+        config = Config.from_json(self.config)
+        config.frame_rate = 20
+        model = Model(config, socket, "TestRoom")
+        model.add_gr("0", 5, 5)
+        for _ in range(3):
+            model.mover.apply_movement(
+                model, "move", "0", x_steps=1, y_steps=0
+            )
+        # nothing is sent before the end of the frame
+        self.assertEqual(socket.emitted, [])
+
+        eventlet.sleep(0.01)
+        # one merged message with the latest data
+        self.assertEqual(len(socket.emitted), 1)
+        event_name, grippers = socket.emitted[0]
+        self.assertEqual(event_name, "update_grippers")
+        self.assertEqual(grippers["0"]["x"], 5 + 3 * config.move_step)
+
+    def test_frame_rate_patches(self):
+        socket = RecordingSocket()
+        config = Config.from_json(self.config)
+        config.frame_rate = 20
+        config.delta_updates = True
+        model = Model(config, socket, "TestRoom")
+        model.add_gr("0", 5, 5)
+        model.add_gr("1", 10, 10)
+        model.mover.apply_movement(model, "move", "0", x_steps=1, y_steps=0)
+        eventlet.sleep(0.01)
+
+        # patches of a frame are merged
+        self.assertEqual(len(socket.emitted), 1)
+        event_name, patch = socket.emitted[0]
+        self.assertEqual(event_name, "patch")
+        self.assertEqual(patch["base_revision"], 0)
+        self.assertEqual(patch["revision"], 3)
+        self.assertEqual(set(patch["grippers"].keys()), {"0", "1"})
+        self.assertEqual(patch["grippers"]["0"]["x"], 5 + config.move_step)
+
+        # the next frame starts 1 / frame_rate seconds later
+        model.remove_gr("1")
+        eventlet.sleep(0.01)
+        self.assertEqual(len(socket.emitted), 1)
+        eventlet.sleep(0.05)
+        self.assertEqual(len(socket.emitted), 2)
+        self.assertEqual(socket.emitted[1][1]["base_revision"], 3)
+
+    def test_apply_actions(self):
+        socket = RecordingSocket()
+        model = Model(Config.from_json(self.config), socket, "TestRoom")
+        model.add_gr("0", 5, 5)
+        model.add_gr("1", 10, 10)
+        socket.emitted.clear()
+
+        step = model.config.move_step
+        applied = model.apply_actions([
+            {"type": "move", "id": "0", "dx": 1, "dy": 0},
+            {"type": "move", "id": "1", "dx": 0, "dy": -2},
+            {"type": "move", "id": "0", "dx": 1, "dy": 0}
+        ])
+        self.assertTrue(applied)
+        self.assertEqual(model.get_gripper_coords("0"), [5 + 2 * step, 5])
+        self.assertEqual(model.get_gripper_coords("1"), [10, 10 - 2 * step])
+        # a single update for the whole batch
+        self.assertEqual(len(socket.emitted), 1)
+
+    def test_apply_actions_rollback(self):
+        model = self.get_model()
+        model.add_gr("0", 5, 5)
+
+        # the last move leaves the board, all moves are undone
+        applied = model.apply_actions([
+            {"type": "move", "id": "0", "dx": 1, "dy": 0},
+            {"type": "move", "id": "0", "dx": -1000, "dy": 0}
+        ])
+        self.assertFalse(applied)
+        self.assertEqual(model.get_gripper_coords("0"), [5, 5])
+
+        # without atomic, valid actions are kept
+        applied = model.apply_actions([
+            {"type": "move", "id": "0", "dx": 1, "dy": 0},
+            {"type": "unknown", "id": "0"}
+        ], atomic=False)
+        self.assertFalse(applied)
+        self.assertEqual(
+            model.get_gripper_coords("0"), [5 + model.config.move_step, 5]
+        )
+
+    def test_apply_actions_rollback_object(self):
+        model = self.get_model()
+        block_matrix = model.get_type_config()["F"]
+        obj = Obj("0", "F", 4, 4, block_matrix)
+        model.state.add_object(obj)
+        x, y = obj.occupied()[0]["x"], obj.occupied()[0]["y"]
+        model.add_gr("0", x, y)
+
+        applied = model.apply_actions([
+            {"type": "grip", "id": "0"},
+            {"type": "rotate", "id": "0", "direction": 1},
+            {"type": "flip", "id": "0"},
+            {"type": "move", "id": "0", "dx": -1000, "dy": 0}
+        ])
+        self.assertFalse(applied)
+        self.assertIsNone(model.get_gripped_obj("0"))
+        self.assertFalse(obj.gripped)
+        self.assertEqual(obj.rotation, 0)
+        self.assertEqual(
+            [list(row) for row in obj.block_matrix], block_matrix
+        )
+        # the grid is replotted at the original position
+        self.assertEqual(
+            model.state.get_tile(x, y).objects, [obj]
+        )
+
+    def test_action_mask(self):
+        model = self.get_model()
+        model.add_gr("0", 0, 0)
+        mask = model.get_action_mask("0")
+        # up and left leave the board, nothing to rotate, flip or grip
+        self.assertEqual(list(mask),
+                         [False, True, False, True, False, False, False,
+                          False])
+        # cached until the state changes
+        self.assertIs(model.get_action_mask("0"), mask)
+        self.assertIs(model.get_action_mask()["0"], mask)
+
+        block_matrix = model.get_type_config()["F"]
+        obj = Obj("0", "F", 4, 4, block_matrix)
+        model.state.add_object(obj)
+        model.state.commit_changes()
+        x, y = obj.occupied()[0]["x"], obj.occupied()[0]["y"]
+        model.add_gr("1", x, y)
+        self.assertTrue(model.get_action_mask("1")[-1])
+        model.grip("1")
+        mask = model.get_action_mask("1")
+        self.assertTrue(mask.all())
+
+        # the mask predicts whether actions are applied
+        self.assertEqual(
+            mask[0], model.mover.apply_movement(model, "move", "1",
+                                                x_steps=0, y_steps=-1)
+        )
@@ -1,6 +1,8 @@
 import unittest
 
-from golmi.server.obj import Obj
+import numpy as np
+
+from golmi.server.obj import Obj, Orientation
 
 
 class Test(unittest.TestCase):
@@ -93,3 +95,82 @@ class Test(unittest.TestCase):
 
         occupied = o.occupied()
         self.assertEqual(target, occupied)
+
+    def test_occupied_cells(self):
+        matrix = [
+            [0, 1, 0],
+            [0, 1, 1],
+            [0, 0, 0]
+        ]
+        o1 = Obj(1, "L", 2, 3, block_matrix=matrix)
+        o2 = Obj(2, "L", 0, 0, block_matrix=[list(row) for row in matrix])
+
+        # objects with the same block matrix share their orientation
+        self.assertIs(o1.get_orientation(), o2.get_orientation())
+
+        cells = o1.occupied_cells()
+        self.assertEqual(cells.tolist(), [[3, 3], [3, 4], [4, 4]])
+        self.assertEqual(
+            [{"x": x, "y": y} for x, y in cells.tolist()], o1.occupied()
+        )
+        self.assertEqual(
+            o1.occupied_cells(0.5, 1).tolist(), [[1.5, 1], [1.5, 2], [2.5, 2]]
+        )
+
+    def test_orientation_table(self):
+        matrix = [
+            [0, 1, 1],
+            [1, 1, 0],
+            [0, 1, 0]
+        ]
+        orientation = Orientation.of(matrix)
+        # lists and tuples map to the same interned orientation
+        self.assertIs(orientation, Orientation.of(orientation.matrix))
+        self.assertIs(orientation, Orientation.of([list(r) for r in matrix]))
+
+        # rotations and flips match numpy and are shared
+        rotated = orientation.rotated(90)
+        self.assertEqual(
+            [list(r) for r in rotated.matrix], np.rot90(matrix, 3).tolist()
+        )
+        self.assertIs(rotated, orientation.rotated(-270))
+        self.assertIs(orientation, rotated.rotated(-90))
+        self.assertEqual(
+            [list(r) for r in orientation.flipped.matrix],
+            np.flip(matrix, axis=0).tolist()
+        )
+        self.assertIs(orientation, orientation.flipped.flipped)
+        self.assertIs(
+            orientation.rotated(90).flipped, orientation.flipped.rotated(-90)
+        )
+
+        # an asymmetric shape has 8 distinct orientations
+        variants = {
+            orientation.rotated(angle) for angle in (0, 90, 180, 270)
+        }
+        variants |= {variant.flipped for variant in variants}
+        self.assertEqual(len(variants), 8)
+
+        # objects rotate and flip by table lookup
+        o = Obj(1, "F", 0, 0, block_matrix=matrix)
+        o.rotate(90)
+        o.flip()
+        self.assertIs(o.get_orientation(), orientation.rotated(90).flipped)
+        self.assertIs(o.block_matrix, orientation.rotated(90).flipped.matrix)
+
+    def test_cached_dict(self):
+        o = Obj(1, "F", 0, 0, block_matrix=[[1, 1], [0, 1]])
+        d = o.to_dict()
+        # unchanged objects return the cached dict
+        self.assertIs(d, o.to_dict())
+
+        # mutations invalidate the cache
+        o.move(1, 0)
+        self.assertEqual(o.to_dict()["x"], 1)
+        o.rotate(90)
+        self.assertEqual(o.to_dict()["rotation"], 90)
+        self.assertEqual(o.to_dict()["block_matrix"], o.block_matrix)
+        o.flip()
+        self.assertTrue(o.to_dict()["mirrored"])
+        o.set_gripped(True)
+        self.assertTrue(o.to_dict()["gripped"])
@@ -0,0 +1,76 @@
+import random
+import unittest
+
+import numpy as np
+
+from golmi.contrib.pentomino.config import load_colors_as_list, \
+    load_shapes_as_dict
+from golmi.env.env import ACTIONS, GolmiEnv
+from golmi.server.config import Config
+from golmi.server.observation import ObservationTensor
+
+
+class Test(unittest.TestCase):
+    """
+    Tests on the observation tensor of a State
+    """
+    def _config(self, **kwargs):
+        parameters = dict(
+            type_config=load_shapes_as_dict(), colors=load_colors_as_list(),
+            width=20, height=20, move_step=1, prevent_overlap=True,
+            actions=["move", "rotate", "flip", "grip"]
+        )
+        parameters.update(kwargs)
+        return Config(**parameters)
+
+    def test_channels(self):
+        env = GolmiEnv(self._config(), n_objs=2)
+        env.reset(seed=2)
+        state = env.model.state
+        observation = state.get_observation()
+        self.assertIs(observation, state.get_observation())
+
+        obj = state.objs["0"]
+        array = observation.array
+        self.assertEqual(array.shape, (len(observation.channels), 20, 20))
+        for x, y in obj.occupied_cells().astype(int):
+            self.assertEqual(array[0, y, x], 1)
+            color = observation.channels.index(f"color:{obj.color}")
+            self.assertEqual(array[color, y, x], 1)
+            obj_type = observation.channels.index(f"type:{obj.type}")
+            self.assertEqual(array[obj_type, y, x], 1)
+        self.assertEqual(array[observation.target_channel].sum(),
+                         sum(len(t.occupied_cells())
+                             for t in state.targets.values()))
+        gripper = state.grippers[env.gr_id]
+        self.assertEqual(
+            array[observation.gripper_channel, int(gripper.y),
+                  int(gripper.x)], 1
+        )
+
+    def test_incremental(self):
+        # the tensor updated in place equals a newly built tensor
+        for kwargs in [dict(), dict(move_step=0.5), dict(grid_backend="tiles"),
+                       dict(grid_backend="bitboard")]:
+            env = GolmiEnv(self._config(**kwargs), n_objs=3)
+            env.reset(seed=4)
+            observation = env.model.state.get_observation()
+            rng = random.Random(0)
+            for _ in range(300):
+                env.step(rng.randrange(len(ACTIONS)))
+                state = env.model.state
+                fresh = ObservationTensor(state, observation.types,
+                                          observation.colors)
+                fresh.detach()
+                np.testing.assert_array_equal(observation.array,
+                                              fresh.array)
+
+    def test_new_grids(self):
+        env = GolmiEnv(self._config(), n_objs=2)
+        env.reset(seed=2)
+        observation = env.model.state.get_observation()
+        env.model.set_config(self._config(width=25, height=25))
+        env.model.state.plot_objects_targets()
+        replaced = env.model.state.get_observation()
+        self.assertIsNot(observation, replaced)
+        self.assertEqual(replaced.array.shape[1:], (25, 25))
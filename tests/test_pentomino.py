@@ -1,8 +1,14 @@
+import random
 import unittest
 
-from golmi.contrib.pentomino.objects import Board
+import numpy as np
+
+from golmi.contrib.pentomino.objects import Board, BoardRasterizer, Piece, border_segments
+from golmi.contrib.pentomino.symbolic.algos import PentoIncrementalAlgorithm
 from golmi.contrib.pentomino.symbolic.sampling import UtteranceTypeOrientedDistractorSetSampler
-from golmi.contrib.pentomino.symbolic.types import RelPositions, Colors, Shapes, PropertyNames, SymbolicPiece
+from golmi.contrib.pentomino.symbolic.types import RelPositions, Colors, Shapes, PropertyNames, SymbolicPiece, \
+    Rotations, SymbolicPieceGroup, get_symbolic_space
+from golmi.server.grid import GridConfig
 import itertools
 
 TARGET = SymbolicPiece(Colors.BLUE, Shapes.T, RelPositions.CENTER)
@@ -32,6 +38,48 @@ class RelPositionsTestCase(unittest.TestCase):
             self.assertEqual(RelPositions.from_coords(x, y, width, height), rel_position, f"x: {x}, y: {y}")
 
 
+class SymbolicPieceTestCase(unittest.TestCase):
+
+    def test_code_round_trip(self):
+        codes = set()
+        for piece in ALL_PIECES:
+            rotated = SymbolicPiece(piece.color, piece.shape, piece.rel_position, Rotations.DEGREE_90)
+            decoded = SymbolicPiece.from_code(rotated.code)
+            self.assertEqual((decoded.color, decoded.shape, decoded.rel_position, decoded.rotation),
+                             (piece.color, piece.shape, piece.rel_position, Rotations.DEGREE_90))
+            # the rotation is ignored for equality
+            self.assertEqual(decoded, piece)
+            self.assertEqual(hash(decoded), hash(piece))
+            # decoded pieces are not shared
+            decoded.rotation = Rotations.DEGREE_0
+            self.assertEqual(SymbolicPiece.from_code(rotated.code).rotation, Rotations.DEGREE_90)
+            codes.add(rotated.code)
+        self.assertEqual(len(codes), len(ALL_PIECES))
+
+    def test_set_properties(self):
+        piece = TARGET.copy()
+        piece[PropertyNames.COLOR] = Colors.RED
+        piece.rotation = Rotations.DEGREE_180
+        self.assertEqual((piece.color, piece.shape, piece.rel_position, piece.rotation),
+                         (Colors.RED, Shapes.T, RelPositions.CENTER, Rotations.DEGREE_180))
+        self.assertEqual(TARGET.color, Colors.BLUE)
+        self.assertEqual(SymbolicPieceGroup([TARGET, piece]), SymbolicPieceGroup([piece.copy(), TARGET]))
+
+
+class SymbolicSpaceTestCase(unittest.TestCase):
+
+    def test_select_same_as_scan(self):
+        space = get_symbolic_space()
+        self.assertIs(space, get_symbolic_space())
+        rows = space.get_rows(ALL_PIECES)
+        self.assertEqual(space.table["code"][rows].tolist(), [piece.code for piece in ALL_PIECES])
+        mask = space.select(TARGET, same=[PropertyNames.COLOR], different=[PropertyNames.SHAPE],
+                            rel_position=RelPositions.TOP_LEFT)
+        self.assertEqual([piece for piece, selected in zip(ALL_PIECES, mask[rows]) if selected],
+                         [piece for piece in ALL_PIECES if piece.color == TARGET.color and piece.shape != TARGET.shape
+                          and piece.rel_position == RelPositions.TOP_LEFT])
+
+
 class UtteranceTypeOrientedDistractorSetSamplerTestCase(unittest.TestCase):
 
     def test_with_num_distractors_returns_num_distractor_configs(self):
@@ -61,6 +109,58 @@ class UtteranceTypeOrientedDistractorSetSamplerTestCase(unittest.TestCase):
             self.assertEqual(distractor.color, TARGET.color)
             self.assertNotEqual(distractor.shape, TARGET.shape)
 
+    def test_sample_many_distinct_sets(self):
+        sampler = UtteranceTypeOrientedDistractorSetSampler(ALL_PIECES, TARGET)
+        utterance_type = [PropertyNames.REL_POSITION]
+        n_sets = sampler.count_distractor_groups(utterance_type, (2, 3))
+        # more sets are requested than there are, all are sampled once
+        distractor_sets = sampler.sample_many_distractor_groups(utterance_type, n_sets + 10, (2, 3))
+        self.assertEqual(len(distractor_sets), n_sets)
+        ia = PentoIncrementalAlgorithm([PropertyNames.COLOR, PropertyNames.SHAPE, PropertyNames.REL_POSITION])
+        for distractor_set in distractor_sets:
+            self.assertIn(len(distractor_set), (1, 2))
+            properties, is_discriminating = ia.generate(list(distractor_set) + [TARGET], TARGET,
+                                                        is_selection_in_pieces=True, return_expression=False)
+            self.assertTrue(is_discriminating)
+            self.assertEqual(set(properties), set(utterance_type))
+
+    def test_sample_many_infeasible(self):
+        pieces = [TARGET, SymbolicPiece(Colors.BLUE, Shapes.T, RelPositions.TOP_LEFT)]
+        sampler = UtteranceTypeOrientedDistractorSetSampler(pieces, TARGET)
+        self.assertEqual(sampler.count_distractor_groups([PropertyNames.REL_POSITION], (2, 2)), 1)
+        # at most one distractor is possible
+        self.assertEqual(sampler.count_distractor_groups([PropertyNames.REL_POSITION], (4, 5)), 0)
+        with self.assertRaises(ValueError):
+            sampler.sample_many_distractor_groups([PropertyNames.REL_POSITION], 10, (4, 5))
+        # the single set sampling checks the same space before sampling
+        self.assertEqual(len(sampler.create_distractor_configs_csp({PropertyNames.REL_POSITION}, 1)), 1)
+        with self.assertRaises(ValueError):
+            sampler.create_distractor_configs_csp({PropertyNames.REL_POSITION}, 3)
+
+    def test_sparse_pieces(self):
+        rng = random.Random(0)
+        ia = PentoIncrementalAlgorithm([PropertyNames.COLOR, PropertyNames.SHAPE, PropertyNames.REL_POSITION])
+        utterance_types = [{PropertyNames.COLOR, PropertyNames.SHAPE},
+                           {PropertyNames.COLOR, PropertyNames.SHAPE, PropertyNames.REL_POSITION},
+                           {PropertyNames.SHAPE, PropertyNames.REL_POSITION}]
+        for _ in range(20):
+            pieces = rng.sample(ALL_PIECES, 40)
+            target = pieces[0]
+            sampler = UtteranceTypeOrientedDistractorSetSampler(pieces, target)
+            for utterance_type, num_distractors in itertools.product(utterance_types, range(1, 6)):
+                # sets are sampled whenever there are any, infeasible ones are reported up front
+                if sampler.get_distractor_space(utterance_type, num_distractors).size == 0:
+                    with self.assertRaises(ValueError):
+                        sampler.create_distractor_configs_csp(utterance_type, num_distractors)
+                    continue
+                distractors = sampler.create_distractor_configs_csp(utterance_type, num_distractors)
+                self.assertTrue(all(distractor in pieces[1:] for distractor in distractors))
+                if num_distractors >= 3:
+                    properties, is_discriminating = ia.generate(list(distractors) + [target], target,
+                                                                is_selection_in_pieces=True, return_expression=False)
+                    self.assertTrue(is_discriminating)
+                    self.assertEqual(set(properties), utterance_type)
+
     def test_with_color_returns_unique_color(self):
         """ Color: same, Shape: any, Position: any """
         sampler = UtteranceTypeOrientedDistractorSetSampler(ALL_PIECES, TARGET)
@@ -71,5 +171,108 @@ class UtteranceTypeOrientedDistractorSetSamplerTestCase(unittest.TestCase):
             self.assertNotEqual(distractor.color, TARGET.color)
 
 
+class PentoIncrementalAlgorithmTestCase(unittest.TestCase):
+
+    def test_batch_same_as_generate(self):
+        rng = random.Random(4)
+        # few values to have equal pieces and pieces that cannot be distinguished
+        boards = [[SymbolicPiece(rng.choice([Colors.RED, Colors.BLUE]), rng.choice([Shapes.T, Shapes.X]),
+                                 rng.choice([RelPositions.CENTER, RelPositions.TOP_LEFT]))
+                   for _ in range(rng.randint(0, 6))] for _ in range(50)]
+        for preference_order in ([PropertyNames.COLOR, PropertyNames.SHAPE, PropertyNames.REL_POSITION],
+                                 [PropertyNames.REL_POSITION, PropertyNames.SHAPE]):
+            ia = PentoIncrementalAlgorithm(preference_order)
+            random.seed(1)
+            expected = [[ia.generate(board, piece, is_selection_in_pieces=True) for piece in board]
+                        for board in boards]
+            random.seed(1)
+            self.assertEqual(ia.generate_batch(boards), expected)
+
+
+class BoardPlacementTestCase(unittest.TestCase):
+
+    def test_crowded_region(self):
+        random.seed(3)
+        board = Board(GridConfig(20, 20, 1, True))
+        symbols = [SymbolicPiece(random.choice(list(Colors)), random.choice(list(Shapes)), RelPositions.CENTER)
+                   for _ in range(15)]
+        (x_min, x_max), (y_min, y_max) = RelPositions.CENTER.to_coord_ranges(20, 20)
+        for symbol in symbols:
+            if board.add_piece_from_symbol(symbol):
+                piece = board.pieces[-1]
+                self.assertTrue(x_min <= piece.piece_obj.x <= x_max)
+                self.assertTrue(y_min <= piece.piece_obj.y <= y_max)
+            else:
+                # no legal position is left in the region
+                for x, y in itertools.product(range(x_min, x_max + 1), range(y_min, y_max + 1)):
+                    piece = Piece.from_symbol(-1, symbol, 20, 20, coords=(x, y))
+                    self.assertFalse(board.grid.is_legal_position(piece.piece_obj.occupied(), -1))
+        self.assertGreater(len(board.pieces), 3)
+        # pieces do not overlap
+        occupied = np.zeros((20, 20), dtype=int)
+        for piece in board.pieces:
+            cells = piece.piece_obj.occupied_cells().astype(int)
+            occupied[cells[:, 1], cells[:, 0]] += 1
+        self.assertLessEqual(occupied.max(), 1)
+        np.testing.assert_array_equal(occupied > 0, board.occupied)
+
+
+class BorderSegmentsTestCase(unittest.TestCase):
+
+    def test_long_borders(self):
+        np_board = np.zeros((3, 3))
+        np_board[0:2, 1] = 2
+        np_board[2, 1:3] = 3
+        segments = {tuple(map(tuple, segment)) for segment in border_segments(np_board).tolist()}
+        self.assertEqual(segments, {
+            # horizontal, the border between both pieces is contained once
+            ((0.5, -0.5), (1.5, -0.5)),
+            ((0.5, 1.5), (2.5, 1.5)),
+            ((0.5, 2.5), (2.5, 2.5)),
+            # vertical, merged along the first piece
+            ((0.5, -0.5), (0.5, 2.5)),
+            ((1.5, -0.5), (1.5, 1.5)),
+            ((2.5, 1.5), (2.5, 2.5)),
+        })
+
+
+class BoardRasterizerTestCase(unittest.TestCase):
+
+    def test_fill_and_borders(self):
+        np_board = np.zeros((4, 4))
+        np_board[1:3, 1] = 2
+        obj_colors = [("white", "#FFFFFF", [255, 255, 255]), ("blue", "#0000FF", [0, 0, 255])]
+        image = BoardRasterizer((40, 40)).draw_board(np_board, obj_colors, [-10, 0.5, 2.5])
+        self.assertEqual(image.shape, (40, 40, 3))
+        self.assertEqual(image.dtype, np.uint8)
+        # cell centers have their color, empty cells are white
+        self.assertEqual(image[15, 15].tolist(), [0, 0, 255])
+        self.assertEqual(image[5, 5].tolist(), [255, 255, 255])
+        self.assertEqual(image[35, 15].tolist(), [255, 255, 255])
+        # the piece border is darkened, there are no borders on empty cells
+        self.assertLess(image[15, 20, 0], 255)
+        self.assertLess(image[10, 15, 0], 255)
+        self.assertEqual(image[10, 35].tolist(), [255, 255, 255])
+
+    def test_same_as_plot(self):
+        try:
+            from golmi.contrib.pentomino.objects import BoardPlotContext
+            import matplotlib  # noqa: F401
+        except ImportError:
+            self.skipTest("matplotlib is not installed")
+        random.seed(1)
+        board = Board(GridConfig(20, 20, 1, True))
+        for piece in random.sample(ALL_PIECES, 6):
+            board.add_piece_from_symbol(piece)
+        ctx = BoardPlotContext((224, 224))
+        expected = board.to_image_array((224, 224), ctx=ctx).astype(int)
+        ctx.close()
+        image = board.to_image_array((224, 224)).astype(int)
+        self.assertEqual(image.shape, expected.shape)
+        difference = np.abs(image - expected).max(axis=-1)
+        # only single anti-aliased pixels on the borders differ
+        self.assertLess((difference > 10).mean(), 0.01)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,73 @@
+import itertools
+import os
+import random
+import tempfile
+import unittest
+from multiprocessing import Pool
+
+import numpy as np
+
+from golmi.contrib.pentomino.objects import Board
+from golmi.contrib.pentomino.render import _imap_bounded, render_boards
+from golmi.contrib.pentomino.symbolic.types import Colors, RelPositions, Shapes, SymbolicPiece
+from golmi.server.grid import GridConfig
+
+ALL_PIECES = [SymbolicPiece(color, shape, pos)
+              for (color, shape, pos) in itertools.product(list(Colors), list(Shapes), list(RelPositions))]
+
+
+class Test(unittest.TestCase):
+    """
+    Tests on batch rendering
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        random.seed(2)
+        self.boards = list()
+        for board_id in range(7):
+            board = Board(GridConfig(20, 20, 1, True), board_id)
+            board.add_pieces_from_symbols(random.sample(ALL_PIECES, 4))
+            self.boards.append(board)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_render_boards(self):
+        out_path = os.path.join(self.tmp_dir.name, "images.npy")
+        state_dicts = [board.to_state_dict(include_grid_config=True) for board in self.boards]
+        images, bboxes = render_boards(iter(state_dicts), out_path, image_size=(64, 48), n_boards=7, n_workers=2,
+                                       chunk_size=3)
+        self.assertEqual(images.shape, (7, 48, 64, 3))
+        self.assertEqual(images.dtype, np.uint8)
+        for board, image, board_bboxes in zip(self.boards, images, bboxes):
+            np.testing.assert_array_equal(image, board.to_image_array((64, 48)))
+            self.assertEqual(board_bboxes, [{"piece_id": piece.piece_id, "bbox": list(board.get_bbox(64, 48, piece))}
+                                            for piece in board.pieces])
+
+    def test_same_in_process(self):
+        first = os.path.join(self.tmp_dir.name, "first.npy")
+        second = os.path.join(self.tmp_dir.name, "second.npy")
+        # Boards and state dicts without grid config give the same images
+        render_boards(self.boards, first, image_size=(32, 32), n_workers=1)
+        render_boards([board.to_state_dict() for board in self.boards], second, image_size=(32, 32),
+                      grid_config=GridConfig(20, 20, 1, True), n_workers=2)
+        np.testing.assert_array_equal(np.load(first), np.load(second))
+
+    def test_bounded_tasks(self):
+        taken = list()
+
+        def tasks():
+            for i in range(10):
+                taken.append(i)
+                yield i
+
+        with Pool(2) as pool:
+            for n_results, result in enumerate(_imap_bounded(pool, abs, tasks(), 3), 1):
+                # the tasks are taken lazily, at most 3 ahead of the results
+                self.assertEqual(result, n_results - 1)
+                self.assertLessEqual(len(taken), n_results + 3)
+        self.assertEqual(len(taken), 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -283,6 +283,23 @@ class SocketEventTest(SocketTest):
         flipped = original_flip != new_flip
         self.assertTrue(flipped)
 
+    def test_actions(self):
+        """Test applying a batch of actions."""
+        self.socketio_client.emit("add_gripper", "0")
+        received = self.socketio_client.get_received()
+        start_x = received[0]["args"][0]["0"]["x"]
+
+        self.socketio_client.emit("actions", {"actions": [
+            {"type": "move", "id": "0", "dx": 1, "dy": 0},
+            {"type": "move", "id": "0", "dx": 1, "dy": 0}
+        ]})
+        received = self.socketio_client.get_received()
+
+        # one update for the whole batch
+        self.assertEqual(len(received), 1)
+        self.assertEqual(received[0]["name"], "update_grippers")
+        self.assertEqual(received[0]["args"][0]["0"]["x"], start_x + 1)
+
     def test_grip_object(self):
         """Test gripping and ungripping an object."""
         test_state, received = self.load_state("tasks/gripped_test.json")
@@ -375,4 +392,42 @@ class ConfigTest(SocketTest):
                     return
             raise RuntimeError("Did not receive 'update_objs' update")
 
+    def test_delta_updates(self):
+        self.load_default_config_with_params({"delta_updates": True})
+        self.socketio_client.emit("add_gripper", "0")
+        self.socketio_client.get_received()
+
+        self.socketio_client.emit("move", {"id": "0", "dx": 1, "dy": 0})
+        received = self.socketio_client.get_received()
+
+        # a single patch containing only the moved gripper
+        self.assertEqual(len(received), 1)
+        self.assertEqual(received[0]["name"], "patch")
+        patch = received[0]["args"][0]
+        self.assertEqual(list(patch["grippers"].keys()), ["0"])
+        self.assertEqual(patch["objs"], dict())
+
+        # an outdated client gets a full snapshot
+        self.socketio_client.emit("sync", {"revision": patch["revision"] - 1})
+        received = self.socketio_client.get_received()
+        self.assertEqual(received[0]["name"], "update_state")
+        self.assertEqual(received[0]["args"][0]["revision"], patch["revision"])
+
+    def test_binary_encoding(self):
+        client = socketio.test_client(
+            app, flask_test_client=self.flask_client, auth={"password": AUTH}
+        )
+        client.emit("join", {"encoding": "msgpack"})
+        received = client.get_received()
+        self.assertEqual(
+            [event["name"] for event in received],
+            ["joined_room", "set_encoding", "update_config", "update_state"]
+        )
+        self.assertIsInstance(received[-1]["args"][0], bytes)
+
+        client.emit("add_gripper", "0")
+        received = client.get_received()
+        self.assertIsInstance(received[0]["args"][0], bytes)
+        client.disconnect()
+
     # --- create more test cases for extensions below --- #
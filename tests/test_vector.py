@@ -0,0 +1,137 @@
+import random
+import unittest
+
+import numpy as np
+
+from golmi.contrib.pentomino.config import PentoConfig
+from golmi.env.env import ACTION_NAMES, GolmiEnv
+from golmi.env.vector import VectorGolmiEnv
+
+
+class Test(unittest.TestCase):
+    """
+    Tests on the vectorized environment
+    """
+    def setUp(self):
+        self.config = PentoConfig(20, 20)
+        self.vector_env = VectorGolmiEnv(self.config, 4, n_objs=3,
+                                         max_steps=10)
+
+    def test_same_as_env(self):
+        # board i behaves like a GolmiEnv seeded with seed + i
+        envs = [GolmiEnv(self.config, n_objs=3, max_steps=1000)
+                for _ in range(4)]
+        self.vector_env.max_steps = 1000
+        observations = self.vector_env.reset(seed=5)
+        single = [env.reset(seed=5 + i) for i, env in enumerate(envs)]
+
+        rng = random.Random(0)
+        for _ in range(200):
+            for i in range(4):
+                for key in single[i]:
+                    np.testing.assert_array_equal(
+                        observations[key][i][:len(single[i][key])],
+                        single[i][key]
+                    )
+            masks = self.vector_env.action_mask()
+            for i in range(4):
+                np.testing.assert_array_equal(masks[i], envs[i].action_mask())
+            actions = [rng.randrange(len(ACTION_NAMES)) for _ in range(4)]
+            observations, rewards, _, info = self.vector_env.step(actions)
+            results = [env.step(a) for env, a in zip(envs, actions)]
+            single = [result[0] for result in results]
+            self.assertEqual(list(info["applied"]),
+                             [result[3]["applied"] for result in results])
+            self.assertEqual(list(rewards), [result[1] for result in results])
+
+    def test_lock_on_target(self):
+        grip = ACTION_NAMES.index("grip")
+        for lock in (True, False):
+            self.config.lock_on_target = lock
+            vector_env = VectorGolmiEnv(self.config, 1, n_objs=3)
+            env = GolmiEnv(self.config, n_objs=3)
+            vector_env.reset(seed=2)
+            env.reset(seed=2)
+
+            # place object 0 on its target and the gripper above it
+            state = env.model.state
+            obj, target = env._objs[0], env._targets[0]
+            state.remove_object(obj)
+            obj.x, obj.y = target.x, target.y
+            obj.block_matrix = target.block_matrix
+            obj.rotation, obj.mirrored = target.rotation, target.mirrored
+            state.add_object(obj)
+            cell = obj.occupied()[0]
+            gripper = state.grippers[env.gr_id]
+            gripper.x, gripper.y = cell["x"], cell["y"]
+
+            e, o = np.array([0]), np.array([0])
+            vector_env._remove_footprint(e, o)
+            for name in ("pos", "variant", "rotation", "mirrored"):
+                getattr(vector_env, "obj_" + name)[0, 0] = \
+                    getattr(vector_env, "target_" + name)[0, 0]
+            vector_env._add_footprint(e, o)
+            vector_env.gripper_pos[0] = (cell["x"] * vector_env.multiplier,
+                                         cell["y"] * vector_env.multiplier)
+
+            _, _, _, info = vector_env.step([grip])
+            self.assertEqual(info["applied"][0], env.step(grip)[3]["applied"])
+            mask = vector_env.action_mask()[0]
+            np.testing.assert_array_equal(mask, env.action_mask())
+            # a locked object can only be released
+            self.assertEqual(mask.sum() == 1, lock)
+
+    def test_overlap(self):
+        env = self.vector_env
+        env.reset(seed=5)
+        e, o = np.array([0]), np.array([0])
+        variant = env.obj_variant[e, o]
+        self.assertTrue(env._legal(e, o, env.obj_pos[e, o], variant)[0])
+
+        # a position whose first cell is the first cell of object 1
+        cells, _ = env._cells(e, o, env.obj_pos[e, o], variant)
+        other, _ = env._cells(e, np.array([1]), env.obj_pos[e, [1]],
+                              env.obj_variant[e, [1]])
+        overlapping = env.obj_pos[e, o] + other[:, 0] - cells[:, 0]
+        self.assertFalse(env._legal(e, o, overlapping, variant)[0])
+
+        env.config.prevent_overlap = False
+        self.assertTrue(env._legal(e, o, overlapping, variant)[0])
+
+    def test_auto_reset(self):
+        self.vector_env.reset(seed=5)
+        for _ in range(10):
+            _, _, dones, info = self.vector_env.step(
+                [ACTION_NAMES.index("flip")] * 4
+            )
+        self.assertTrue(dones.all())
+        self.assertTrue(info["truncated"].all())
+        self.assertTrue((self.vector_env.steps == 0).all())
+
+    def test_shared_memory(self):
+        env = VectorGolmiEnv(self.config, 4, n_objs=3, shared_memory=True)
+        try:
+            # a second instance steps the second half of the boards
+            worker = VectorGolmiEnv(self.config, 4, n_objs=3,
+                                    shared_memory=env.shm_name,
+                                    env_slice=(2, 4))
+            worker.reset(seed=1)
+            np.testing.assert_array_equal(env.obj_pos[2:], worker.obj_pos)
+            self.assertTrue(env.obj_active[2:].any())
+            self.assertFalse(env.obj_active[:2].any())
+            worker.close()
+        finally:
+            env.close()
+
+    def test_shared_memory_slices(self):
+        env = VectorGolmiEnv(self.config, 4, n_objs=3, shared_memory=True,
+                             env_slice=(0, 2))
+        try:
+            worker = VectorGolmiEnv(self.config, 4, n_objs=3,
+                                    shared_memory=env.shm_name,
+                                    env_slice=(2, 4))
+            # the creator initializes the boards of all slices
+            np.testing.assert_array_equal(worker.gripped, -1)
+            worker.close()
+        finally:
+            env.close()
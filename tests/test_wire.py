@@ -0,0 +1,47 @@
+import json
+import unittest
+
+import msgpack
+
+from golmi.contrib.pentomino.config import PentoConfig
+from golmi.server.generator import Generator
+from golmi.server.obj import Orientation
+from golmi.server.wire import OBJ_FIELDS, WireEncoder
+
+
+class Test(unittest.TestCase):
+    """
+    Tests on the binary wire format
+    """
+    def setUp(self):
+        self.config = PentoConfig()
+        self.state = Generator(self.config).generate_random_state(
+            20, 2, target_area=None
+        )
+        self.encoder = WireEncoder(self.config.type_config)
+
+    def test_objects(self):
+        objs = self.state.get_obj_dict()
+        decoded = msgpack.unpackb(self.encoder.encode("update_objs", objs))
+        self.assertEqual(decoded.keys(), objs.keys())
+
+        for obj_id, entry in decoded.items():
+            obj = dict(zip(OBJ_FIELDS, entry))
+            self.assertEqual(obj["x"], objs[obj_id]["x"])
+            self.assertEqual(obj["rotation"], objs[obj_id]["rotation"])
+            # the matrix can be rebuilt from the type and orientation
+            base = Orientation.of(self.config.type_config[obj["type"]])
+            self.assertEqual(
+                base.variants[obj["orientation"]].matrix,
+                objs[obj_id]["block_matrix"]
+            )
+
+    def test_state_size(self):
+        state_dict = self.state.to_dict()
+        encoded = self.encoder.encode("update_state", state_dict)
+        self.assertLess(len(encoded) * 3, len(json.dumps(state_dict)))
+
+    def test_other_events(self):
+        # only state events are encoded
+        config = self.config.to_dict()
+        self.assertIs(self.encoder.encode("update_config", config), config)